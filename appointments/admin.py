@@ -1,6 +1,24 @@
 from django.contrib import admin
-from .models import Service, Appointment, PromotionSettings
+from .models import Service, Appointment, PromotionSettings, EmailOutbox
+from .emails import queue_confirmations
 
 admin.site.register(Service)
-admin.site.register(Appointment)
 admin.site.register(PromotionSettings)
+
+
+@admin.register(Appointment)
+class AppointmentAdmin(admin.ModelAdmin):
+    actions = ["send_confirmations"]
+
+    @admin.action(description="Enviar correo de confirmación")
+    def send_confirmations(self, request, queryset):
+        ids = queue_confirmations(queryset)
+        self.message_user(request, f"{len(ids)} correos encolados")
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("kind", "to_email", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("kind", "status")
+    search_fields = ("to_email",)
+    readonly_fields = ("appointment", "html_body", "last_error")
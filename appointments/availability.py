@@ -0,0 +1,248 @@
+"""
+Motor de disponibilidad.
+
+Carga todas las citas de la ventana de fechas en una sola consulta, arma una
+línea de tiempo en memoria con los intervalos ocupados y calcula los horarios
+libres a partir de ella (sin consultas por cada hora).
+
+Cada cita ocupa [time, time + duración), donde la duración sale de
+Appointment.duration_hours o, si no está capturada, de la suma de
+Service.duration_hours de sus servicios.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import Sum
+
+from .models import Appointment, Service
+
+# Paso de la rejilla de horarios y duración por defecto de una cita
+SLOT_LENGTH = timedelta(hours=1)
+MAX_DURATION = timedelta(hours=12)
+
+# Estados que ya no ocupan el horario; todos los demás lo bloquean, igual que
+# en booking.has_conflict (una cita pendiente de pago también aparta el horario)
+RELEASED_STATUSES = ("cancelled", "expired")
+BLOCKING_STATUSES = tuple(s for s, _ in Appointment.STATUS_CHOICES if s not in RELEASED_STATUSES)
+
+def hours_to_timedelta(hours):
+    """Convierte horas (Decimal, float o texto) a timedelta."""
+    duration = timedelta(hours=float(hours))
+    if duration <= timedelta(0) or duration > MAX_DURATION:
+        raise ValueError(f"Duración inválida: {hours}")
+    return duration
+
+
+def booking_duration(duration_hours, manos_hours=None, pies_hours=None):
+    """Duración real de una cita; 1 hora si no hay ningún dato."""
+    if duration_hours:
+        return timedelta(hours=float(duration_hours))
+    services_hours = (manos_hours or 0) + (pies_hours or 0)
+    if services_hours:
+        return timedelta(hours=float(services_hours))
+    return SLOT_LENGTH
+
+
+def requested_duration(params):
+    """
+    Duración a buscar a partir de los query params:
+    ?duration=<horas> o ?service_manos=<id>&service_pies=<id>.
+    Sin parámetros se buscan huecos de una hora.
+    """
+    if params.get("duration"):
+        return hours_to_timedelta(params["duration"])
+
+    service_ids = [params.get(k) for k in ("service_manos", "service_pies") if params.get(k)]
+    if service_ids:
+        hours = Service.objects.filter(id__in=service_ids).aggregate(
+            total=Sum("duration_hours")
+        )["total"]
+        if hours:
+            return hours_to_timedelta(hours)
+
+    return SLOT_LENGTH
+
+
+class Timeline:
+    """
+    Intervalos ocupados [inicio, fin) agrupados por (manicurista, fecha).
+    Los intervalos se ordenan y fusionan una sola vez por día, la primera vez
+    que se consultan.
+    """
+
+    def __init__(self):
+        self._raw = defaultdict(list)
+        self._merged = {}
+
+    @classmethod
+    def load(cls, employee_ids, start_date, end_date, statuses=BLOCKING_STATUSES):
+        """Una sola consulta para todas las manicuristas y días de la ventana."""
+        return cls.from_queryset(Appointment.objects.filter(
+            employee_id__in=employee_ids,
+            date__range=(start_date, end_date),
+            status__in=statuses,
+        ))
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        """Arma la línea de tiempo con las citas de `queryset` (una consulta)."""
+        timeline = cls()
+        rows = queryset.values_list(
+            "employee_id", "date", "time", "duration_hours",
+            "service_manos__duration_hours", "service_pies__duration_hours",
+        )
+
+        for employee_id, day, time, hours, manos_hours, pies_hours in rows:
+            start = datetime.combine(day, time)
+            end = start + booking_duration(hours, manos_hours, pies_hours)
+            timeline.add(employee_id, day, start, end)
+        return timeline
+
+    def add(self, employee_id, day, start, end):
+        key = (employee_id, day)
+        self._raw[key].append((start, end))
+        self._merged.pop(key, None)
+
+    def bookings(self, employee_id, day):
+        """Citas del día tal como se cargaron (sin fusionar), ordenadas."""
+        return sorted(self._raw.get((employee_id, day), ()))
+
+    def busy(self, employee_id, day):
+        """Intervalos ocupados del día, ordenados y sin traslapes."""
+        key = (employee_id, day)
+        if key not in self._merged:
+            merged = []
+            for start, end in sorted(self._raw.get(key, ())):
+                if merged and start <= merged[-1][1]:
+                    if end > merged[-1][1]:
+                        merged[-1] = (merged[-1][0], end)
+                else:
+                    merged.append((start, end))
+            self._merged[key] = merged
+        return self._merged[key]
+
+    def is_free(self, employee_id, start, end):
+        """True si [start, end) no se cruza con ningún intervalo ocupado."""
+        intervals = self.busy(employee_id, start.date())
+        idx = bisect_right(intervals, (start, start))
+        # intervalo anterior que podría seguir abierto en `start`
+        if idx > 0 and intervals[idx - 1][1] > start:
+            return False
+        # siguiente intervalo que podría empezar antes de `end`
+        if idx < len(intervals) and intervals[idx][0] < end:
+            return False
+        return True
+
+
+def free_starts(timeline, employee, day, duration=SLOT_LENGTH, step=SLOT_LENGTH, now=None):
+    """
+    Inicios de la rejilla del día donde cabe una cita de `duration` sin salir
+    del horario laboral ni cruzarse con otra cita. Los días que la manicurista
+    no trabaja (según employee.schedule) no tienen inicios.
+
+    Barrido lineal: los intervalos ocupados están ordenados y fusionados, así
+    que basta con avanzar un índice a medida que avanza la rejilla.
+    """
+    hours = employee.schedule.hours_for(day)
+    if hours is None:
+        return []
+
+    opening = datetime.combine(day, hours[0])
+    closing = datetime.combine(day, hours[1])
+    busy = timeline.busy(employee.id, day)
+
+    starts = []
+    idx = 0
+    current = opening
+    while current + duration <= closing:
+        end = current + duration
+        # descartar intervalos que terminan antes de este inicio
+        while idx < len(busy) and busy[idx][1] <= current:
+            idx += 1
+        overlaps = idx < len(busy) and busy[idx][0] < end
+        if not overlaps and (now is None or current > now):
+            starts.append(current)
+        current += step
+    return starts
+
+
+def available_slots(employee, start_date, days, now=None, timeline=None, duration=SLOT_LENGTH):
+    """
+    Horarios libres de `duration` para `days` días a partir de `start_date`.
+    Devuelve [{"start": iso, "end": iso}, ...] como AvailableSlotsView.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    if timeline is None:
+        timeline = Timeline.load([employee.id], start_date, end_date)
+
+    slots = []
+
+    for day_offset in range(days):
+        day = start_date + timedelta(days=day_offset)
+        for start in free_starts(timeline, employee, day, duration, now=now):
+            slots.append({
+                "start": start.isoformat(),
+                "end": (start + duration).isoformat()
+            })
+
+    return slots
+
+
+def day_availability(timeline, employee, day, duration=SLOT_LENGTH):
+    """Inicios libres y citas del día como "HH:MM" (sin filtrar por la hora actual)."""
+    return {
+        "free": [s.strftime("%H:%M") for s in free_starts(timeline, employee, day, duration)],
+        "occupied": [s.strftime("%H:%M") for s, _ in timeline.bookings(employee.id, day)],
+    }
+
+
+def compute_availability(employees, start_date, end_date, duration=SLOT_LENGTH,
+                         statuses=BLOCKING_STATUSES):
+    """
+    {(employee_id, fecha): day_availability(...)} para todas las manicuristas y
+    días del rango. Todas las citas se cargan en una sola consulta.
+    """
+    employees = list(employees)
+    timeline = Timeline.load([e.id for e in employees], start_date, end_date, statuses=statuses)
+    days = (end_date - start_date).days + 1
+
+    result = {}
+    for employee in employees:
+        for day_offset in range(days):
+            day = start_date + timedelta(days=day_offset)
+            result[(employee.id, day)] = day_availability(timeline, employee, day, duration)
+    return result
+
+
+def upcoming(day, starts, now=None):
+    """Descarta los inicios ("HH:MM") que ya pasaron."""
+    if now is None or day > now.date():
+        return list(starts)
+    if day < now.date():
+        return []
+    current = now.strftime("%H:%M")
+    return [s for s in starts if s > current]
+
+
+def availability_matrix(employees, start_date, end_date, availability, now=None):
+    """
+    Matriz manicurista × día con los inicios libres ("HH:MM") a partir del
+    resultado de compute_availability (o su versión en caché).
+    """
+    days = (end_date - start_date).days + 1
+
+    matrix = []
+    for employee in employees:
+        slots_by_day = {}
+        for day_offset in range(days):
+            day = start_date + timedelta(days=day_offset)
+            free = availability[(employee.id, day)]["free"]
+            slots_by_day[day.isoformat()] = upcoming(day, free, now)
+
+        matrix.append({
+            "employee_id": str(employee.id),
+            "employee": f"{employee.user.first_name} {employee.user.last_name}",
+            "days": slots_by_day,
+        })
+    return matrix
@@ -0,0 +1,78 @@
+"""
+Reserva atómica de horarios.
+
+Las escrituras de citas de una misma manicurista en un mismo día se
+serializan con un bloqueo de fila (SELECT ... FOR UPDATE) sobre
+EmployeeDayLock. La validación de choques y el INSERT ocurren dentro del
+bloqueo, así dos reservas simultáneas del mismo horario no pueden pasar ambas,
+aunque corran en distintos workers de gunicorn. Otras manicuristas u otros
+días no se esperan entre sí.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .availability import RELEASED_STATUSES, Timeline, booking_duration
+from .models import Appointment, EmployeeDayLock
+
+
+@contextmanager
+def employee_day_lock(employee_id, day):
+    """Transacción con la fila (manicurista, día) bloqueada hasta el commit."""
+    # la fila se crea (INSERT IGNORE) antes de bloquearla: en MySQL un
+    # SELECT ... FOR UPDATE sobre una fila inexistente toma gap locks y dos
+    # reservas simultáneas terminarían en deadlock al insertarla. Vale también
+    # dentro de una transacción externa (alta de ventas, alta masiva)
+    EmployeeDayLock.objects.bulk_create(
+        [EmployeeDayLock(employee_id=employee_id, date=day)], ignore_conflicts=True
+    )
+
+    with transaction.atomic():
+        EmployeeDayLock.objects.select_for_update().get(employee_id=employee_id, date=day)
+        yield
+
+
+@contextmanager
+def employee_day_locks(pairs):
+    """
+    Como employee_day_lock pero para varios (manicurista, día) a la vez.
+    Las filas se bloquean siempre en el mismo orden (por id) para que dos
+    lotes que comparten días no se bloqueen mutuamente.
+    """
+    pairs = set(pairs)
+    # igual que arriba: las filas que falten se crean antes de bloquearlas
+    EmployeeDayLock.objects.bulk_create(
+        [EmployeeDayLock(employee_id=e, date=d) for e, d in pairs],
+        ignore_conflicts=True,
+    )
+
+    with transaction.atomic():
+        condition = Q()
+        for employee_id, day in pairs:
+            condition |= Q(employee_id=employee_id, date=day)
+        if pairs:
+            list(EmployeeDayLock.objects.select_for_update().filter(condition).order_by("id"))
+        yield
+
+
+def appointment_duration(appointment):
+    """Duración de la cita (duration_hours o la suma de sus servicios)."""
+    return booking_duration(
+        appointment.duration_hours,
+        appointment.service_manos.duration_hours if appointment.service_manos else None,
+        appointment.service_pies.duration_hours if appointment.service_pies else None,
+    )
+
+
+def has_conflict(employee_id, day, start_time, duration, exclude_id=None):
+    """True si [start_time, start_time + duration) choca con otra cita vigente del día."""
+    qs = Appointment.objects.filter(employee_id=employee_id, date=day).exclude(
+        status__in=RELEASED_STATUSES
+    )
+    if exclude_id:
+        qs = qs.exclude(id=exclude_id)
+
+    start = datetime.combine(day, start_time)
+    return not Timeline.from_queryset(qs).is_free(employee_id, start, start + duration)
@@ -0,0 +1,181 @@
+"""
+Alta masiva de citas (p. ej. las citas fijas de toda una semana).
+
+Todo el lote se valida contra una sola línea de tiempo precargada: una
+consulta para las citas de las manicuristas/días del lote y una por cada tabla
+relacionada (clientes, manicuristas, servicios), en vez de las consultas de
+Appointment.clean() por cita. Las citas válidas se insertan con bulk_create en
+una sola transacción, con los (manicurista, día) del lote bloqueados igual que
+en Appointment.save(). Las citas del mismo lote también se validan entre sí.
+
+La preferencia de MercadoPago solo se crea para las citas que piden liga de
+anticipo, ya fuera de la transacción (en modo asíncrono solo se encola).
+"""
+import logging
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from employees.models import EmployeeProfile
+from employees.schedule import DAY_NAMES
+from payments.mercadopago_utils import request_deposit_link
+
+from .availability import Timeline, booking_duration
+from .booking import RELEASED_STATUSES, employee_day_locks
+from .cache import invalidate_day
+from .models import Appointment, Service
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 200
+
+
+def _load(items):
+    """Clientes, manicuristas y servicios del lote (una consulta por tabla)."""
+    User = get_user_model()
+    clients = User.objects.in_bulk({item["client"] for item in items})
+    employees = EmployeeProfile.objects.in_bulk({item["employee"] for item in items})
+    service_ids = {
+        item[key] for item in items for key in ("service_manos", "service_pies") if item.get(key)
+    }
+    services = Service.objects.in_bulk(service_ids)
+    return clients, employees, services
+
+
+def _build(item, clients, employees, services):
+    """Appointment sin guardar para `item`; ValueError con el motivo si no es válida."""
+    client = clients.get(item["client"])
+    if client is None:
+        raise ValueError("El cliente no existe.")
+
+    employee = employees.get(item["employee"])
+    if employee is None:
+        raise ValueError("La manicurista no existe.")
+    if not employee.available:
+        raise ValueError("La manicurista no está disponible actualmente.")
+
+    selected = {}
+    for key, category in (("service_manos", "manos"), ("service_pies", "pies")):
+        if item.get(key) is None:
+            continue
+        service = services.get(item[key])
+        if service is None or not service.active:
+            raise ValueError(f"El servicio {item[key]} no existe o no está activo.")
+        if service.category != category:
+            raise ValueError(f"El servicio {service.name} no es de {category}.")
+        selected[key] = service
+    if not selected:
+        raise ValueError("Debes seleccionar al menos un servicio (manos o pies).")
+
+    day, time = item["date"], item["time"]
+    if not employee.schedule.works_on(day):
+        raise ValueError(f"La manicurista no trabaja el día {DAY_NAMES[day.weekday()]}.")
+    if time < employee.start_time or time >= employee.end_time:
+        raise ValueError("La cita está fuera del horario laboral de la manicurista.")
+
+    deposit_link = item.get("deposit_link", False)
+    appointment = Appointment(
+        client=client,
+        employee=employee,
+        date=day,
+        time=time,
+        notes=item.get("notes") or None,
+        status="pending_payment" if deposit_link else "scheduled",
+        requires_deposit=deposit_link,
+        deposit_paid=False,
+        **selected,
+    )
+    appointment.apply_pricing()
+    return appointment
+
+
+def _interval(appointment):
+    start = datetime.combine(appointment.date, appointment.time)
+    manos, pies = appointment.service_manos, appointment.service_pies
+    end = start + booking_duration(
+        appointment.duration_hours,
+        manos.duration_hours if manos else None,
+        pies.duration_hours if pies else None,
+    )
+    return start, end
+
+
+def bulk_create_appointments(items, all_or_nothing=False):
+    """
+    Crea las citas de `items` (datos ya validados por
+    AppointmentBulkItemSerializer). Regresa un resultado por item, en el mismo
+    orden: {"index", "created", "appointment_id" | "errors", ...}.
+    Con all_or_nothing no se guarda nada si alguna cita es inválida.
+    """
+    clients, employees, services = _load(items)
+    results = [{"index": i, "created": False} for i in range(len(items))]
+
+    candidates = []
+    for i, item in enumerate(items):
+        try:
+            candidates.append((i, _build(item, clients, employees, services)))
+        except ValueError as e:
+            results[i]["errors"] = [str(e)]
+
+    pairs = {(a.employee_id, a.date) for _, a in candidates}
+    created = []
+
+    with employee_day_locks(pairs):
+        if candidates:
+            days = [d for _, d in pairs]
+            timeline = Timeline.from_queryset(
+                Appointment.objects.filter(
+                    employee_id__in={e for e, _ in pairs},
+                    date__range=(min(days), max(days)),
+                ).exclude(status__in=RELEASED_STATUSES)
+            )
+
+        for i, appointment in candidates:
+            start, end = _interval(appointment)
+            if not timeline.is_free(appointment.employee_id, start, end):
+                results[i]["errors"] = ["La manicurista ya tiene una cita programada en ese horario."]
+                continue
+            # las siguientes del lote ya ven este horario como ocupado
+            timeline.add(appointment.employee_id, appointment.date, start, end)
+            created.append((i, appointment))
+
+        if all_or_nothing and len(created) < len(items):
+            for i, _ in created:
+                results[i]["errors"] = ["No se guardó: hay citas inválidas en el lote."]
+            created = []
+        else:
+            Appointment.objects.bulk_create([a for _, a in created])
+
+    # bulk_create no dispara post_save: se invalida el caché de disponibilidad
+    # aquí, después del commit (igual que appointments.signals)
+    days = {(a.employee_id, a.date) for _, a in created}
+
+    def invalidate():
+        for employee_id, day in days:
+            invalidate_day(employee_id, day)
+
+    transaction.on_commit(invalidate)
+
+    for i, appointment in created:
+        results[i].update({
+            "created": True,
+            "appointment_id": str(appointment.id),
+            "status": appointment.status,
+            "total_price": str(appointment.total_price),
+        })
+        if appointment.requires_deposit:
+            results[i]["deposit_amount"] = str(appointment.deposit_amount)
+            try:
+                deposit = request_deposit_link(
+                    appointment, amount=appointment.deposit_amount, description="Anticipo cita"
+                )
+                results[i]["init_point"] = deposit.init_point or None
+                results[i]["payment_link_status"] = deposit.status
+            except Exception:
+                # la cita queda pendiente de pago; la liga se puede generar después
+                logger.exception("No se pudo crear la preferencia de la cita %s", appointment.id)
+                results[i]["init_point"] = None
+                results[i]["payment_link_status"] = "failed"
+
+    return results
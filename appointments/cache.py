@@ -0,0 +1,124 @@
+"""
+Caché de disponibilidad por (manicurista, fecha).
+
+Guarda los inicios libres ya calculados por el motor de disponibilidad. La
+llave de cada entrada incluye una "generación" de la manicurista y otra del
+día: invalidar es solo cambiar la generación (appointments.signals lo hace al
+guardar o borrar citas y perfiles), así las entradas viejas dejan de leerse y
+expiran solas. Si el caché no responde se calcula directo de la base de datos.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from .availability import BLOCKING_STATUSES, SLOT_LENGTH, compute_availability
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 60 * 60 * 24
+
+
+def _employee_gen_key(employee_id):
+    return f"availability:gen:{employee_id}"
+
+
+def _day_gen_key(employee_id, day):
+    # str() acepta date o "YYYY-MM-DD" (algunas vistas guardan la fecha como texto)
+    return f"availability:gen:{employee_id}:{day}"
+
+
+def _new_generation():
+    return uuid.uuid4().hex[:12]
+
+
+def invalidate_day(employee_id, day):
+    """La disponibilidad de ese día cambió (cita creada, movida, cancelada...)."""
+    try:
+        cache.set(_day_gen_key(employee_id, day), _new_generation(), TIMEOUT)
+    except Exception:
+        logger.exception("No se pudo invalidar la disponibilidad de %s %s", employee_id, day)
+
+
+def invalidate_employee(employee_id):
+    """Cambió el perfil (horario, días laborales...): todos sus días quedan inválidos."""
+    try:
+        cache.set(_employee_gen_key(employee_id), _new_generation(), TIMEOUT)
+    except Exception:
+        logger.exception("No se pudo invalidar la disponibilidad de %s", employee_id)
+
+
+def _generations(employee_ids, days):
+    """Generaciones actuales; las que no existen se crean en ese momento."""
+    keys = [_employee_gen_key(e) for e in employee_ids]
+    keys += [_day_gen_key(e, d) for e in employee_ids for d in days]
+    gens = cache.get_many(keys)
+
+    missing = {key: _new_generation() for key in keys if key not in gens}
+    if missing:
+        cache.set_many(missing, TIMEOUT)
+        gens.update(missing)
+    return gens
+
+
+def _slots_key(employee_id, day, gens, duration, statuses):
+    return "availability:{}:{}:{}:{}:{}:{}".format(
+        employee_id,
+        day,
+        gens[_employee_gen_key(employee_id)],
+        gens[_day_gen_key(employee_id, day)],
+        int(duration.total_seconds() // 60),
+        ",".join(sorted(statuses)),
+    )
+
+
+def cached_availability(employees, start_date, end_date, duration=SLOT_LENGTH,
+                        statuses=BLOCKING_STATUSES):
+    """
+    Igual que availability.compute_availability pero leyendo del caché; lo que
+    falta se calcula con una sola consulta y se guarda.
+    """
+    employees = list(employees)
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    try:
+        gens = _generations([e.id for e in employees], days)
+        keys = {
+            (e.id, d): _slots_key(e.id, d, gens, duration, statuses)
+            for e in employees for d in days
+        }
+        hits = cache.get_many(keys.values())
+    except Exception:
+        logger.exception("Caché de disponibilidad no disponible")
+        keys, hits = {}, {}
+
+    result = {}
+    missing = []
+    for employee in employees:
+        for day in days:
+            value = hits.get(keys.get((employee.id, day)))
+            if value is None:
+                missing.append((employee, day))
+            else:
+                result[(employee.id, day)] = value
+
+    if missing:
+        missing_employees = list({e.id: e for e, _ in missing}.values())
+        missing_days = [d for _, d in missing]
+        computed = compute_availability(
+            missing_employees, min(missing_days), max(missing_days), duration, statuses
+        )
+
+        to_store = {}
+        for employee, day in missing:
+            result[(employee.id, day)] = computed[(employee.id, day)]
+            if keys:
+                to_store[keys[(employee.id, day)]] = computed[(employee.id, day)]
+
+        try:
+            cache.set_many(to_store, TIMEOUT)
+        except Exception:
+            logger.exception("No se pudo guardar la disponibilidad en caché")
+
+    return result
@@ -0,0 +1,194 @@
+"""
+Envío de correos en segundo plano.
+
+Las vistas no hablan con el servidor SMTP: el correo se renderiza, se guarda
+en EmailOutbox y la tarea send_emails lo envía después. El worker mantiene
+una sola conexión SMTP abierta y la reutiliza entre mensajes (y entre
+tareas); si el servidor la cerró se reabre una vez. Los errores de envío se
+reintentan con espera exponencial hasta MAX_ATTEMPTS: next_attempt_at marca
+cuándo puede volver a tomarse el correo, también para el barrido periódico.
+Cada correo se marca "sent" apenas se envía, así si el worker se cae a media
+tanda solo se repite el que estaba en curso.
+"""
+import logging
+import smtplib
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+FROM_EMAIL = "no-reply@cremestudio.com"
+CONFIRMATION_SUBJECT = "Confirmación de tu cita – Crème Studio"
+CONFIRMATION_TEMPLATE = "emails/appointment_confirmation.html"
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+# un envío "sending" más viejo que esto se considera abandonado (worker caído)
+SENDING_LEASE = timedelta(minutes=10)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 900
+
+
+def retry_delay(attempts):
+    """Segundos de espera después del intento fallido número `attempts` (30 s, 60 s, ... hasta 15 min)."""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+@lru_cache(maxsize=None)
+def compiled_template(name):
+    """Plantilla ya compilada; se lee y se compila una sola vez por proceso."""
+    return get_template(name)
+
+
+def render_email(template_name, context):
+    return compiled_template(template_name).render(context)
+
+
+def confirmation_context(appointment):
+    services = [s.name for s in (appointment.service_manos, appointment.service_pies) if s]
+    return {
+        "client": appointment.client.get_full_name(),
+        "employee": appointment.employee.user.first_name,
+        "services": ", ".join(services) if services else "Sin servicio",
+        "date": appointment.date,
+        "time": appointment.time.strftime("%H:%M"),
+    }
+
+
+def build_confirmation(appointment):
+    """EmailOutbox (sin guardar) con la confirmación de `appointment`."""
+    return EmailOutbox(
+        kind="confirmation",
+        appointment=appointment,
+        to_email=appointment.client.email,
+        subject=CONFIRMATION_SUBJECT,
+        html_body=render_email(CONFIRMATION_TEMPLATE, confirmation_context(appointment)),
+    )
+
+
+def queue_emails(emails):
+    """Guarda los correos y encola su envío al confirmar la transacción."""
+    emails = [e for e in emails if e.to_email]
+    if not emails:
+        return []
+    created = EmailOutbox.objects.bulk_create(emails)
+    ids = [str(e.id) for e in created]
+
+    def enqueue():
+        from .tasks import send_emails
+        try:
+            send_emails.delay(ids)
+        except Exception:
+            # quedan en la bandeja: la tarea periódica los envía
+            logger.warning("No se pudo encolar el envío de %s correos", len(ids), exc_info=True)
+
+    transaction.on_commit(enqueue)
+    return ids
+
+
+def queue_confirmation(appointment):
+    return queue_emails([build_confirmation(appointment)])
+
+
+def queue_confirmations(appointments):
+    """Modo por lotes: una fila por cita y una sola tarea para todas."""
+    appointments = appointments.select_related("client", "employee__user", "service_manos", "service_pies")
+    return queue_emails([build_confirmation(a) for a in appointments])
+
+
+class Mailer:
+    """Conexión SMTP persistente del worker."""
+
+    def __init__(self):
+        self.connection = None
+
+    def send(self, message):
+        if self.connection is None:
+            self.connection = get_connection()
+        try:
+            self.connection.open()  # no hace nada si ya está abierta
+            return self.connection.send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            # el servidor cerró la conexión inactiva: se abre otra y se reintenta
+            self.close()
+            self.connection = get_connection()
+            self.connection.open()
+            return self.connection.send_messages([message])
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+mailer = Mailer()
+
+
+def to_message(email):
+    message = EmailMultiAlternatives(email.subject, strip_tags(email.html_body), FROM_EMAIL, [email.to_email])
+    message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def claim(ids=None, limit=BATCH_SIZE):
+    """Marca como "sending" hasta `limit` correos pendientes (o abandonados) cuyo reintento ya venció."""
+    now = timezone.now()
+    stale = now - SENDING_LEASE
+    with transaction.atomic():
+        qs = EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+            Q(status="pending", next_attempt_at__lte=now) | Q(status="sending", updated_at__lt=stale)
+        )
+        if ids is not None:
+            qs = qs.filter(id__in=ids)
+        claimed = list(qs.order_by("id").values_list("id", flat=True)[:limit])
+        EmailOutbox.objects.filter(id__in=claimed).update(status="sending", updated_at=timezone.now())
+    return list(EmailOutbox.objects.filter(id__in=claimed).order_by("id"))
+
+
+def send_outbox(ids=None, limit=BATCH_SIZE):
+    """
+    Envía los correos pendientes (todos o solo `ids`) por la conexión del
+    worker. Regresa los conteos, la duración y los ids que quedaron para
+    reintento.
+    """
+    started = time.monotonic()
+    sent, retry, failed = [], [], 0
+
+    for email in claim(ids, limit):
+        try:
+            mailer.send(to_message(email))
+        except (smtplib.SMTPException, OSError) as e:
+            email.attempts += 1
+            email.last_error = str(e)
+            email.status = "failed" if email.attempts >= MAX_ATTEMPTS else "pending"
+            email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+            email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "updated_at"])
+            if email.status == "failed":
+                failed += 1
+                logger.error("No se pudo enviar el correo %s a %s: %s", email.id, email.to_email, e)
+            else:
+                retry.append(str(email.id))
+            continue
+        # se marca en cuanto sale: si el worker se cae después no se vuelve a mandar
+        EmailOutbox.objects.filter(id=email.id).update(status="sent", sent_at=timezone.now())
+        sent.append(email.id)
+
+    return {
+        "sent": len(sent),
+        "failed": failed,
+        "retry": retry,
+        "seconds": round(time.monotonic() - started, 3),
+    }
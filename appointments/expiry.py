@@ -0,0 +1,61 @@
+"""
+Expiración de citas no pagadas.
+
+Las citas en "pending_payment" apartan su horario (ver booking.py) hasta que
+se paga el anticipo; pasados EXPIRE_AFTER sin pago se marcan "expired". Se
+procesan en lotes de BATCH_SIZE recorriendo el índice (status, deposit_paid,
+created_at), cada lote en su propia transacción con las filas bloqueadas
+(SKIP LOCKED: las que un webhook está confirmando en ese momento se dejan
+para la siguiente corrida). Al terminar cada lote se publica slot_freed para
+que la disponibilidad en caché se actualice de inmediato.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Appointment
+from .signals import slot_freed
+
+logger = logging.getLogger(__name__)
+
+EXPIRE_AFTER = timedelta(minutes=15)
+BATCH_SIZE = 500
+
+
+def expire_unpaid(now=None, batch_size=BATCH_SIZE, max_batches=None):
+    """Expira las citas vencidas; regresa {"expired", "batches", "seconds"}."""
+    cutoff = (now or timezone.now()) - EXPIRE_AFTER
+    started = time.monotonic()
+    expired = batches = 0
+
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                Appointment.objects.select_for_update(skip_locked=True)
+                .filter(status="pending_payment", deposit_paid=False, created_at__lt=cutoff)
+                .order_by("created_at")
+                .values_list("id", "employee_id", "date")[:batch_size]
+            )
+            if not rows:
+                break
+
+            Appointment.objects.filter(id__in=[pk for pk, _, _ in rows]).update(status="expired")
+
+            slots = {(employee_id, day) for _, employee_id, day in rows}
+            transaction.on_commit(lambda slots=slots: slot_freed.send(sender=Appointment, slots=slots))
+
+        expired += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+
+    result = {
+        "expired": expired,
+        "batches": batches,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info("Citas expiradas: %(expired)s en %(batches)s lotes (%(seconds)s s)", result)
+    return result
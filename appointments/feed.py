@@ -0,0 +1,110 @@
+"""
+Feed de citas agendadas para el panel de administración.
+
+Los filtros (manicurista, fecha, búsqueda por cliente) se aplican en SQL y
+cada fila se arma en una sola pasada. Con ?limit=N se pagina por llave sobre
+(date, time, id): la siguiente página continúa después de la última fila
+vista, sin OFFSET, así el costo no crece con el historial. La primera página
+trae también los totales del filtro completo (summary), porque el panel solo
+tiene cargadas las filas vistas hasta ahora.
+"""
+import base64
+import json
+import uuid
+from datetime import date as date_type, time as time_type
+
+from django.db.models import Count, Q, Sum
+
+from .models import Appointment
+
+MAX_LIMIT = 200
+
+
+def encode_cursor(appointment):
+    raw = json.dumps([
+        appointment.date.isoformat(),
+        appointment.time.isoformat(),
+        str(appointment.id),
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(date, time, uuid) a partir del cursor; ValueError si no es válido."""
+    try:
+        day, time, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date_type.fromisoformat(day), time_type.fromisoformat(time), uuid.UUID(pk)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def scheduled_queryset(manicurist=None, day=None, search=None):
+    qs = Appointment.objects.filter(status="scheduled").select_related(
+        "client", "employee__user", "service_manos", "service_pies"
+    )
+
+    if manicurist:
+        qs = qs.filter(employee_id=manicurist)
+
+    if day:
+        qs = qs.filter(date=day)
+
+    if search:
+        qs = qs.filter(
+            Q(client__first_name__icontains=search)
+            | Q(client__last_name__icontains=search)
+            | Q(client__username__icontains=search)
+        )
+
+    return qs.order_by("date", "time", "id")
+
+
+def after_cursor(qs, cursor):
+    day, time, pk = decode_cursor(cursor)
+    return qs.filter(
+        Q(date__gt=day)
+        | Q(date=day, time__gt=time)
+        | Q(date=day, time=time, id__gt=pk)
+    )
+
+
+def feed_row(a):
+    services = [
+        {"id": str(s.id), "name": s.name, "price": s.price}
+        for s in (a.service_manos, a.service_pies) if s
+    ]
+    return {
+        "id": str(a.id),
+        "date": str(a.date),
+        "time": a.time.strftime("%H:%M"),
+        "client_name": f"{a.client.first_name} {a.client.last_name}" if a.client else "Sin cliente",
+        "services": services,
+        "manicurist_name": a.employee.user.get_full_name() if a.employee else "—",
+        "total_price": str(a.total_price) if a.total_price else None,
+        "status": a.status,
+    }
+
+
+def feed_summary(qs):
+    """Totales de todas las citas del filtro, en una sola consulta."""
+    totals = qs.order_by().aggregate(
+        count=Count("id"),
+        completed=Count("id", filter=Q(status="completed")),
+        total_price=Sum("total_price"),
+    )
+    totals["total_price"] = str(totals["total_price"] or 0)
+    return totals
+
+
+def scheduled_page(qs, limit, cursor=None):
+    """Una página del feed: (filas, cursor de la siguiente página o None)."""
+    if cursor:
+        qs = after_cursor(qs, cursor)
+
+    # se pide una fila extra solo para saber si hay otra página
+    page = list(qs[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    next_cursor = encode_cursor(page[-1]) if has_more else None
+    return [feed_row(a) for a in page], next_cursor
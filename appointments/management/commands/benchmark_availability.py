@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from appointments.availability import available_slots
+from employees.models import EmployeeProfile
+
+
+class Command(BaseCommand):
+    help = "Mide consultas y tiempo del cálculo de disponibilidad para distintas ventanas de días"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--employee", help="ID de la manicurista (por defecto la primera disponible)")
+        parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 90, 365])
+
+    def handle(self, *args, **options):
+        employees = EmployeeProfile.objects.filter(available=True)
+        if options["employee"]:
+            employees = employees.filter(id=options["employee"])
+        employee = employees.first()
+        if not employee:
+            raise CommandError("No hay manicuristas disponibles para medir")
+
+        now = datetime.now()
+        self.stdout.write(f"Manicurista: {employee.id}")
+        self.stdout.write(f"{'días':>6} {'consultas':>10} {'slots':>8} {'ms':>10}")
+
+        for days in options["days"]:
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                slots = available_slots(employee, now.date(), days, now=now)
+                elapsed = (time.perf_counter() - started) * 1000
+
+            self.stdout.write(f"{days:>6} {len(ctx.captured_queries):>10} {len(slots):>8} {elapsed:>10.2f}")
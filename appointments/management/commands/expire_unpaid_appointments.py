@@ -1,24 +1,20 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from appointments.models import Appointment
 
-class Command(BaseCommand):
-    help = "Expira citas no pagadas después de 15 minutos"
+from appointments.expiry import BATCH_SIZE, expire_unpaid
 
-    def handle(self, *args, **options):
-        expiration_time = timezone.now() - timedelta(minutes=15)
 
-        expired = Appointment.objects.filter(
-            status="pending_payment",
-            deposit_paid=False,
-            created_at__lt=expiration_time
-        )
+class Command(BaseCommand):
+    help = "Expira citas no pagadas después de 15 minutos"
 
-        count = expired.count()
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
 
-        expired.update(status="expired")
+    def handle(self, *args, **options):
+        result = expire_unpaid(batch_size=options["batch_size"])
 
         self.stdout.write(
-            self.style.SUCCESS(f"{count} citas expiradas correctamente")
-        )
\ No newline at end of file
+            self.style.SUCCESS(
+                f"{result['expired']} citas expiradas correctamente "
+                f"({result['batches']} lotes, {result['seconds']} s)"
+            )
+        )
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.reminders import CHUNK_SIZE, send_reminders
+
+
+class Command(BaseCommand):
+    help = "Envía los recordatorios de las citas de mañana (o de --date)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Fecha de las citas (YYYY-MM-DD)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        day = None
+        if options["date"]:
+            try:
+                day = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("Fecha inválida, usa YYYY-MM-DD")
+
+        metrics = send_reminders(day, chunk_size=options["chunk_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{metrics['sent']}/{metrics['appointments']} recordatorios enviados para {metrics['date']} "
+            f"en {metrics['seconds']} s ({metrics['per_second'] or 0} correos/s)"
+        ))
+        if metrics["failed"] or metrics["retry"]:
+            self.stdout.write(self.style.WARNING(
+                f"{metrics['failed']} fallidos, {metrics['retry']} pendientes de reintento"
+            ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_created_at_alter_appointment_status'),
+        ('employees', '0002_employeeprofile_working_days_mask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['employee', 'date', 'time', 'status'], name='appt_employee_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client', 'date'], name='appt_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'date', 'time'], name='appt_status_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'deposit_paid', 'created_at'], name='appt_unpaid_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('deposit_paid', False), ('status', 'pending_payment')), fields=['created_at'], name='appt_pending_created_idx'),
+        ),
+    ]
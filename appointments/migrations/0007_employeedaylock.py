@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_appointment_indexes'),
+        ('employees', '0002_employeeprofile_working_days_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeDayLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_locks', to='employees.employeeprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('employee', 'date'), name='unique_employee_day_lock')],
+            },
+        ),
+    ]
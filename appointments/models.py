@@ -3,8 +3,8 @@ from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from employees.models import EmployeeProfile
+from employees.schedule import DAY_NAMES
 from django.utils import timezone
-import unicodedata
 from users.models import CustomUser
 from decimal import Decimal
 
@@ -61,6 +61,24 @@ class Appointment(models.Model):
     payment_reference = models.CharField(max_length=100, unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # disponibilidad y choques de horario: employee + date (+ time, status)
+            models.Index(fields=["employee", "date", "time", "status"], name="appt_employee_slot_idx"),
+            # "mis citas" del cliente ordenadas por fecha
+            models.Index(fields=["client", "date"], name="appt_client_date_idx"),
+            # feed de agendadas ordenado por (date, time)
+            models.Index(fields=["status", "date", "time"], name="appt_status_date_time_idx"),
+            # expiración de citas sin pagar (MySQL no soporta índices parciales)
+            models.Index(fields=["status", "deposit_paid", "created_at"], name="appt_unpaid_expiry_idx"),
+            # versión parcial para PostgreSQL: solo las filas pendientes de pago
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status="pending_payment", deposit_paid=False),
+                name="appt_pending_created_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.client} con {self.employee} el {self.date} a las {self.time}"
     
@@ -76,67 +94,80 @@ class Appointment(models.Model):
         if appointment_time < employee.start_time or appointment_time >= employee.end_time:
             raise ValidationError("La cita está fuera del horario laboral de la manicurista.")
 
-        # 3️⃣ Verificar día laboral
-        # Convertir el día de la cita al nombre del día en español
-        weekday = self.date.strftime("%A").lower()  # ejemplo: "thursday"
-        traduccion_dias = {
-            "monday": "lunes",
-            "tuesday": "martes",
-            "wednesday": "miércoles",
-            "thursday": "jueves",
-            "friday": "viernes",
-            "saturday": "sábado",
-            "sunday": "domingo",
-        }
-        weekday = traduccion_dias.get(weekday, weekday)
-
-        # --- 🔤 Normalización de texto (quita acentos y pasa a minúsculas) ---
-        def normalize(text):
-            if not text:
-                return ""
-            text = text.lower()
-            text = ''.join(
-                c for c in unicodedata.normalize('NFD', text)
-                if unicodedata.category(c) != 'Mn'
-            )
-            return text.strip()
-
-        weekday = normalize(weekday)
-        working_days = normalize(employee.working_days)
-
-        dias_semana = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
-        dias_laborales = []
-
-        # --- 🗓️ Soporte para rango "Lunes a Sábado" ---
-        if " a " in working_days:
-            partes = working_days.split(" a ")
-            if len(partes) == 2:
-                inicio, fin = normalize(partes[0]), normalize(partes[1])
-                if inicio in dias_semana and fin in dias_semana:
-                    i1, i2 = dias_semana.index(inicio), dias_semana.index(fin)
-                    dias_laborales = dias_semana[i1:i2 + 1]
-        else:
-            # --- 📅 Soporte para lista separada por comas ---
-            dias_laborales = [
-                normalize(d) for d in working_days.split(",")
-                if normalize(d) in dias_semana
-            ]
-
-        # Validar si el día de la cita está dentro de los días laborales
-        if weekday not in dias_laborales:
+        # 3️⃣ Verificar día laboral (horario compilado al guardar el perfil)
+        if not employee.schedule.works_on(self.date):
+            weekday = DAY_NAMES[self.date.weekday()]
             raise ValidationError(f"La manicurista no trabaja el día {weekday}.")
 
-        # 4️⃣ Verificar conflictos de citas existentes
-        from appointments.models import Appointment
-        if Appointment.objects.filter(
-            employee=employee,
-            date=self.date,
-            time=self.time
-        ).exclude(id=self.id).exists():
+        # 4️⃣ Verificar choques con otras citas: cada una ocupa [inicio, inicio + duración)
+        from .booking import RELEASED_STATUSES, appointment_duration, has_conflict
+        if self.status not in RELEASED_STATUSES and has_conflict(
+            employee.id, self.date, self.time, appointment_duration(self), exclude_id=self.id
+        ):
             raise ValidationError("La manicurista ya tiene una cita programada en ese horario.")
 
+    # campos que definen el horario que ocupa la cita
+    SLOT_FIELDS = ("employee_id", "date", "time", "service_manos_id", "service_pies_id", "duration_hours")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded(field_names)
+        return instance
+
+    def _remember_loaded(self, field_names=None):
+        """Horario y estado tal como están en la base (sin los campos diferidos)."""
+        fields = self.SLOT_FIELDS + ("status",)
+        if field_names is not None:
+            fields = [field for field in fields if field in field_names]
+        self._loaded = {field: getattr(self, field) for field in fields}
+
+    def _takes_slot(self):
+        """
+        True si este guardado puede ocupar un horario que antes no ocupaba:
+        cita nueva, cambio de manicurista/fecha/hora/servicios o una cita
+        cancelada/expirada que vuelve a estar vigente. Los cambios de solo
+        estado (expirar, completar) no necesitan candado ni validación.
+        """
+        from .availability import RELEASED_STATUSES
+        loaded = getattr(self, "_loaded", None)
+        if self._state.adding or loaded is None or len(loaded) < len(self.SLOT_FIELDS) + 1:
+            # sin algún campo del horario (.only()/.defer()) no se puede comparar
+            return True
+        if any(getattr(self, field) != loaded[field] for field in self.SLOT_FIELDS):
+            return True
+        return self.status not in RELEASED_STATUSES and loaded["status"] in RELEASED_STATUSES
+
     def save(self, *args, **kwargs):
-        self.clean()  # validar antes de guardar
+        from .booking import employee_day_lock
+
+        # algunas vistas asignan fecha/hora como texto ("2026-01-31", "10:00")
+        self.date = self._meta.get_field("date").to_python(self.date)
+        self.time = self._meta.get_field("time").to_python(self.time)
+
+        if self._takes_slot():
+            # 🔒 Validar y guardar con la manicurista/día bloqueados: dos reservas
+            # simultáneas del mismo horario ya no pueden pasar ambas la validación
+            with employee_day_lock(self.employee_id, self.date):
+                self.clean()  # validar antes de guardar
+                self.apply_pricing()
+                super().save(*args, **kwargs)
+        else:
+            self.apply_pricing()
+            super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or not hasattr(self, "_loaded"):
+            self._remember_loaded(set(self.__dict__))
+        else:
+            # solo quedó guardado lo que estaba en update_fields
+            for name in update_fields:
+                attname = self._meta.get_field(name).attname
+                if attname in self.SLOT_FIELDS + ("status",):
+                    self._loaded[attname] = getattr(self, attname)
+
+    def apply_pricing(self):
+        """Precio total y anticipo; también lo usa el alta masiva (bulk_create no llama a save)."""
         # 💰 Calcular total_price
         total = Decimal(0)
         if self.service_manos:
@@ -148,8 +179,71 @@ class Appointment(models.Model):
         # 💵 Definir anticipo automático (ej. 20%)
         if self.requires_deposit and self.deposit_amount == 0:
             self.deposit_amount = Decimal('100.00')
-            
-        super().save(*args, **kwargs)
+
+
+class EmployeeDayLock(models.Model):
+    """
+    Fila de bloqueo por (manicurista, día). Las reservas la bloquean con
+    SELECT ... FOR UPDATE para validar choques e insertar sin carreras
+    (ver appointments/booking.py).
+    """
+    employee = models.ForeignKey(EmployeeProfile, on_delete=models.CASCADE, related_name='day_locks')
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["employee", "date"], name="unique_employee_day_lock")
+        ]
+
+    def __str__(self):
+        return f"Bloqueo {self.employee_id} {self.date}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Correos salientes (confirmaciones, recordatorios). Se guardan ya
+    renderizados y un worker de Celery los envía (appointments/emails.py);
+    la tabla queda como registro de qué se mandó, a quién y cuándo.
+    """
+    KIND_CHOICES = (
+        ("confirmation", "Confirmación"),
+        ("reminder", "Recordatorio"),
+    )
+    STATUS_CHOICES = (
+        ("pending", "Pendiente"),
+        ("sending", "Enviando"),
+        ("sent", "Enviado"),
+        ("failed", "Falló"),
+    )
+
+    # UUID: bulk_create en MySQL no regresa ids autoincrementales
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    html_body = models.TextField()
+    # evita mandar dos veces el mismo correo (p. ej. "reminder:<cita>:<fecha>")
+    dedupe_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # después de un error no se vuelve a intentar antes de esta hora (espera exponencial)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="outbox_status_created_idx"),
+            # el barrido toma los pendientes cuyo reintento ya venció
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} a {self.to_email} - {self.status}"
 
 
 class PromotionSettings(models.Model):
@@ -0,0 +1,90 @@
+"""
+Recordatorios del día anterior.
+
+Una sola consulta trae las citas agendadas de mañana con cliente,
+manicurista y servicios; cada correo se renderiza con la plantilla ya
+compilada (emails.compiled_template) y se guarda en EmailOutbox con una llave
+por cita y fecha, así correr el envío dos veces no duplica recordatorios. Los
+correos se mandan en bloques de CHUNK_SIZE por la conexión SMTP persistente
+del worker.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .emails import confirmation_context, render_email, send_outbox
+from .models import Appointment, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+REMINDER_SUBJECT = "Recordatorio: tu cita es mañana – Crème Studio"
+REMINDER_TEMPLATE = "emails/appointment_reminder.html"
+CHUNK_SIZE = 100
+
+
+def reminder_key(appointment):
+    return f"reminder:{appointment.id}:{appointment.date}"
+
+
+def appointments_for(day):
+    return (
+        Appointment.objects.filter(date=day, status="scheduled")
+        .select_related("client", "employee__user", "service_manos", "service_pies")
+        .order_by("time")
+    )
+
+
+def send_reminders(day=None, chunk_size=CHUNK_SIZE):
+    """
+    Envía los recordatorios de las citas de `day` (por defecto mañana).
+    Regresa conteos, tiempos y correos por segundo de la corrida.
+    """
+    day = day or timezone.localdate() + timedelta(days=1)
+    started = time.monotonic()
+
+    emails = [
+        EmailOutbox(
+            kind="reminder",
+            appointment=appointment,
+            to_email=appointment.client.email,
+            subject=REMINDER_SUBJECT,
+            html_body=render_email(REMINDER_TEMPLATE, confirmation_context(appointment)),
+            dedupe_key=reminder_key(appointment),
+        )
+        for appointment in appointments_for(day)
+        if appointment.client.email
+    ]
+    rendered = time.monotonic()
+
+    # las que ya existían (corrida anterior) no se insertan de nuevo
+    EmailOutbox.objects.bulk_create(emails, batch_size=chunk_size, ignore_conflicts=True)
+    pending = list(
+        EmailOutbox.objects.filter(
+            dedupe_key__in=[e.dedupe_key for e in emails], status="pending"
+        ).order_by("created_at").values_list("id", flat=True)
+    )
+
+    sent = failed = 0
+    for i in range(0, len(pending), chunk_size):
+        result = send_outbox(pending[i:i + chunk_size], limit=chunk_size)
+        sent += result["sent"]
+        failed += result["failed"]
+
+    elapsed = time.monotonic() - started
+    send_seconds = time.monotonic() - rendered
+    metrics = {
+        "date": str(day),
+        "appointments": len(emails),
+        "queued": len(pending),
+        "sent": sent,
+        "failed": failed,
+        "retry": len(pending) - sent - failed,
+        "render_seconds": round(rendered - started, 3),
+        "send_seconds": round(send_seconds, 3),
+        "per_second": round(sent / send_seconds, 1) if send_seconds else None,
+        "seconds": round(elapsed, 3),
+    }
+    logger.info("Recordatorios %s", metrics)
+    return metrics
@@ -1,7 +1,10 @@
 from datetime import datetime, timedelta
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import Service, Appointment, PromotionSettings
+from .booking import has_conflict
 from employees.models import EmployeeProfile
+from employees.schedule import DAY_NAMES
 from users.serializers import CustomUser, UserSerializer
 
 class ServiceSerializer(serializers.ModelSerializer):
@@ -23,9 +26,15 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
-        fields = [
-            "__all__"
-        ]
+        fields = "__all__"
+
+    # Relaciones que leen client_name, employee_name y service_*_name
+    RELATED_FIELDS = ("client", "employee__user", "service_manos", "service_pies")
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Carga las relaciones en la misma consulta (evita N+1 en listados)."""
+        return queryset.select_related(*cls.RELATED_FIELDS)
 
     def get_duration_text(self, obj):
         hours = float(obj.duration_hours)
@@ -50,42 +59,9 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
         end_time = (datetime.combine(date, time) + timedelta(hours=duration)).time()
 
-        # 🗓️ Mapa de días a español
-        day_map = {
-            'monday': 'lunes',
-            'tuesday': 'martes',
-            'wednesday': 'miércoles',
-            'thursday': 'jueves',
-            'friday': 'viernes',
-            'saturday': 'sábado',
-            'sunday': 'domingo',
-        }
-
-        weekday = day_map[date.strftime("%A").lower()]
-        working_days_text = employee.working_days.lower().strip()
-
-        # 🔍 Verifica si es un rango tipo "lunes a sábado"
-        valid_days = ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']
-
-        def dias_en_rango(rango):
-            """Convierte 'lunes a sábado' en ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado']"""
-            partes = rango.split(' a ')
-            if len(partes) == 2 and partes[0] in valid_days and partes[1] in valid_days:
-                start = valid_days.index(partes[0])
-                end = valid_days.index(partes[1])
-                if start <= end:
-                    return valid_days[start:end + 1]
-            # Si no es rango válido, devuelve el texto tal cual
-            return [rango]
-
-        # Generar lista de días laborales
-        if ' a ' in working_days_text:
-            working_days = dias_en_rango(working_days_text)
-        else:
-            working_days = [d.strip() for d in working_days_text.split(',')]
-
-        # 🕓 Validar si trabaja ese día
-        if weekday not in working_days:
+        # 🕓 Validar si trabaja ese día (horario compilado al guardar el perfil)
+        if not employee.schedule.works_on(date):
+            weekday = DAY_NAMES[date.weekday()]
             raise serializers.ValidationError({
                 "non_field_errors": [f"La manicurista no trabaja los {weekday}s."]
             })
@@ -102,15 +78,12 @@ class AppointmentSerializer(serializers.ModelSerializer):
                 "non_field_errors": ["La manicurista no está disponible actualmente."]
             })
 
-        # 🔁 Validar que no haya otra cita en ese horario
-        existing_appointment = Appointment.objects.filter(
-            employee=employee,
-            date=date,
-            time=time,
-            status__in=['scheduled', 'completed']
-        ).exists()
-
-        if existing_appointment:
+        # 🔁 Validar que no haya otra cita que se cruce con [time, time + duración).
+        # Es solo un aviso temprano: Appointment.save() vuelve a validar con la
+        # manicurista/día bloqueados (ver appointments/booking.py)
+        booking = timedelta(hours=duration) if duration else timedelta(hours=1)
+        instance_id = self.instance.id if self.instance else None
+        if has_conflict(employee.id, date, time, booking, exclude_id=instance_id):
             raise serializers.ValidationError({
                 "non_field_errors": ["Ese horario ya está ocupado."]
             })
@@ -143,10 +116,32 @@ class AppointmentSerializer(serializers.ModelSerializer):
         validated_data["total_price"] = total_price
         #validated_data["duration_hours"] = duration
 
-        validated_data["deposit_required"] = True
+        # deposit_required no es campo del modelo: se guarda como requires_deposit
+        validated_data.pop("deposit_required", None)
+        validated_data["requires_deposit"] = True
         validated_data["deposit_amount"] = round(total_price * 0.20, 2)
 
-        return super().create(validated_data)
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as e:
+            # choque detectado ya con el bloqueo tomado (otra reserva ganó el horario)
+            raise serializers.ValidationError({"non_field_errors": e.messages})
+
+
+class AppointmentBulkItemSerializer(serializers.Serializer):
+    """
+    Una cita del alta masiva. Solo valida el formato: clientes, manicuristas y
+    servicios se resuelven para todo el lote en appointments.bulk.
+    """
+    client = serializers.IntegerField()
+    employee = serializers.UUIDField()
+    service_manos = serializers.IntegerField(required=False, allow_null=True)
+    service_pies = serializers.IntegerField(required=False, allow_null=True)
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    notes = serializers.CharField(required=False, allow_blank=True)
+    # crea la cita pendiente de pago y regresa la liga de anticipo de MercadoPago
+    deposit_link = serializers.BooleanField(default=False)
 
 
 class PromotionSettingsSerializer(serializers.ModelSerializer):
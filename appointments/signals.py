@@ -1,8 +1,15 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
 from .models import Appointment
+from .cache import invalidate_day, invalidate_employee
+from employees.models import EmployeeProfile
 from users.models import CustomUser
 
+# Horarios liberados por cambios masivos que no pasan por save()
+# (p. ej. la expiración de citas no pagadas). slots = {(employee_id, date), ...}
+slot_freed = Signal()
+
 @receiver(post_save, sender=Appointment)
 def update_user_service_count(sender, instance, created, **kwargs):
     """
@@ -23,3 +30,54 @@ def update_user_service_count(sender, instance, created, **kwargs):
                 user.has_free_service = True
                 user.total_services = 0  # reinicia el conteo
             user.save()
+
+
+# -------------------------------
+# Invalidación del caché de disponibilidad
+# -------------------------------
+
+@receiver(post_save, sender=Appointment)
+def invalidate_availability_on_save(sender, instance, **kwargs):
+    """
+    Invalida el día de la cita y, al reagendar, también el día anterior: la
+    manicurista/fecha originales son las que Appointment.from_db guardó al
+    cargarla (save las actualiza después de las señales). Así no se lee nada
+    al instanciar cada cita de un listado.
+    """
+    slots = {(instance.employee_id, instance.date)}
+    loaded = getattr(instance, "_loaded", {})
+    if "employee_id" in loaded and "date" in loaded:
+        slots.add((loaded["employee_id"], loaded["date"]))
+    _invalidate_on_commit(slots)
+
+
+@receiver(post_delete, sender=Appointment)
+def invalidate_availability_on_delete(sender, instance, **kwargs):
+    _invalidate_on_commit({(instance.employee_id, instance.date)})
+
+
+@receiver(post_save, sender=EmployeeProfile)
+@receiver(post_delete, sender=EmployeeProfile)
+def invalidate_employee_availability(sender, instance, **kwargs):
+    transaction.on_commit(lambda employee_id=instance.id: invalidate_employee(employee_id))
+
+
+@receiver(slot_freed)
+def invalidate_freed_slots(sender, slots, **kwargs):
+    _invalidate_on_commit(slots)
+
+
+def _invalidate_on_commit(slots):
+    """
+    Invalida después del commit: si se invalida dentro de la transacción
+    (p. ej. con el candado de agenda tomado), otra petición puede recalcular
+    con las filas aún sin confirmar y dejar en caché la generación nueva con
+    la disponibilidad vieja. Fuera de una transacción corre de inmediato.
+    """
+    slots = set(slots)
+
+    def invalidate():
+        for employee_id, day in slots:
+            invalidate_day(employee_id, day)
+
+    transaction.on_commit(invalidate)
@@ -0,0 +1,33 @@
+from celery import shared_task
+
+from .emails import MAX_ATTEMPTS, retry_delay, send_outbox
+from .expiry import expire_unpaid
+from .reminders import send_reminders
+
+
+@shared_task
+def expire_unpaid_appointments():
+    """Expira las citas no pagadas (beat, cada minuto)."""
+    return expire_unpaid()
+
+
+@shared_task(bind=True, max_retries=MAX_ATTEMPTS)
+def send_emails(self, outbox_ids):
+    """Envía los correos de la bandeja; los que fallan se reintentan con espera exponencial."""
+    result = send_outbox(outbox_ids)
+    if result["retry"]:
+        # misma espera que next_attempt_at de los correos que fallaron
+        raise self.retry(args=[result["retry"]], countdown=retry_delay(self.request.retries + 1))
+    return result
+
+
+@shared_task
+def send_pending_emails():
+    """Barrido periódico: correos que no se encolaron o cuyo worker se cayó."""
+    return send_outbox()
+
+
+@shared_task
+def send_appointment_reminders():
+    """Recordatorios de las citas de mañana (beat, una vez al día)."""
+    return send_reminders()
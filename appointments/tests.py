@@ -1,3 +1,335 @@
-from django.test import TestCase
+import smtplib
+from datetime import date, time, timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from employees.models import EmployeeProfile
+from users.models import CustomUser
+from . import emails
+from .models import Appointment, EmailOutbox, Service
+from .management.commands.explain_appointment_queries import explain_hot_queries
+from .serializers import AppointmentSerializer
+
+
+def make_employee(username):
+    user = CustomUser.objects.create_user(username=username, password="x", role="employee")
+    return EmployeeProfile.objects.create(
+        user=user, specialties="Gelish", working_days="Lunes a Domingo", start_time=time(10, 0), end_time=time(18, 0)
+    )
+
+
+class AppointmentQueryCountTests(APITestCase):
+    """Los listados de AppointmentSerializer no deben hacer una consulta por cita."""
+
+    ROWS = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        cls.admin = CustomUser.objects.create_user(username="admin", password="x", is_staff=True)
+        manos = Service.objects.create(name="Gelish", price=300, category="manos")
+        pies = Service.objects.create(name="Pedicure", price=250, category="pies")
+
+        start = date.today() + timedelta(days=1)
+        for i in range(cls.ROWS):
+            # una manicurista por cita: así un N+1 sobre employee__user se notaría
+            Appointment.objects.create(
+                client=cls.client_user,
+                employee=make_employee(f"emp{i}"),
+                service_manos=manos,
+                service_pies=pies if i % 2 else None,
+                date=start + timedelta(days=i),
+                time=time(11, 0),
+                status="scheduled",
+            )
+        cls.appointment = Appointment.objects.first()
+
+    def api(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_admin_list(self):
+        client = self.api(self.admin)
+        # conteo + página
+        with self.assertNumQueries(2):
+            response = client.get("/api/appointments/appointments/admin-list/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], self.ROWS)
+        self.assertTrue(all(row["employee_name"] for row in response.data["results"]))
+
+    def test_admin_detail(self):
+        client = self.api(self.admin)
+        with self.assertNumQueries(1):
+            response = client.get(f"/api/appointments/appointments/detail/{self.appointment.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["service_manos_name"], "Gelish")
+
+    def test_client_history(self):
+        client = self.api(self.client_user)
+        with self.assertNumQueries(2):
+            response = client.get("/api/appointments/appointments/list/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), self.ROWS)
+        self.assertTrue(all(row["client_name"] == "cliente" for row in response.data["results"]))
+
+
+class AvailabilityStatusTests(APITestCase):
+    """Los horarios libres usan los mismos estados que booking.has_conflict."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        cls.employee = make_employee("emp")
+        cls.day = date.today() + timedelta(days=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def slots(self):
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        response = client.get(f"/api/appointments/available/{self.employee.id}/", {"date": self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def book(self, status, hour=11):
+        # la invalidación del caché de disponibilidad corre al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                client=self.client_user, employee=self.employee, date=self.day, time=time(hour, 0), status=status
+            )
+
+    def test_pending_payment_hides_its_slot(self):
+        self.book("pending_payment")
+        data = self.slots()
+        self.assertNotIn("11:00", data["available_slots"])
+        self.assertIn("11:00", data["occupied_slots"])
+
+    def test_completed_hides_its_slot(self):
+        self.book("completed")
+        self.assertNotIn("11:00", self.slots()["available_slots"])
+
+    def test_released_statuses_free_the_slot(self):
+        for status in ("cancelled", "expired"):
+            with self.subTest(status=status):
+                appointment = self.book(status)
+                self.assertIn("11:00", self.slots()["available_slots"])
+                with self.captureOnCommitCallbacks(execute=True):
+                    appointment.delete()
+
+
+class AppointmentSaveLockTests(TestCase):
+    """Solo los guardados que pueden ocupar otro horario toman el candado y validan choques."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        cls.employee = make_employee("emp")
+        cls.day = date.today() + timedelta(days=1)
+
+    def setUp(self):
+        Appointment.objects.create(
+            client=self.client_user, employee=self.employee, date=self.day, time=time(11, 0), status="scheduled"
+        )
+        self.appointment = Appointment.objects.get()
+
+    def locked(self, save):
+        with CaptureQueriesContext(connection) as queries:
+            save()
+        return any("employeedaylock" in q["sql"] for q in queries)
+
+    def test_status_only_saves_skip_the_lock(self):
+        self.appointment.status = "completed"
+        self.assertFalse(self.locked(self.appointment.save))
+
+        appointment = Appointment.objects.get()
+        appointment.status = "expired"
+        self.assertFalse(self.locked(lambda: appointment.save(update_fields=["status"])))
+
+    def test_moving_the_appointment_takes_the_lock(self):
+        self.appointment.time = time(13, 0)
+        self.assertTrue(self.locked(self.appointment.save))
+        # ya guardada en el horario nuevo: volver a guardarla no lo toma
+        self.appointment.notes = "sin cambios de horario"
+        self.assertFalse(self.locked(self.appointment.save))
+
+    def test_deferred_slot_fields_take_the_lock(self):
+        appointment = Appointment.objects.only("id", "status").get()
+        appointment.status = "completed"
+        self.assertTrue(self.locked(appointment.save))
+
+    def test_reviving_a_released_appointment_checks_conflicts(self):
+        Appointment.objects.filter(id=self.appointment.id).update(status="expired")
+        Appointment.objects.create(
+            client=self.client_user, employee=self.employee, date=self.day, time=time(11, 0), status="scheduled"
+        )
+
+        expired = Appointment.objects.get(id=self.appointment.id)
+        expired.status = "scheduled"
+        with self.assertRaises(ValidationError):
+            expired.save()
+
+
+class AvailabilityInvalidationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        cls.employee = make_employee("emp")
+        cls.day = date.today() + timedelta(days=1)
+        for hour in (10, 12, 14):
+            Appointment.objects.create(
+                client=cls.client_user, employee=cls.employee, date=cls.day, time=time(hour, 0), status="scheduled"
+            )
+
+    def test_deferred_listing_does_not_refresh_rows(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(Appointment.objects.only("id", "status"))), 3)
+
+    def test_rescheduling_invalidates_both_days(self):
+        appointment = Appointment.objects.order_by("time").first()
+        appointment.date = self.day + timedelta(days=1)
+        with mock.patch("appointments.signals.invalidate_day") as invalidate_day, \
+                self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+
+        invalidated = {call.args for call in invalidate_day.call_args_list}
+        self.assertEqual(invalidated, {(self.employee.id, self.day), (self.employee.id, self.day + timedelta(days=1))})
+
+
+class AppointmentSerializerCreateTests(APITestCase):
+    def test_create_maps_deposit_required(self):
+        employee = make_employee("emp")
+        service = Service.objects.create(name="Gelish", price=300, category="manos")
+        client_user = CustomUser.objects.create_user(username="cliente", password="x")
+
+        serializer = AppointmentSerializer(data={
+            "employee": str(employee.id),
+            "service_manos": service.id,
+            "date": (date.today() + timedelta(days=1)).isoformat(),
+            "time": "11:00",
+            "deposit_paid": True,
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        appointment = serializer.save(client=client_user)
+
+        self.assertTrue(appointment.requires_deposit)
+        self.assertEqual(appointment.total_price, 300)
+
+
+@skipIf(connection.vendor == "sqlite", "Los planes de SQLite no aplican; los índices se revisan en MySQL/PostgreSQL")
+class AppointmentIndexPlanTests(TestCase):
+    """Las consultas principales de citas deben usar los índices de Appointment.Meta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        employee = make_employee("emp")
+        start = date.today()
+        for i in range(20):
+            Appointment.objects.create(
+                client=client_user, employee=employee,
+                date=start + timedelta(days=i), time=time(11, 0), status="scheduled",
+            )
+
+    def test_hot_queries_use_indexes(self):
+        for description, indexes, used, plan in explain_hot_queries():
+            with self.subTest(description):
+                self.assertTrue(used, f"{description} no usa {' / '.join(indexes)}:\n{plan}")
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class EmailOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        employee = make_employee("emp")
+        service = Service.objects.create(name="Gelish", price=300, category="manos")
+        start = date.today() + timedelta(days=1)
+        for i in range(3):
+            client = CustomUser.objects.create_user(
+                username=f"cliente{i}", password="x", email=f"cliente{i}@example.com", first_name=f"Cliente{i}"
+            )
+            Appointment.objects.create(
+                client=client, employee=employee, service_manos=service,
+                date=start + timedelta(days=i), time=time(11, 0), status="scheduled",
+            )
+
+    def setUp(self):
+        # la conexión del worker es global: cada prueba empieza con una nueva
+        emails.mailer.close()
+
+    def queue_all(self):
+        with self.captureOnCommitCallbacks():
+            return emails.queue_confirmations(Appointment.objects.order_by("date"))
+
+    def test_batch_is_sent_over_one_connection(self):
+        ids = self.queue_all()
+        self.assertEqual(EmailOutbox.objects.filter(status="pending").count(), 3)
+
+        with mock.patch("appointments.emails.get_connection", wraps=emails.get_connection) as connections:
+            result = emails.send_outbox(ids)
+
+        self.assertEqual(result["sent"], 3)
+        self.assertEqual(connections.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn("Gelish", mail.outbox[0].alternatives[0][0])
+        self.assertFalse(EmailOutbox.objects.exclude(status="sent").exists())
+        self.assertFalse(EmailOutbox.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failed_send_waits_for_backoff(self):
+        self.queue_all()
+        with mock.patch.object(emails.mailer, "send", side_effect=smtplib.SMTPException("sin servidor")):
+            result = emails.send_outbox()
+        self.assertEqual(len(result["retry"]), 3)
+
+        email = EmailOutbox.objects.first()
+        self.assertEqual((email.status, email.attempts), ("pending", 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # el barrido no los reenvía antes de tiempo
+        self.assertEqual(emails.send_outbox()["sent"], 0)
+        self.assertEqual(mail.outbox, [])
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(emails.send_outbox()["sent"], 3)
+
+    def test_gives_up_after_max_attempts(self):
+        self.queue_all()
+        EmailOutbox.objects.update(attempts=emails.MAX_ATTEMPTS - 1)
+        with mock.patch.object(emails.mailer, "send", side_effect=smtplib.SMTPException("rechazado")), \
+                self.assertLogs("appointments.emails", "ERROR"):
+            result = emails.send_outbox()
+
+        self.assertEqual(result["failed"], 3)
+        self.assertEqual(EmailOutbox.objects.filter(status="failed").count(), 3)
+
+    def test_rows_are_marked_sent_as_they_go(self):
+        ids = self.queue_all()
+        real_send = emails.mailer.send
+        calls = []
+
+        def crash_on_third(message):
+            calls.append(message)
+            if len(calls) == 3:
+                raise RuntimeError("worker caído")
+            return real_send(message)
+
+        with mock.patch.object(emails.mailer, "send", side_effect=crash_on_third):
+            with self.assertRaises(RuntimeError):
+                emails.send_outbox(ids)
+
+        # los dos que salieron ya no se repiten cuando venza el lease del tercero
+        self.assertEqual(EmailOutbox.objects.filter(status="sent").count(), 2)
+        EmailOutbox.objects.filter(status="sending").update(updated_at=timezone.now() - emails.SENDING_LEASE * 2)
+        self.assertEqual(emails.send_outbox()["sent"], 1)
+        self.assertEqual(len(mail.outbox), 3)
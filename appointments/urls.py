@@ -5,6 +5,7 @@ from .views import (
     ServiceListView,
     ServiceListAdminView,
     AppointmentCreateView,
+    AppointmentBulkCreateView,
     AppointmentListView,
     AppointmentListAdminView,
     AppointmentDetailAdminView,
@@ -12,6 +13,7 @@ from .views import (
     PromotionSettingsView,
     AvailableSlotsView,
     EmployeeAvailableSlotsView,
+    AvailabilityMatrixView,
     available_slots_page,
     about_view,
     ManicuristListView,
@@ -30,7 +32,9 @@ from .views import (
     ventas_rapidas,
     appointments_list,
     all_scheduled_appointments,
-    scheduled_appointments_filtered
+    scheduled_appointments_filtered,
+    create_pending_appointment,
+    appointment_payment_status,
 )
 
 urlpatterns = [
@@ -48,9 +52,12 @@ urlpatterns = [
 
     # CITAS
     path('create/', AppointmentCreateView.as_view(), name='appointment-create'),
+    path('bulk-create/', AppointmentBulkCreateView.as_view(), name='appointment-bulk-create'),
+    path('create-pending/', create_pending_appointment, name='appointment-create-pending'),
+    path('<uuid:appointment_id>/payment-status/', appointment_payment_status, name='appointment-payment-status'),
     path('appointments/list/', AppointmentListView.as_view(), name='appointment-list'),
     path('appointments/admin-list/', AppointmentListAdminView.as_view(), name='appointment-list-admin'),
-    path('appointments/detail/<int:id>/', AppointmentDetailAdminView.as_view(), name='appointment-detail-admin'),
+    path('appointments/detail/<uuid:id>/', AppointmentDetailAdminView.as_view(), name='appointment-detail-admin'),
     path('appointments/charge/<uuid:appointment_id>/', ChargeAppointmentView.as_view(), name='charge_appointments'),
     path("appointments-list/", appointments_list, name="appointments-list"),
 
@@ -65,6 +72,7 @@ urlpatterns = [
     path('available-slots/', AvailableSlotsView.as_view(), name='available-slots'),
     path('available-slots/<uuid:employee_id>/', AvailableSlotsView.as_view(), name='available-slots-by-employee'),
     path('available/<uuid:employee_id>/', EmployeeAvailableSlotsView.as_view(), name='employee-available-slots'),
+    path('availability-matrix/', AvailabilityMatrixView.as_view(), name='availability-matrix'),
     path('available-view/', available_view, name='available-slots-page'),
 
     # INFO GENERAL
@@ -4,7 +4,8 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from rest_framework import generics, permissions
+from django.core.exceptions import ValidationError
+from rest_framework import generics, permissions, serializers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
@@ -23,17 +24,21 @@ from rest_framework.authentication import SessionAuthentication
 from .serializers import (
     ServiceSerializer,
     AppointmentSerializer,
+    AppointmentBulkItemSerializer,
     PromotionSettingsSerializer,
     EmployeeBasicSerializer,
     AppointmentListSerializer,
     AppointmentSimpleSerializer
 )
 from employees.models import EmployeeProfile
+from .bulk import MAX_BATCH, bulk_create_appointments
+from .availability import availability_matrix, requested_duration, upcoming
+from .cache import cached_availability
+from .feed import MAX_LIMIT as MAX_FEED_LIMIT, feed_row, feed_summary, scheduled_page, scheduled_queryset
 import logging
 
-from payments.mercadopago_utils import create_mp_preference
-import mercadopago
-sdk = mercadopago.SDK(settings.MERCADOPAGO_ACCESS_TOKEN)
+from payments.gateway import PaymentGatewayError
+from payments.mercadopago_utils import request_deposit_link
 
 # -------------------------------
 # Permiso personalizado para Admin
@@ -124,22 +129,69 @@ class AppointmentCreateView(generics.CreateAPIView):
             requires_deposit=True
         )
 
-        # 🔹 Crear preferencia MercadoPago
-        preference = create_mp_preference(
-            amount=float(appointment.deposit_amount),
-            description="Anticipo cita (20%)",
-            appointment_id=str(appointment.id)
-        )
+        # 🔹 Crear preferencia MercadoPago (en modo asíncrono la crea Celery y
+        # el init_point se consulta en /api/appointments/<id>/payment-status/)
+        try:
+            deposit = request_deposit_link(
+                appointment,
+                amount=appointment.deposit_amount,
+                description="Anticipo cita (20%)",
+            )
+        except PaymentGatewayError:
+            # la cita queda pendiente de pago; la liga se puede pedir otra vez
+            logger.exception("No se pudo crear la preferencia de la cita %s", appointment.id)
+            return Response({
+                "appointment_id": appointment.id,
+                "error": "No se pudo generar la liga de pago",
+            }, status=502)
 
         return Response({
             "appointment_id": appointment.id,
             "deposit_amount": appointment.deposit_amount,
-            "init_point": preference["init_point"]
+            "init_point": deposit.init_point or None,
+            "payment_link_status": deposit.status,
         }, status=201)
 
         # Enviar correo
         send_appointment_confirmation(appointment)
 
+class AppointmentBulkCreateView(APIView):
+    """
+    Alta masiva para recepción:
+    {"appointments": [{client, employee, service_manos, service_pies, date,
+    time, notes, deposit_link}, ...], "all_or_nothing": false}
+    Regresa un resultado por cita, en el mismo orden.
+    """
+    permission_classes = [IsAdminOrSuperuser]
+
+    def post(self, request):
+        items = request.data.get("appointments")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "appointments debe ser una lista con al menos una cita"}, status=400)
+        if len(items) > MAX_BATCH:
+            return Response({"error": f"Máximo {MAX_BATCH} citas por lote"}, status=400)
+
+        serializer = AppointmentBulkItemSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=400)
+
+        try:
+            # "false"/"0" de un formulario no cuentan como verdadero
+            all_or_nothing = serializers.BooleanField().to_internal_value(
+                request.data.get("all_or_nothing", False)
+            )
+        except serializers.ValidationError:
+            return Response({"error": "all_or_nothing debe ser true o false"}, status=400)
+
+        results = bulk_create_appointments(serializer.validated_data, all_or_nothing=all_or_nothing)
+        created = sum(1 for r in results if r["created"])
+
+        return Response({
+            "created": created,
+            "failed": len(results) - created,
+            "results": results,
+        }, status=201 if created else 400)
+
 class AppointmentListView(generics.ListAPIView):
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -147,10 +199,12 @@ class AppointmentListView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'client':
-            return user.appointments.all().order_by('-date', '-time')
+            queryset = user.appointments.all()
         elif user.role == 'employee':
-            return user.employee_profile.appointments.all().order_by('-date', '-time')
-        return Appointment.objects.all().order_by('-date', '-time')
+            queryset = user.employee_profile.appointments.all()
+        else:
+            queryset = Appointment.objects.all()
+        return AppointmentSerializer.setup_eager_loading(queryset).order_by('-date', '-time')
 
 # Admin: Listado y detalle de citas
 class AppointmentListAdminView(generics.ListAPIView):
@@ -158,7 +212,7 @@ class AppointmentListAdminView(generics.ListAPIView):
     permission_classes = [IsAdminOrSuperuser]
 
     def get_queryset(self):
-        queryset = Appointment.objects.all().order_by('-date', '-time')
+        queryset = AppointmentSerializer.setup_eager_loading(Appointment.objects.all()).order_by('-date', '-time')
         employee_id = self.request.query_params.get('employee', None)
         if employee_id:
             queryset = queryset.filter(employee__id=employee_id)
@@ -167,7 +221,7 @@ class AppointmentListAdminView(generics.ListAPIView):
 class AppointmentDetailAdminView(generics.RetrieveUpdateAPIView):
     serializer_class = AppointmentSerializer
     permission_classes = [IsAdminOrSuperuser]
-    queryset = Appointment.objects.all()
+    queryset = AppointmentSerializer.setup_eager_loading(Appointment.objects.all())
     lookup_field = 'id'
 
     def patch(self, request, *args, **kwargs):
@@ -182,7 +236,7 @@ class AppointmentDetailAdminView(generics.RetrieveUpdateAPIView):
         appointment.status = status_value
         appointment.save()
 
-        # 📩 Enviar email si se confirma una cita
+        # 📩 Enviar email si se confirma una cita (se encola, lo manda Celery)
         if status_value == "scheduled" and previous_status != "scheduled":
             try:
                 send_appointment_confirmation(appointment)
@@ -264,42 +318,28 @@ class AvailableSlotsView(APIView):
         except EmployeeProfile.DoesNotExist:
             return Response({"error": "Manicurista no encontrada"}, status=404)
 
+        try:
+            duration = requested_duration(request.GET)
+        except ValueError:
+            return Response({"error": "Duración inválida"}, status=400)
+
         now = datetime.now()
         days_ahead = 7
-        slots = []
+        start_date = now.date()
+        end_date = start_date + timedelta(days=days_ahead - 1)
 
-        days_map = {
-            "lunes": 0, "martes": 1, "miércoles": 2, "miercoles": 2,
-            "jueves": 3, "viernes": 4, "sábado": 5, "sabado": 5, "domingo": 6
-        }
-
-        working_days_str = employee.working_days.lower()
-        available_days = [idx for name, idx in days_map.items() if name in working_days_str]
+        # 🗓️ Desde caché; lo que falta sale de una sola consulta (ver appointments/cache.py)
+        availability = cached_availability([employee], start_date, end_date, duration)
 
+        slots = []
         for day_offset in range(days_ahead):
-            day = now + timedelta(days=day_offset)
-            if day.weekday() not in available_days:
-                continue
-
-            start_dt = datetime.combine(day.date(), employee.start_time)
-            end_dt = datetime.combine(day.date(), employee.end_time)
-            current = start_dt
-
-            while current + timedelta(hours=1) <= end_dt:
-                overlapping = Appointment.objects.filter(
-                    employee=employee,
-                    date=day.date(),
-                    time__gte=current.time(),
-                    time__lt=(current + timedelta(hours=1)).time(),
-                    status='scheduled'
-                ).exists()
-
-                if not overlapping and current > now:
-                    slots.append({
-                        "start": current.isoformat(),
-                        "end": (current + timedelta(hours=1)).isoformat()
-                    })
-                current += timedelta(hours=1)
+            day = start_date + timedelta(days=day_offset)
+            for start in upcoming(day, availability[(employee.id, day)]["free"], now):
+                start_dt = datetime.combine(day, datetime.strptime(start, "%H:%M").time())
+                slots.append({
+                    "start": start_dt.isoformat(),
+                    "end": (start_dt + duration).isoformat()
+                })
 
         return Response(slots)
 
@@ -311,37 +351,21 @@ class EmployeeAvailableSlotsView(APIView):
 
         try:
             date = datetime.strptime(date_str, "%Y-%m-%d").date()
-            employee = EmployeeProfile.objects.get(id=employee_id)
+            duration = requested_duration(request.GET)
+            employee = EmployeeProfile.objects.select_related("user").get(id=employee_id)
         except EmployeeProfile.DoesNotExist:
             return Response({"error": "Manicurista no encontrada"}, status=404)
         except ValueError:
-            return Response({"error": "Formato de fecha inválido"}, status=400)
+            return Response({"error": "Formato de fecha o duración inválido"}, status=400)
 
         if not employee.start_time or not employee.end_time:
             return Response({"error": "La manicurista no tiene horario configurado"}, status=400)
 
-        # Generar rango de horarios (por hora)
-        start_dt = datetime.combine(date, employee.start_time)
-        end_dt = datetime.combine(date, employee.end_time)
-        delta = timedelta(hours=1)
-
-        available_slots = []
-        current = start_dt
-        while current < end_dt:
-            available_slots.append(current.strftime("%H:%M"))
-            current += delta
-
-        # Obtener citas ocupadas en esa fecha
-        taken_times = Appointment.objects.filter(
-            employee=employee,
-            date=date,
-            status__in=['scheduled', 'completed']
-        ).values_list('time', flat=True)
-
-        # Convertir a strings iguales para comparar
-        taken_str = [t.strftime("%H:%M") for t in taken_times]
-
-        free_slots = [s for s in available_slots if s not in taken_str]
+        # ⏱️ Solo inicios donde cabe la cita completa (p. ej. manos + pies);
+        # las citas ocupan [inicio, inicio + duración). Se lee del caché.
+        availability = cached_availability([employee], date, date, duration)[(employee.id, date)]
+        free_slots = availability["free"]
+        taken_str = availability["occupied"]
 
         return Response({
             "employee": f"{employee.user.first_name} {employee.user.last_name}",
@@ -352,6 +376,44 @@ class EmployeeAvailableSlotsView(APIView):
             "updated_at": datetime.now().isoformat()
         })
 
+class AvailabilityMatrixView(APIView):
+    """
+    Disponibilidad de varias manicuristas para un rango de fechas en una sola llamada.
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD[&employees=id1,id2][&duration=horas]
+    """
+    MAX_DAYS = 31
+
+    def get(self, request):
+        try:
+            start = datetime.strptime(request.GET.get("start", ""), "%Y-%m-%d").date()
+            end = datetime.strptime(request.GET.get("end", ""), "%Y-%m-%d").date()
+            duration = requested_duration(request.GET)
+        except ValueError:
+            return Response({"error": "Debe proporcionar ?start=YYYY-MM-DD&end=YYYY-MM-DD"}, status=400)
+
+        if end < start or (end - start).days >= self.MAX_DAYS:
+            return Response({"error": f"Rango inválido (máximo {self.MAX_DAYS} días)"}, status=400)
+
+        employees = EmployeeProfile.objects.filter(available=True).select_related("user")
+        employee_ids = [e for e in request.GET.get("employees", "").split(",") if e]
+        try:
+            if employee_ids:
+                employees = employees.filter(id__in=employee_ids)
+            employees = list(employees)  # una sola consulta de manicuristas
+        except ValidationError:
+            return Response({"error": "Lista de manicuristas inválida"}, status=400)
+
+        availability = cached_availability(employees, start, end, duration)
+        matrix = availability_matrix(employees, start, end, availability, now=datetime.now())
+
+        return Response({
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "duration_hours": duration.total_seconds() / 3600,
+            "employees": matrix,
+            "updated_at": datetime.now().isoformat()
+        })
+
 # Páginas HTML
 def available_slots_page(request):
     return render(request, 'appointments/available_slots.html')
@@ -590,156 +652,55 @@ def ventas_rapidas(request):
     return render(request, "appointments/ventas_rapidas.html")
 
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def appointments_list(request):
-
-    manicurist = request.GET.get("manicurist")  # employee_id
-    date = request.GET.get("date")
-
-
-    qs = Appointment.objects.filter(status="scheduled").select_related(
-        "client", "employee__user", "service"
-    )
-
-    data = []
-    for a in qs:
-
-        servicios = []
-
-        if a.service_manos:
-            servicios.append({
-                "id": str(a.service_manos.id),
-                "name": a.service_manos.name,
-                "price": a.service_manos.price
-            })
-
-        if a.service_pies:
-            servicios.append({
-                "id": str(a.service_pies.id),
-                "name": a.service_pies.name,
-                "price": a.service_pies.price
-            })
-
-    if manicurist:
-        qs = qs.filter(employee_id=manicurist)
-
-    if date:
-        qs = qs.filter(date=date)
-
-    data = [
-        {
-            "id": str(a.id),
-            "client_name": f"{a.client.first_name} {a.client.last_name}" if a.client else "Sin cliente",
-            "services": servicios,
-            "time": a.time.strftime("%H:%M"),
-            "date": str(a.date),
-            "manicurist": a.employee.user.get_full_name() if a.employee else "—",
-            "status": a.status,
-            "total_price": str(a.total_price) if a.total_price else None,
-        }
-        for a in qs.order_by("date", "time")
-    ]
+def scheduled_feed_response(request):
+    """
+    Feed común de citas agendadas (ver appointments/feed.py).
+    Filtros: ?manicurist=<employee_id>&date=YYYY-MM-DD&search=<cliente>
+    Sin ?limit devuelve la lista completa; con ?limit=N[&cursor=...] devuelve
+    {"results": [...], "next_cursor": ...} y, en la primera página, "summary"
+    con los totales del filtro.
+    """
+    try:
+        qs = scheduled_queryset(
+            manicurist=request.GET.get("manicurist"),
+            day=request.GET.get("date"),
+            search=request.GET.get("search", "").strip(),
+        )
 
+        limit = request.GET.get("limit")
+        cursor = request.GET.get("cursor")
+        if not limit and not cursor:
+            return Response([feed_row(a) for a in qs])
+
+        limit = min(int(limit or 50), MAX_FEED_LIMIT)
+        if limit < 1:
+            raise ValueError("limit inválido")
+        rows, next_cursor = scheduled_page(qs, limit, cursor)
+    except (ValueError, ValidationError):
+        return Response({"error": "Parámetros inválidos"}, status=400)
+
+    data = {"results": rows, "next_cursor": next_cursor}
+    if not cursor:
+        data["summary"] = feed_summary(qs)
     return Response(data)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def appointments_list(request):
+    return scheduled_feed_response(request)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def all_scheduled_appointments(request):
+    return scheduled_feed_response(request)
 
-    qs = Appointment.objects.filter(status="scheduled").select_related(
-        "client", "employee__user", "service_manos", "service_pies"
-    ).order_by("date", "time")
-
-    data = []
-    for a in qs:
-
-        servicios = []
-
-        if a.service_manos:
-            servicios.append({
-                "id": str(a.service_manos.id),
-                "name": a.service_manos.name,
-                "price": a.service_manos.price
-            })
-
-        if a.service_pies:
-            servicios.append({
-                "id": str(a.service_pies.id),
-                "name": a.service_pies.name,
-                "price": a.service_pies.price
-            })
-
-    data = [
-        {
-            "id": str(a.id),
-            "date": str(a.date),
-            "time": a.time.strftime("%H:%M"),
-            "client_name": f"{a.client.first_name} {a.client.last_name}" if a.client else "Sin cliente",
-            "services": servicios,
-            "manicurist_name": a.employee.user.get_full_name() if a.employee else "—",
-            "total_price": str(a.total_price) if a.total_price else None,
-            "status": a.status,
-        }
-        for a in qs
-    ]
-
-    return Response(data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def scheduled_appointments_filtered(request):
-    manicurist_id = request.GET.get("manicurist")
-    date = request.GET.get("date")
-
-    qs = Appointment.objects.filter(status="scheduled").select_related(
-        "client", "employee__user", "service"
-    )
-
-    data = []
-    for a in qs:
-
-        servicios = []
-
-        if a.service_manos:
-            servicios.append({
-                "id": str(a.service_manos.id),
-                "name": a.service_manos.name,
-                "price": a.service_manos.price
-            })
-
-        if a.service_pies:
-            servicios.append({
-                "id": str(a.service_pies.id),
-                "name": a.service_pies.name,
-                "price": a.service_pies.price
-            })
-
-    if manicurist_id:
-        qs = qs.filter(employee_id=manicurist_id)
-
-    if date:
-        qs = qs.filter(date=date)
-
-    qs = qs.order_by("date", "time")
-
-    data = [
-        {
-            "id": str(a.id),
-            "date": str(a.date),
-            "time": a.time.strftime("%H:%M"),
-            "client_name": f"{a.client.first_name} {a.client.last_name}" if a.client else "Sin cliente",
-            "services": servicios,
-            "manicurist_name": a.employee.user.get_full_name() if a.employee else "—",
-            "total_price": str(a.total_price) if a.total_price else None,
-            "status": a.status,
-        }
-        for a in qs
-    ]
-
-    return Response(data)
+    return scheduled_feed_response(request)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -805,42 +766,30 @@ def create_appointment_intent(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
     
-@csrf_exempt
-def mercadopago_webhook(request):
-    data = json.loads(request.body)
-
-    payment_id = data["data"]["id"]
-
-    payment = sdk.payment().get(payment_id)
-    status = payment["response"]["status"]
-
-    if status == "approved":
-        appointment_id = payment["response"]["external_reference"]
-
-        appointment = Appointment.objects.get(id=appointment_id)
-        appointment.deposit_paid = True
-        appointment.payment_reference = payment_id
-        appointment.status = "scheduled"
-        appointment.save()
-
-    return JsonResponse({"ok": True})
-
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_pending_appointment(request):
     data = request.data
 
-    appointment = Appointment.objects.create(
-        client=request.user,
-        employee_id=data["employee"],
-        service_manos_id=data.get("service_manos"),
-        service_pies_id=data.get("service_pies"),
-        date=data["date"],
-        time=data["time"],
-        duration_hours=data["duration_hours"],
-        status="pending_payment",
-        deposit_paid=False,
-    )
+    try:
+        appointment = Appointment.objects.create(
+            client=request.user,
+            employee_id=data["employee"],
+            service_manos_id=data.get("service_manos"),
+            service_pies_id=data.get("service_pies"),
+            date=data["date"],
+            time=data["time"],
+            duration_hours=data["duration_hours"],
+            status="pending_payment",
+            deposit_paid=False,
+        )
+    except ValidationError as e:
+        # p. ej. otra reserva tomó el horario mientras se validaba
+        return Response({"error": e.messages}, status=400)
+
+    if settings.MP_ASYNC_PREFERENCES:
+        # la liga de pago se va creando en Celery mientras el cliente revisa la cita
+        request_deposit_link(appointment, amount=appointment.deposit_amount, description="Anticipo fijo $100")
 
     return Response({
         "appointment_id": appointment.id,
@@ -852,13 +801,22 @@ class AppointmentListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Appointment.objects.filter(client=self.request.user)
+        queryset = Appointment.objects.filter(client=self.request.user)
+        return AppointmentSerializer.setup_eager_loading(queryset).order_by('-date', '-time')
     
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def appointment_payment_status(request, appointment_id):
-    appt = get_object_or_404(Appointment, id=appointment_id)
+    appt = get_object_or_404(Appointment.objects.select_related("deposit_preference"), id=appointment_id)
+    # la liga de pago solo la ve el cliente de la cita o el staff
+    user = request.user
+    if not (user.is_staff or user.is_superuser or appt.client_id == user.id):
+        return Response({"error": "No tienes acceso a esta cita"}, status=403)
+    deposit = getattr(appt, "deposit_preference", None)
     return Response({
         "deposit_paid": appt.deposit_paid,
-        "status": appt.status
+        "status": appt.status,
+        # liga de pago: "pending" mientras Celery la crea, luego "ready" o "failed"
+        "payment_link_status": deposit.status if deposit else None,
+        "init_point": deposit.init_point if deposit and deposit.init_point else None,
     })
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Cierre de caja.
+
+El resumen de una caja (total, número de ventas, total por método de pago y
+citas completadas) sale de una sola consulta sobre las ventas con
+Sale.cash_register = caja. Al cerrar, la fila de la caja se bloquea
+(select_for_update) para que dos cierres simultáneos no se pisen, las
+ventas del día que quedaron sin caja se le asignan, y el resumen se guarda
+en la misma caja: los reportes posteriores leen esa fila en vez de volver a
+sumar ventas.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from sales.models import Sale
+from sales.rollups import day_bounds
+
+from .models import CashRegister
+
+SUMMARY_FIELDS = [
+    "sales_total", "sales_count", "cash_total", "card_total", "transfer_total", "completed_appointments",
+]
+
+
+def register_summary(register):
+    """Resumen de las ventas de `register` en una consulta."""
+    by_method = {
+        f"{method}_total": Sum("total", filter=Q(payment_method=method))
+        for method, _ in Sale.PAYMENT_METHODS
+    }
+    row = Sale.objects.filter(cash_register=register).aggregate(
+        sales_total=Sum("total"),
+        sales_count=Count("id"),
+        completed_appointments=Count("appointment", filter=Q(appointment__status="completed"), distinct=True),
+        **by_method,
+    )
+    return {field: row[field] or 0 for field in SUMMARY_FIELDS}
+
+
+def stored_summary(register):
+    """Resumen guardado al cerrar, o calculado al momento si la caja sigue abierta."""
+    if register.sales_total is None:
+        return register_summary(register)
+    return {field: getattr(register, field) for field in SUMMARY_FIELDS}
+
+
+def close_register(business_date, closing_amount, user):
+    """Cierra la caja abierta de `business_date`; regresa None si no había una abierta."""
+    with transaction.atomic():
+        register = CashRegister.objects.select_for_update().filter(
+            business_date=business_date, is_open=True
+        ).first()
+        if register is None:
+            return None
+
+        # ventas del día registradas sin caja (p. ej. antes de abrirla)
+        start, end = day_bounds(business_date, business_date)
+        Sale.objects.filter(cash_register__isnull=True, date__gte=start, date__lt=end).update(cash_register=register)
+
+        for field, value in register_summary(register).items():
+            setattr(register, field, value)
+        register.closing_amount = Decimal(str(closing_amount)).quantize(Decimal("0.01"))
+        register.closed_at = timezone.now()
+        register.closed_by = user
+        register.is_open = False
+        register.save()
+
+    return register
+
+
+def summary_payload(register):
+    """Resumen en el formato de la API (montos como texto)."""
+    summary = stored_summary(register)
+    return {
+        "business_date": register.business_date.isoformat(),
+        "opening_amount": str(register.opening_amount or 0),
+        "closing_amount": str(register.closing_amount) if register.closing_amount is not None else None,
+        "total_collected": str(summary["sales_total"]),
+        "total_sales": str(summary["sales_total"]),
+        "sales_count": summary["sales_count"],
+        "by_payment": {method: str(summary[f"{method}_total"]) for method, _ in Sale.PAYMENT_METHODS},
+        "completed_appointments": summary["completed_appointments"],
+    }
@@ -0,0 +1,54 @@
+from datetime import datetime, time, timedelta
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+PAYMENT_METHODS = ('cash', 'card', 'transfer')
+
+
+def backfill_registers(apps, schema_editor):
+    """
+    Antes nada asignaba Sale.cash_register: cada venta histórica se asigna a
+    la caja de su día (fecha local; si hubo varias, la última abierta) y las
+    cajas ya cerradas guardan su resumen, igual que billing.closing al cerrar.
+    """
+    CashRegister = apps.get_model('billing', 'CashRegister')
+    Sale = apps.get_model('sales', 'Sale')
+    tz = timezone.get_current_timezone()
+
+    # la última caja abierta de cada día se procesa primero y se queda con sus ventas
+    for register in CashRegister.objects.order_by('business_date', '-opened_at').iterator():
+        start = datetime.combine(register.business_date, time.min, tzinfo=tz)
+        Sale.objects.filter(
+            cash_register__isnull=True, date__gte=start, date__lt=start + timedelta(days=1)
+        ).update(cash_register=register)
+
+        if register.is_open or register.sales_total is not None:
+            continue
+
+        by_method = {
+            f'{method}_total': Sum('total', filter=Q(payment_method=method))
+            for method in PAYMENT_METHODS
+        }
+        row = Sale.objects.filter(cash_register=register).aggregate(
+            sales_total=Sum('total'),
+            sales_count=Count('id'),
+            completed_appointments=Count('appointment', filter=Q(appointment__status='completed'), distinct=True),
+            **by_method,
+        )
+        for field, value in row.items():
+            setattr(register, field, value or 0)
+        register.save(update_fields=list(row))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0008_cashregister_close_summary'),
+        ('sales', '0007_sale_register_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_registers, migrations.RunPython.noop),
+    ]
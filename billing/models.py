@@ -31,6 +31,14 @@ class CashRegister(models.Model):
         related_name="cash_closed"
     )
 
+    # resumen guardado al cerrar (billing/closing.py); None mientras la caja está abierta
+    sales_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    sales_count = models.PositiveIntegerField(null=True, blank=True)
+    cash_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    card_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    transfer_total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    completed_appointments = models.PositiveIntegerField(null=True, blank=True)
+
     class Meta:
         # evita tener dos registros abiertos para la misma fecha
         constraints = [
@@ -41,12 +49,10 @@ class CashRegister(models.Model):
         return f"Caja {self.business_date} - {'ABIERTA' if self.is_open else 'CERRADA'}"
 
     def total_collected(self):
-        """Suma las ventas cobradas asociadas a la fecha contable (usa Sale model)."""
-        try:
-            from sales.models import Sale
-            # filtramos por sales cuya date sea el mismo día (date__date)
-            qs = Sale.objects.filter(date__date=self.business_date)
-            total = qs.aggregate(total=models.Sum('total'))['total'] or Decimal('0.00')
-            return total
-        except Exception:
-            return Decimal('0.00')
\ No newline at end of file
+        """Total de las ventas de esta caja: el guardado al cerrar o, si sigue abierta, la suma al momento."""
+        if self.sales_total is not None:
+            return self.sales_total
+        from sales.models import Sale
+        return Sale.objects.filter(cash_register=self).aggregate(
+            total=models.Sum('total')
+        )['total'] or Decimal('0.00')
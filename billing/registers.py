@@ -0,0 +1,123 @@
+"""
+Caja abierta actual, con caché por proceso.
+
+Cada venta nueva se asigna a la caja abierta (Sale.cash_register) para que
+los reportes filtren por la caja en vez de por fecha. El id de la caja
+abierta se guarda en memoria del proceso y las vistas de abrir/cerrar caja lo
+invalidan; la venta solo confirma ese id por llave primaria con un bloqueo
+compartido (lock_open_register), sin buscar la caja abierta más reciente.
+Esa lectura no se puede evitar: sin ella una venta en curso mientras se
+cierra la caja quedaría en una caja ya cerrada, fuera de su resumen.
+
+Como gunicorn y Celery corren varios procesos, invalidar también cambia una
+generación en el caché compartido: cada proceso compara su copia contra esa
+generación antes de usarla (una lectura al caché en vez de una consulta). Si
+el caché no responde, la copia local dura como máximo LOCAL_TTL segundos.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import CashRegister
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "billing:open-register:gen"
+LOCAL_TTL = 30
+
+_lock = threading.Lock()
+_local = {"generation": None, "register_id": None, "loaded_at": None}
+
+
+def _generation():
+    try:
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, uuid.uuid4().hex[:12], None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+    except Exception:
+        logger.warning("No se pudo leer la generación de la caja abierta", exc_info=True)
+        return None
+
+
+def open_register_id():
+    """Id de la caja abierta más reciente (o None si no hay caja abierta)."""
+    generation = _generation()
+    with _lock:
+        loaded_at = _local["loaded_at"]
+        if loaded_at is not None and generation == _local["generation"]:
+            # sin caché compartido solo se confía en la copia por LOCAL_TTL
+            if generation is not None or time.monotonic() - loaded_at < LOCAL_TTL:
+                return _local["register_id"]
+
+    register_id = (
+        CashRegister.objects.filter(is_open=True)
+        .order_by("-opened_at")
+        .values_list("id", flat=True)
+        .first()
+    )
+    with _lock:
+        _local.update(generation=generation, register_id=register_id, loaded_at=time.monotonic())
+    return register_id
+
+
+def invalidate_open_register():
+    """Se abrió o cerró una caja: todos los procesos vuelven a consultar."""
+    with _lock:
+        _local["loaded_at"] = None
+    try:
+        cache.set(GENERATION_KEY, uuid.uuid4().hex[:12], None)
+    except Exception:
+        logger.warning("No se pudo invalidar la caja abierta en el caché compartido", exc_info=True)
+
+
+
+# bloqueo compartido por motor: las ventas no se esperan entre sí, pero el
+# SELECT ... FOR UPDATE de close_register sí espera a que terminen
+SHARE_LOCK = {
+    "mysql": " LOCK IN SHARE MODE",  # MySQL 5.7/8 y MariaDB
+    "postgresql": " FOR SHARE",
+}
+
+
+def _share_locked_open_register(register_id=None):
+    """Id de la caja abierta (`register_id` o la más reciente) con bloqueo compartido."""
+    qn = connection.ops.quote_name
+    sql = f"SELECT {qn('id')} FROM {qn(CashRegister._meta.db_table)} WHERE {qn('is_open')} = %s"
+    params = [True]
+    if register_id is not None:
+        sql += f" AND {qn('id')} = %s"
+        params.append(register_id)
+    else:
+        sql += f" ORDER BY {qn('opened_at')} DESC LIMIT 1"
+    # SQLite bloquea toda la base al escribir: no hace falta
+    sql += SHARE_LOCK.get(connection.vendor, "")
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def lock_open_register(register_id):
+    """
+    Dentro de la transacción de la venta: confirma que la caja `register_id`
+    (tomada del caché) sigue abierta y toma un bloqueo compartido sobre su fila
+    hasta el commit. Varias ventas pueden tenerlo a la vez; un cierre
+    simultáneo espera a que terminen y las incluye en su resumen. Si la caja
+    ya se cerró, regresa la caja abierta actual (también bloqueada) o None.
+    """
+    if register_id is not None:
+        locked = _share_locked_open_register(register_id)
+        if locked is not None:
+            return locked
+        # la copia local quedó vieja: la siguiente venta vuelve a consultar
+        with _lock:
+            _local["loaded_at"] = None
+
+    return _share_locked_open_register()
@@ -1,3 +1,194 @@
+import importlib
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from appointments.models import Appointment
+from employees.models import EmployeeProfile
+from sales.models import DailySalesRollup, Sale
+from users.models import CustomUser
+from .closing import close_register, summary_payload
+from .models import CashRegister
+
+backfill = importlib.import_module("billing.migrations.0009_backfill_register_sales")
+
+
+def make_appointment(client, status, day):
+    user = CustomUser.objects.create_user(username=f"emp-{status}-{day}", password="x", role="employee")
+    employee = EmployeeProfile.objects.create(
+        user=user, specialties="Gelish", working_days="Lunes a Domingo", start_time=time(10, 0), end_time=time(18, 0)
+    )
+    return Appointment.objects.create(client=client, employee=employee, date=day, time=time(11, 0), status=status)
+
+
+def make_sale(client, total, method="cash", register=None, when=None, appointment=None):
+    sale = Sale.objects.create(
+        client=client, total=Decimal(total), payment_method=method, cash_register=register, appointment=appointment
+    )
+    if when is not None:
+        # auto_now_add: la fecha se cambia después (sin tocar los acumulados)
+        Sale.objects.filter(id=sale.id).update(date=when)
+    return sale
+
+
+class CloseRegisterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+        cls.today = timezone.localdate()
+
+    def setUp(self):
+        self.register = CashRegister.objects.create(business_date=self.today, opening_amount=500)
+
+    def test_summary_from_one_aggregate(self):
+        completed = make_appointment(self.staff, "completed", self.today)
+        scheduled = make_appointment(self.staff, "scheduled", self.today)
+        make_sale(self.staff, "100", "cash", self.register, appointment=completed)
+        make_sale(self.staff, "50", "cash", self.register, appointment=completed)
+        make_sale(self.staff, "30", "card", self.register, appointment=scheduled)
+        make_sale(self.staff, "20", "transfer", self.register)
+
+        with CaptureQueriesContext(connection) as queries:
+            register = close_register(self.today, 600, self.staff)
+        # el resumen sale de una sola consulta sobre las ventas
+        self.assertEqual(sum(q["sql"].startswith("SELECT") and "sales_sale" in q["sql"] for q in queries), 1)
+
+        self.assertFalse(register.is_open)
+        self.assertEqual(register.closed_by, self.staff)
+        self.assertEqual(register.closing_amount, Decimal("600.00"))
+        self.assertEqual(register.sales_total, Decimal("200"))
+        self.assertEqual(register.sales_count, 4)
+        self.assertEqual(register.cash_total, Decimal("150"))
+        self.assertEqual(register.card_total, Decimal("30"))
+        self.assertEqual(register.transfer_total, Decimal("20"))
+        # dos ventas de la misma cita completada cuentan una vez
+        self.assertEqual(register.completed_appointments, 1)
+
+    def test_sweeps_same_day_sales_without_register(self):
+        orphan = make_sale(self.staff, "40")
+        yesterday = make_sale(self.staff, "70", when=timezone.now() - timedelta(days=1))
+
+        register = close_register(self.today, 0, self.staff)
+
+        orphan.refresh_from_db()
+        yesterday.refresh_from_db()
+        self.assertEqual(orphan.cash_register_id, register.id)
+        self.assertIsNone(yesterday.cash_register_id)
+        self.assertEqual(register.sales_total, Decimal("40"))
+
+    def test_no_open_register(self):
+        close_register(self.today, 0, self.staff)
+        self.assertIsNone(close_register(self.today, 0, self.staff))
+
+    def test_closed_register_reads_the_stored_summary(self):
+        make_sale(self.staff, "100", "card", self.register)
+        register = close_register(self.today, 0, self.staff)
+        # una venta tardía no cambia el corte ya guardado
+        make_sale(self.staff, "999", "cash", register)
+
+        register.refresh_from_db()
+        with self.assertNumQueries(0):
+            payload = summary_payload(register)
+        self.assertEqual(payload["total_sales"], "100.00")
+        self.assertEqual(payload["sales_count"], 1)
+        self.assertEqual(payload["by_payment"], {"cash": "0.00", "card": "100.00", "transfer": "0.00"})
+
+    def test_open_register_summary_is_computed(self):
+        make_sale(self.staff, "25", "cash", self.register)
+        payload = summary_payload(self.register)
+        self.assertEqual(Decimal(payload["total_sales"]), Decimal("25"))
+        self.assertIsNone(payload["closing_amount"])
+
+
+class CashApiTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def test_close_without_open_register(self):
+        response = self.api.post("/api/billing/close/", {"closing_amount": 100}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_open_close_and_report(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post("/api/billing/open/", {"opening_amount": 300}, format="json")
+        self.assertEqual(response.status_code, 201)
+        register = CashRegister.objects.get(id=response.data["cash_id"])
+        make_sale(self.staff, "120", "cash", register)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post("/api/billing/close/", {"closing_amount": 420}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["summary"]["total_sales"]), Decimal("120"))
+
+        make_sale(self.staff, "999", "cash", register)
+        response = self.api.get("/api/billing/report/", {"date": register.business_date.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["total_sales"]), Decimal("120"))
+        self.assertEqual(Decimal(response.data["closing_amount"]), Decimal("420"))
+
+    def test_report_without_register_uses_rollups(self):
+        day = timezone.localdate() - timedelta(days=3)
+        DailySalesRollup.objects.create(business_date=day, payment_method="cash", total=80, count=2)
+        DailySalesRollup.objects.create(business_date=day, payment_method="card", total=20, count=1)
+        make_appointment(self.staff, "completed", day)
+
+        response = self.api.get("/api/billing/report/", {"date": day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data["total_sales"]), Decimal("100"))
+        self.assertIsNone(response.data["closing_amount"])
+        self.assertEqual(response.data["completed_appointments"], 1)
+
+    def test_report_rejects_bad_dates(self):
+        response = self.api.get("/api/billing/report/", {"date": "ayer"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BackfillRegisterSalesTests(TestCase):
+    """Migración 0009: ventas históricas a la caja de su día y resumen de cajas cerradas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+
+    def test_assigns_sales_to_the_last_register_of_the_day(self):
+        now = timezone.now()
+        day = timezone.localdate(now - timedelta(days=2))
+        when = now - timedelta(days=2)
+        first = CashRegister.objects.create(business_date=day, is_open=False)
+        last = CashRegister.objects.create(business_date=day, is_open=False)
+        CashRegister.objects.filter(id=first.id).update(opened_at=when - timedelta(hours=2))
+        CashRegister.objects.filter(id=last.id).update(opened_at=when - timedelta(hours=1))
+        today = CashRegister.objects.create(business_date=timezone.localdate(now))
+
+        old = [make_sale(self.staff, "60", "cash", when=when), make_sale(self.staff, "40", "card", when=when)]
+        current = make_sale(self.staff, "10")
+
+        backfill.backfill_registers(apps, None)
+
+        for sale in old:
+            sale.refresh_from_db()
+            self.assertEqual(sale.cash_register_id, last.id)
+        current.refresh_from_db()
+        self.assertEqual(current.cash_register_id, today.id)
 
-# Create your tests here.
+        first.refresh_from_db()
+        last.refresh_from_db()
+        today.refresh_from_db()
+        self.assertEqual(first.sales_total, 0)
+        self.assertEqual((last.sales_total, last.sales_count), (Decimal("100"), 2))
+        self.assertEqual((last.cash_total, last.card_total), (Decimal("60"), Decimal("40")))
+        # la caja abierta sigue calculando su resumen al momento
+        self.assertIsNone(today.sales_total)
@@ -1,11 +1,14 @@
+from django.db import transaction
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from .closing import close_register, summary_payload
+from .registers import invalidate_open_register
 from .models import CashRegister
 from django.db.models import Sum
-from sales.models import Sale
+from sales.models import DailySalesRollup
 from appointments.models import Appointment
 
 
@@ -48,6 +51,8 @@ class CashOpenAPIView(APIView):
             opened_by=request.user,
             is_open=True
         )
+        # las ventas nuevas se asignan a esta caja (billing/registers.py)
+        transaction.on_commit(invalidate_open_register)
 
         return Response({"message": "Caja abierta correctamente.", "cash_id": str(cash.id)}, status=status.HTTP_201_CREATED)
 
@@ -58,32 +63,19 @@ class CashCloseAPIView(APIView):
     def post(self, request):
         today = timezone.now().date()
 
-        open_register = CashRegister.objects.filter(business_date=today, is_open=True).first()
-
-        if not open_register:
-            return Response({"error": "No hay caja abierta hoy."}, status=status.HTTP_400_BAD_REQUEST)
-
         amount = request.data.get("closing_amount", 0) or 0
         try:
             amount = float(amount)
         except Exception:
             amount = 0
 
-        open_register.closing_amount = amount
-        open_register.closed_at = timezone.now()
-        open_register.closed_by = request.user
-        open_register.is_open = False
-        open_register.save()
-
-        # después del cierre devolvemos resumen del día
-        summary = {
-            "opening_amount": str(open_register.opening_amount or 0),
-            "closing_amount": str(open_register.closing_amount or 0),
-            "total_collected": str(open_register.total_collected()),
-            "business_date": open_register.business_date.isoformat(),
-        }
+        # resumen en una consulta, con la caja bloqueada, y guardado en la caja
+        register = close_register(today, amount, request.user)
+        if register is None:
+            return Response({"error": "No hay caja abierta hoy."}, status=status.HTTP_400_BAD_REQUEST)
+        transaction.on_commit(invalidate_open_register)
 
-        return Response({"message": "Caja cerrada correctamente.", "summary": summary}, status=status.HTTP_200_OK)
+        return Response({"message": "Caja cerrada correctamente.", "summary": summary_payload(register)}, status=status.HTTP_200_OK)
 
 class CashDayReportAPIView(APIView):
     """
@@ -93,6 +85,7 @@ class CashDayReportAPIView(APIView):
 
     def get(self, request, date=None):
         # opcional ?date=YYYY-MM-DD
+        date = date or request.GET.get("date")
         if date:
             try:
                 business_date = timezone.datetime.strptime(date, "%Y-%m-%d").date()
@@ -101,22 +94,20 @@ class CashDayReportAPIView(APIView):
         else:
             business_date = timezone.localdate()
 
-        open_register = CashRegister.objects.filter(business_date=business_date).first()
-        opening_amount = open_register.opening_amount if open_register else 0
-        closing_amount = open_register.closing_amount if open_register else None
+        register = CashRegister.objects.filter(business_date=business_date).order_by("-opened_at").first()
+        if register:
+            # caja cerrada: se lee el resumen guardado; abierta: se calcula con sus ventas
+            return Response(summary_payload(register))
 
-        # datos de ventas/citas
-        try:
-            total_sales = Sale.objects.filter(date__date=business_date).aggregate(total=models.Sum('total'))['total'] or 0
-            completed_appointments = Appointment.objects.filter(date=business_date, status='completed').count()
-        except Exception:
-            total_sales = 0
-            completed_appointments = 0
+        # día sin caja: acumulado diario de ventas y citas completadas de la fecha
+        total_sales = DailySalesRollup.objects.filter(business_date=business_date).aggregate(total=Sum('total'))['total'] or 0
+        completed_appointments = Appointment.objects.filter(date=business_date, status='completed').count()
 
         return Response({
             "business_date": business_date.isoformat(),
-            "opening_amount": str(opening_amount),
-            "closing_amount": str(closing_amount) if closing_amount is not None else None,
+            "opening_amount": "0",
+            "closing_amount": None,
+            "total_collected": str(total_sales),
             "total_sales": str(total_sales),
             "completed_appointments": completed_appointments,
-        })
\ No newline at end of file
+        })
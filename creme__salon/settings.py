@@ -1,7 +1,9 @@
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import timedelta
+from celery.schedules import crontab
 
 os.environ['TZ'] = 'UTC'
 
@@ -265,6 +267,8 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# sin timeout una conexión SMTP colgada bloquea al worker indefinidamente
+EMAIL_TIMEOUT = 15
 
 
 # Permite enviar Authorization header sin que CORS lo bloquee
@@ -280,6 +284,61 @@ CORS_ALLOW_HEADERS = [
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+CELERY_TIMEZONE = TIME_ZONE
+
+# Tareas periódicas (django_celery_beat las copia a la base de datos)
+CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    # libera los horarios de citas que no pagaron el anticipo
+    "appointments-expire-unpaid": {
+        "task": "appointments.tasks.expire_unpaid_appointments",
+        "schedule": 60.0,
+    },
+    # barrido de la bandeja de webhooks por si alguna notificación no se encoló
+    "payments-webhook-inbox": {
+        "task": "payments.tasks.process_webhook_inbox",
+        "schedule": 30.0,
+    },
+    # correos pendientes de la bandeja de salida
+    "appointments-send-pending-emails": {
+        "task": "appointments.tasks.send_pending_emails",
+        "schedule": 5 * 60.0,
+    },
+    # recordatorio del día anterior a cada cita
+    "appointments-send-reminders": {
+        "task": "appointments.tasks.send_appointment_reminders",
+        "schedule": crontab(hour=18, minute=0),
+    },
+    # pagos aprobados cuyo webhook se perdió
+    "payments-reconcile": {
+        "task": "payments.tasks.reconcile_payments",
+        "schedule": 15 * 60.0,
+    },
+    # archivos de reportes viejos en MEDIA_ROOT/reports/
+    "sales-purge-reports": {
+        "task": "sales.tasks.purge_old_reports",
+        "schedule": crontab(hour=3, minute=30),
+    },
+}
+
+# -------------------------------------------------------------
+# CACHÉ (Redis, el mismo servidor que usa Celery como broker)
+# -------------------------------------------------------------
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", "redis://localhost:6379/1"),
+    }
+}
+
+# En pruebas no hay Redis ni SMTP: caché y correo en memoria
+if "test" in sys.argv:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+    EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
 SECURE_SSL_REDIRECT = True
 CSRF_COOKIE_SECURE = True
@@ -294,4 +353,14 @@ MP_SUCCESS_URL = os.getenv('MP_SUCCESS_URL')
 MP_FAILURE_URL = os.getenv('MP_FAILURE_URL')
 MP_PENDING_URL = os.getenv('MP_PENDING_URL')
 
+# Cliente HTTP de MercadoPago (payments/gateway.py)
+MP_API_BASE_URL = os.getenv('MP_API_BASE_URL', 'https://api.mercadopago.com')
+MP_CONNECT_TIMEOUT = float(os.getenv('MP_CONNECT_TIMEOUT', 3))
+MP_READ_TIMEOUT = float(os.getenv('MP_READ_TIMEOUT', 10))
+MP_POOL_SIZE = int(os.getenv('MP_POOL_SIZE', 10))
+MP_MAX_RETRIES = int(os.getenv('MP_MAX_RETRIES', 2))
+# True: la preferencia de anticipo se crea en Celery y el cliente consulta
+# /api/appointments/<id>/payment-status/ hasta que aparece el init_point
+MP_ASYNC_PREFERENCES = os.getenv('MP_ASYNC_PREFERENCES', 'False') == 'True'
+
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+from employees.schedule import parse_working_days
+
+
+def compile_working_days(apps, schema_editor):
+    EmployeeProfile = apps.get_model('employees', 'EmployeeProfile')
+    for profile in EmployeeProfile.objects.all():
+        profile.working_days_mask = parse_working_days(profile.working_days)
+        profile.save(update_fields=['working_days_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employeeprofile',
+            name='working_days_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compile_working_days, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 import uuid
 from django.db import models
 from django.conf import settings
+from django.utils.functional import cached_property
 from users.models import CustomUser
+from .schedule import WeeklySchedule, parse_working_days
 
 class EmployeeProfile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -10,8 +12,23 @@ class EmployeeProfile(models.Model):
     available = models.BooleanField(default=True)
     specialties = models.CharField(max_length=255, help_text="Ej: Uñas acrílicas, Gelish, Decorado, etc.")
     working_days = models.CharField(max_length=100, help_text="Ej: Lunes a Sábado")
+    # 🗓️ working_days compilado al guardar (bit 0 = lunes ... bit 6 = domingo)
+    working_days_mask = models.PositiveSmallIntegerField(default=0, editable=False)
     start_time = models.TimeField(default='10:00')
     end_time = models.TimeField(default='18:00')
 
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} ({'Disponible' if self.available else 'No disponible'})"
+
+    def save(self, *args, **kwargs):
+        self.working_days_mask = parse_working_days(self.working_days)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "working_days" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "working_days_mask"}
+        self.__dict__.pop("schedule", None)
+        super().save(*args, **kwargs)
+
+    @cached_property
+    def schedule(self):
+        """Horario semanal compilado; no vuelve a interpretar working_days."""
+        return WeeklySchedule(self.working_days_mask, self.start_time, self.end_time)
@@ -0,0 +1,75 @@
+"""
+Horario semanal compilado de una manicurista.
+
+EmployeeProfile.working_days es texto libre ("Lunes a Sábado",
+"lunes, miércoles, viernes"). Se interpreta una sola vez al guardar el perfil
+y se guarda como máscara de 7 bits (bit 0 = lunes ... bit 6 = domingo), así
+la validación de citas y el cálculo de horarios no vuelven a normalizar texto.
+"""
+import unicodedata
+
+DAY_NAMES = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+
+
+def normalize(text):
+    """Minúsculas y sin acentos."""
+    if not text:
+        return ""
+    text = text.lower()
+    text = ''.join(
+        c for c in unicodedata.normalize('NFD', text)
+        if unicodedata.category(c) != 'Mn'
+    )
+    return text.strip()
+
+
+_DAY_INDEX = {normalize(name): idx for idx, name in enumerate(DAY_NAMES)}
+
+
+def parse_working_days(text):
+    """
+    Convierte el texto de días laborales en máscara de bits.
+    Acepta rangos ("lunes a sábado", también "viernes a lunes"), listas
+    separadas por comas o " y ", y combinaciones ("lunes a jueves, sábado").
+    """
+    mask = 0
+    for part in normalize(text).replace(" y ", ",").split(","):
+        part = part.strip()
+        if " a " in part:
+            first, _, last = part.partition(" a ")
+            start, end = _DAY_INDEX.get(first.strip()), _DAY_INDEX.get(last.strip())
+            if start is None or end is None:
+                continue
+            idx = start
+            while True:
+                mask |= 1 << idx
+                if idx == end:
+                    break
+                idx = (idx + 1) % 7
+        elif part in _DAY_INDEX:
+            mask |= 1 << _DAY_INDEX[part]
+    return mask
+
+
+class WeeklySchedule:
+    """Máscara de días + horario por día (None los días que no trabaja)."""
+
+    __slots__ = ("mask", "hours")
+
+    def __init__(self, mask, start_time, end_time):
+        self.mask = mask
+        self.hours = tuple(
+            (start_time, end_time) if mask & (1 << day) else None
+            for day in range(7)
+        )
+
+    def works_on(self, day):
+        return bool(self.mask & (1 << day.weekday()))
+
+    def hours_for(self, day):
+        """(inicio, fin) del día o None si no trabaja."""
+        return self.hours[day.weekday()]
+
+    @property
+    def weekdays(self):
+        return {day for day in range(7) if self.mask & (1 << day)}
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import Payment
+from django.utils import timezone
+from .models import DepositPayment, Payment, WebhookEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -16,3 +17,37 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ("status",)
     search_fields = ("mp_payment_id",)
 
+
+@admin.register(DepositPayment)
+class DepositPaymentAdmin(admin.ModelAdmin):
+    list_display = (
+        "mp_payment_id",
+        "appointment",
+        "amount",
+        "mp_status",
+        "needs_review",
+        "created_at",
+    )
+    # needs_review: pagos de citas cuyo horario ya estaba ocupado (devolver o reagendar)
+    list_filter = ("needs_review", "mp_status")
+    search_fields = ("mp_payment_id",)
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "topic",
+        "mp_payment_id",
+        "status",
+        "attempts",
+        "received_at",
+        "processed_at",
+    )
+    list_filter = ("status", "topic")
+    search_fields = ("mp_payment_id",)
+    actions = ["reprocess"]
+
+    @admin.action(description="Reprocesar notificaciones")
+    def reprocess(self, request, queryset):
+        queryset.update(status="pending", attempts=0, next_attempt_at=timezone.now())
@@ -0,0 +1,181 @@
+"""
+Aplicar pagos aprobados de MercadoPago al anticipo de sus citas.
+
+Lo usan el procesamiento de la bandeja de webhooks (de a un pago) y la
+conciliación (una página de pagos a la vez). Es idempotente: si el pago, o
+algún pago de esa cita, ya se registró no hace nada, así reprocesar una
+notificación repetida o una página ya conciliada es seguro.
+
+Un pago tardío puede llegar cuando la cita ya expiró y otra reserva tomó su
+horario. Esas citas se revisan con la manicurista/día bloqueados (igual que
+una reserva nueva) y, si el horario ya no está libre, el pago se registra con
+needs_review para devolverlo o reagendar a mano en vez de confirmar la cita.
+"""
+import logging
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from appointments.availability import Timeline
+from appointments.booking import RELEASED_STATUSES, appointment_duration, employee_day_locks, has_conflict
+from appointments.cache import invalidate_day
+from appointments.models import Appointment
+
+from .models import DepositPayment
+
+APPLIED = "applied"
+ALREADY_APPLIED = "already_applied"
+NOT_APPROVED = "not_approved"
+NO_APPOINTMENT = "no_appointment"
+AMOUNT_MISMATCH = "amount_mismatch"
+# pago de una cita expirada cuyo horario ya se volvió a ocupar (needs_review)
+SLOT_CONFLICT = "slot_conflict"
+
+logger = logging.getLogger(__name__)
+
+
+def appointment_id_from(payment):
+    """UUID de la cita en external_reference, o None si no es válido."""
+    try:
+        return uuid.UUID(str(payment.get("external_reference")))
+    except ValueError:
+        return None
+
+
+def apply_deposit_payments(payments):
+    """
+    Registra los pagos `payments` (respuestas de /v1/payments) y confirma sus
+    citas. Las citas se cargan y bloquean juntas, los DepositPayment se crean
+    con bulk_create y todo ocurre en una sola transacción. Regresa el
+    resultado de cada pago, en el mismo orden.
+    """
+    outcomes = [NOT_APPROVED] * len(payments)
+    approved = [
+        (i, p, appointment_id_from(p)) for i, p in enumerate(payments)
+        if p.get("status") == "approved"
+    ]
+    for i, _, appointment_id in approved:
+        outcomes[i] = NO_APPOINTMENT
+
+    approved = [(i, p, a) for i, p, a in approved if a is not None]
+    if not approved:
+        return outcomes
+
+    payment_ids = {str(p["id"]) for _, p, _ in approved}
+    appointment_ids = {a for _, _, a in approved}
+
+    # los (manicurista, día) se bloquean antes que las citas, en el mismo orden
+    # que Appointment.save(): una cita expirada pudo perder su horario y se
+    # revisa otra vez antes de confirmarla
+    pairs = set(Appointment.objects.filter(id__in=appointment_ids).values_list("employee_id", "date"))
+
+    with ExitStack() as locks:
+        locks.enter_context(employee_day_locks(pairs))
+        appointments = Appointment.objects.select_for_update().in_bulk(appointment_ids)
+        moved = {(a.employee_id, a.date) for a in appointments.values()} - pairs
+        if moved:
+            # la cita cambió de día entre la lectura y el bloqueo
+            locks.enter_context(employee_day_locks(moved))
+
+        registered = DepositPayment.objects.filter(
+            Q(mp_payment_id__in=payment_ids) | Q(appointment_id__in=appointment_ids)
+        ).values_list("mp_payment_id", "appointment_id")
+        seen_payments = {p for p, _ in registered}
+        seen_appointments = {a for _, a in registered}
+
+        deposits = []
+        confirmed = []
+        conflicts = []
+        # horarios que recuperan en este mismo lote las citas expiradas
+        revived = Timeline()
+        for i, payment, appointment_id in approved:
+            appointment = appointments.get(appointment_id)
+            if appointment is None:
+                continue
+
+            payment_id = str(payment["id"])
+            if (
+                payment_id in seen_payments
+                or appointment_id in seen_appointments
+                or appointment.deposit_paid
+            ):
+                outcomes[i] = ALREADY_APPLIED
+                continue
+
+            # Validar monto
+            amount = Decimal(str(payment["transaction_amount"]))
+            if amount != appointment.deposit_amount:
+                outcomes[i] = AMOUNT_MISMATCH
+                continue
+
+            deposit = DepositPayment(
+                appointment=appointment,
+                mp_payment_id=payment_id,
+                mp_status=payment["status"],
+                amount=amount,
+            )
+            deposits.append(deposit)
+            appointment.deposit_paid = True
+            appointment.payment_reference = payment_id
+            seen_payments.add(payment_id)
+            seen_appointments.add(appointment_id)
+
+            if appointment.status in RELEASED_STATUSES and not _slot_still_free(appointment, revived):
+                # el pago se registra pero la cita no se confirma
+                deposit.needs_review = True
+                conflicts.append(appointment)
+                outcomes[i] = SLOT_CONFLICT
+                continue
+
+            appointment.status = "scheduled"
+            confirmed.append(appointment)
+            outcomes[i] = APPLIED
+
+        DepositPayment.objects.bulk_create(deposits)
+        # bulk_update en vez de save(): el pago ya está hecho y se registra
+        # aunque la cita ya no pase las demás validaciones de agenda
+        Appointment.objects.bulk_update(confirmed, ["deposit_paid", "status", "payment_reference"])
+        Appointment.objects.bulk_update(conflicts, ["deposit_paid", "payment_reference"])
+
+        for appointment in conflicts:
+            logger.warning(
+                "Pago %s de la cita %s: el horario ya está ocupado, requiere devolución o reagendar",
+                appointment.payment_reference, appointment.id,
+            )
+
+        # las citas confirmadas pasan a bloquear su horario
+        days = {(a.employee_id, a.date) for a in confirmed}
+
+        def invalidate():
+            for employee_id, day in days:
+                invalidate_day(employee_id, day)
+
+        transaction.on_commit(invalidate)
+
+    return outcomes
+
+
+def _slot_still_free(appointment, revived):
+    """
+    True si el horario de una cita expirada/cancelada sigue libre (se llama
+    con su día bloqueado). Si está libre se aparta en `revived` para las
+    siguientes citas del mismo lote.
+    """
+    duration = appointment_duration(appointment)
+    start = datetime.combine(appointment.date, appointment.time)
+    if has_conflict(appointment.employee_id, appointment.date, appointment.time, duration,
+                    exclude_id=appointment.id):
+        return False
+    if not revived.is_free(appointment.employee_id, start, start + duration):
+        return False
+    revived.add(appointment.employee_id, appointment.date, start, start + duration)
+    return True
+
+
+def apply_deposit_payment(payment):
+    """Igual que apply_deposit_payments para un solo pago."""
+    return apply_deposit_payments([payment])[0]
@@ -0,0 +1,44 @@
+"""
+Gateway falso para probar la conciliación sin MercadoPago.
+
+Implementa search_payments con los mismos filtros y la misma forma de
+respuesta que /v1/payments/search, sobre una lista de pagos en memoria (o
+leída de un JSON con `reconcile_payments --fake-gateway pagos.json`).
+"""
+import json
+from datetime import datetime
+
+
+class FakeGateway:
+
+    def __init__(self, payments):
+        self.payments = list(payments)
+        self.searches = []
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def search_payments(self, filters):
+        self.searches.append(dict(filters))
+
+        field = filters.get("range", "date_last_updated")
+        begin = datetime.fromisoformat(filters["begin_date"])
+        end = datetime.fromisoformat(filters["end_date"])
+
+        matches = [
+            p for p in self.payments
+            if (not filters.get("status") or p.get("status") == filters["status"])
+            and begin <= datetime.fromisoformat(p[field]) <= end
+        ]
+        matches.sort(
+            key=lambda p: (p[field], str(p["id"])),
+            reverse=filters.get("criteria") == "desc",
+        )
+
+        offset, limit = int(filters.get("offset", 0)), int(filters.get("limit", 30))
+        return {
+            "results": matches[offset:offset + limit],
+            "paging": {"total": len(matches), "limit": limit, "offset": offset},
+        }
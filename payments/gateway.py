@@ -0,0 +1,128 @@
+"""
+Cliente de MercadoPago compartido por todo el proyecto.
+
+Un solo mercadopago.SDK por proceso, con una sesión HTTP (requests.Session)
+que reutiliza conexiones keep-alive en vez de abrir una conexión TLS nueva en
+cada llamada, y timeouts de conexión/lectura configurables para que un worker
+de gunicorn no se quede esperando al proveedor indefinidamente.
+
+Configuración (settings):
+    MP_API_BASE_URL     API a usar (en pruebas, un servidor local falso)
+    MP_CONNECT_TIMEOUT  segundos para conectar
+    MP_READ_TIMEOUT     segundos esperando la respuesta
+    MP_POOL_SIZE        conexiones que se mantienen abiertas
+    MP_MAX_RETRIES      reintentos de GET ante 429/5xx (los POST no se repiten)
+"""
+import logging
+import threading
+
+import mercadopago
+import requests
+from django.conf import settings
+from mercadopago.config import Config
+from mercadopago.http.http_client import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_BASE_URL = Config().api_base_url
+
+
+class PaymentGatewayError(Exception):
+    """MercadoPago no respondió o respondió con error."""
+
+    def __init__(self, message, status=None, response=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+
+
+class PooledHttpClient(HttpClient):
+    """HttpClient del SDK sobre una sesión con pool de conexiones."""
+
+    def __init__(self, base_url, connect_timeout, read_timeout, pool_size, max_retries):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        # el SDK arma las URLs con su dominio fijo
+        if url.startswith(DEFAULT_API_BASE_URL):
+            url = self.base_url + url[len(DEFAULT_API_BASE_URL):]
+        # se ignora el timeout único del SDK: aquí se separa conexión y lectura
+        kwargs["timeout"] = self.timeout
+
+        try:
+            api_result = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            raise PaymentGatewayError(f"MercadoPago no respondió: {e}") from e
+
+        response = {"status": api_result.status_code, "response": None}
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError:
+                logger.warning("Respuesta de MercadoPago no es JSON (%s)", api_result.status_code)
+        return response
+
+
+_sdk = None
+_lock = threading.Lock()
+
+
+def get_sdk():
+    """SDK compartido; se crea la primera vez que se usa."""
+    global _sdk
+    if _sdk is None:
+        with _lock:
+            if _sdk is None:
+                http_client = PooledHttpClient(
+                    base_url=settings.MP_API_BASE_URL,
+                    connect_timeout=settings.MP_CONNECT_TIMEOUT,
+                    read_timeout=settings.MP_READ_TIMEOUT,
+                    pool_size=settings.MP_POOL_SIZE,
+                    max_retries=settings.MP_MAX_RETRIES,
+                )
+                _sdk = mercadopago.SDK(settings.MERCADOPAGO_ACCESS_TOKEN, http_client=http_client)
+    return _sdk
+
+
+def reset_sdk():
+    """Descarta el SDK compartido (p. ej. en pruebas al cambiar la configuración)."""
+    global _sdk
+    with _lock:
+        _sdk = None
+
+
+def _unwrap(result, action):
+    if result["status"] not in (200, 201):
+        raise PaymentGatewayError(
+            f"MercadoPago error al {action}: {result['status']}",
+            status=result["status"],
+            response=result["response"],
+        )
+    return result["response"]
+
+
+def create_preference(preference_data):
+    return _unwrap(get_sdk().preference().create(preference_data), "crear la preferencia")
+
+
+def get_payment(payment_id):
+    return _unwrap(get_sdk().payment().get(payment_id), f"consultar el pago {payment_id}")
+
+
+def search_payments(filters):
+    """/v1/payments/search: {"results": [...], "paging": {"total", "limit", "offset"}}."""
+    return _unwrap(get_sdk().payment().search(filters), "buscar pagos")
@@ -0,0 +1,126 @@
+"""
+Bandeja de entrada de webhooks de MercadoPago.
+
+El webhook solo guarda la notificación (record_notification) y responde 200,
+así su latencia no depende de MercadoPago. process_batch, que corre en
+Celery, procesa las pendientes por lotes:
+
+- Las notificaciones se toman con SELECT ... FOR UPDATE SKIP LOCKED y quedan
+  "rentadas" por LEASE; si el worker muere, otro las retoma al vencer.
+- Varias notificaciones del mismo pago en el lote se resuelven con una sola
+  consulta a MercadoPago, y los pagos ya registrados (DepositPayment) ni
+  siquiera se consultan.
+- Si MercadoPago falla se reintenta con espera exponencial hasta MAX_ATTEMPTS.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .deposits import apply_deposit_payment
+from .gateway import get_payment
+from .models import DepositPayment, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 8
+BASE_DELAY = timedelta(seconds=30)
+MAX_DELAY = timedelta(hours=1)
+
+
+def record_notification(payload, params):
+    """
+    Guarda la notificación tal como llegó. MercadoPago manda el tipo y el id
+    en el cuerpo ({"type": "payment", "data": {"id": ...}}) o en la query
+    (?type=payment&data.id=... o el formato viejo ?topic=payment&id=...).
+    """
+    data = payload.get("data") if isinstance(payload.get("data"), dict) else {}
+    topic = payload.get("type") or params.get("type") or params.get("topic") or ""
+    payment_id = data.get("id") or params.get("data.id") or params.get("id") or ""
+
+    return WebhookEvent.objects.create(
+        topic=str(topic)[:50],
+        mp_payment_id=str(payment_id)[:100],
+        payload={"body": payload, "query": dict(params.items())},
+    )
+
+
+def backoff(attempts):
+    return min(BASE_DELAY * (2 ** (attempts - 1)), MAX_DELAY)
+
+
+def claim_batch(size=BATCH_SIZE):
+    """Toma hasta `size` notificaciones pendientes (o con la renta vencida)."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status__in=("pending", "processing"), next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:size]
+        )
+        WebhookEvent.objects.filter(id__in=ids).update(status="processing", next_attempt_at=now + LEASE)
+    return list(WebhookEvent.objects.filter(id__in=ids))
+
+
+def _finish(events, status):
+    WebhookEvent.objects.filter(id__in=[e.id for e in events]).update(
+        status=status, processed_at=timezone.now(), last_error=""
+    )
+
+
+def _retry(events, error):
+    now = timezone.now()
+    for event in events:
+        event.attempts += 1
+        event.last_error = str(error)
+        if event.attempts >= MAX_ATTEMPTS:
+            event.status = "failed"
+        else:
+            event.status = "pending"
+            event.next_attempt_at = now + backoff(event.attempts)
+        event.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def process_batch(size=BATCH_SIZE):
+    """Procesa un lote de la bandeja; regresa los conteos del lote."""
+    events = claim_batch(size)
+    counts = defaultdict(int, claimed=len(events))
+
+    by_payment = defaultdict(list)
+    ignored = []
+    for event in events:
+        if event.topic == "payment" and event.mp_payment_id:
+            by_payment[event.mp_payment_id].append(event)
+        else:
+            ignored.append(event)
+    _finish(ignored, "ignored")
+    counts["ignored"] = len(ignored)
+
+    # pagos ya registrados: notificación repetida, no hace falta consultar
+    registered = set(
+        DepositPayment.objects.filter(mp_payment_id__in=list(by_payment)).values_list("mp_payment_id", flat=True)
+    )
+
+    for payment_id, group in by_payment.items():
+        if payment_id in registered:
+            _finish(group, "processed")
+            counts["duplicates"] += len(group)
+            continue
+
+        try:
+            outcome = apply_deposit_payment(get_payment(payment_id))
+        except Exception as e:
+            logger.warning("Webhook del pago %s falló: %s", payment_id, e)
+            _retry(group, e)
+            counts["retried"] += len(group)
+            continue
+
+        _finish(group, "processed")
+        counts[outcome] += 1
+
+    return dict(counts)
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.fake_gateway import FakeGateway
+from payments.reconciliation import PAGE_SIZE, WINDOW, reconcile
+
+
+def parse_datetime(value):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Fecha inválida: {value} (usa YYYY-MM-DD o YYYY-MM-DDTHH:MM)")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = "Concilia los pagos aprobados de MercadoPago con las citas pendientes de pago"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=parse_datetime, help="Empieza desde esta fecha (ignora el checkpoint)")
+        parser.add_argument("--until", type=parse_datetime, help="Concilia hasta esta fecha")
+        parser.add_argument("--window-hours", type=float, default=WINDOW.total_seconds() / 3600)
+        parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+        parser.add_argument("--max-pages", type=int, help="Se detiene después de N páginas")
+        parser.add_argument("--fake-gateway", metavar="JSON", help="Usa pagos de un archivo en vez de MercadoPago")
+
+    def handle(self, *args, **options):
+        gateway = FakeGateway.from_file(options["fake_gateway"]) if options["fake_gateway"] else None
+
+        counts = reconcile(
+            gateway=gateway,
+            since=options["since"],
+            until=options["until"],
+            window=timedelta(hours=options["window_hours"]),
+            page_size=options["page_size"],
+            max_pages=options["max_pages"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts.get('applied', 0)} pagos conciliados en {counts['pages']} páginas "
+            f"({counts['seconds']} s)"
+        ))
+        for outcome, count in sorted(counts.items()):
+            if outcome not in ("pages", "seconds"):
+                self.stdout.write(f"  {outcome}: {count}")
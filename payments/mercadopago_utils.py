@@ -1,7 +1,13 @@
-import mercadopago
+import logging
+
 from django.conf import settings
+from django.db import transaction
+
+from .gateway import PaymentGatewayError, create_preference
+from .models import DepositPreference
+
+logger = logging.getLogger(__name__)
 
-sdk = mercadopago.SDK(settings.MERCADOPAGO_ACCESS_TOKEN)
 
 def create_mp_preference(*, amount, description, appointment_id):
     preference_data = {
@@ -23,9 +29,70 @@ def create_mp_preference(*, amount, description, appointment_id):
         },
     }
 
-    result = sdk.preference().create(preference_data)
+    return create_preference(preference_data)
+
+
+def build_deposit_preference(deposit):
+    """Crea la preferencia en MercadoPago y guarda el init_point en `deposit`."""
+    preference = create_mp_preference(
+        amount=deposit.amount,
+        description=deposit.description,
+        appointment_id=deposit.appointment_id,
+    )
+    init_point = preference.get("init_point") if isinstance(preference, dict) else None
+    if not init_point:
+        # 200/201 sin liga de pago: se trata como cualquier error de MercadoPago
+        raise PaymentGatewayError("MercadoPago no regresó init_point", response=preference)
+
+    deposit.status = "ready"
+    deposit.preference_id = preference.get("id", "")
+    deposit.init_point = init_point
+    deposit.error = ""
+    deposit.save(update_fields=["status", "preference_id", "init_point", "error", "updated_at"])
+    return deposit
+
+
+def mark_failed(deposit, error):
+    deposit.status = "failed"
+    deposit.error = str(error)
+    deposit.save(update_fields=["status", "error", "updated_at"])
+
+
+def request_deposit_link(appointment, *, amount, description, async_mode=None):
+    """
+    Liga de pago del anticipo de `appointment`.
+
+    Si ya hay una preferencia lista para ese monto se reutiliza. En modo
+    síncrono se llama a MercadoPago aquí mismo; en modo asíncrono
+    (settings.MP_ASYNC_PREFERENCES) se encola la tarea y se regresa la
+    preferencia en "pending" para que el cliente consulte el init_point después.
+    """
+    if async_mode is None:
+        async_mode = settings.MP_ASYNC_PREFERENCES
+
+    deposit, created = DepositPreference.objects.get_or_create(
+        appointment=appointment,
+        defaults={"amount": amount, "description": description},
+    )
+    if not created:
+        if deposit.status == "pending" and async_mode:
+            return deposit
+        if deposit.status == "ready" and deposit.amount == amount:
+            return deposit
+        deposit.amount = amount
+        deposit.description = description
+        deposit.status = "pending"
+        deposit.save(update_fields=["amount", "description", "status", "updated_at"])
+
+    if not async_mode:
+        try:
+            return build_deposit_preference(deposit)
+        except Exception as e:
+            mark_failed(deposit, e)
+            raise
 
-    if result["status"] not in (200, 201):
-        raise Exception(f"MercadoPago error: {result}")
+    from .tasks import create_deposit_preference
 
-    return result["response"]
\ No newline at end of file
+    # la tarea se encola cuando la cita ya está confirmada en la base de datos
+    transaction.on_commit(lambda: create_deposit_preference.delay(str(deposit.id)))
+    return deposit
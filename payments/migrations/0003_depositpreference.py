@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_employeedaylock'),
+        ('payments', '0002_payment_mp_payment_id_payment_raw_response_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepositPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('ready', 'Lista'), ('failed', 'Falló')], default='pending', max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('description', models.CharField(max_length=200)),
+                ('preference_id', models.CharField(blank=True, max_length=100)),
+                ('init_point', models.URLField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='deposit_preference', to='appointments.appointment')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_reconciliationcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='depositpayment',
+            name='needs_review',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.contrib import admin
 from appointments.models import Appointment
 from django.views.decorators.csrf import csrf_exempt
@@ -44,8 +45,93 @@ class DepositPayment(models.Model):
     mp_status = models.CharField(max_length=30)
 
     amount = models.DecimalField(max_digits=8, decimal_places=2)
+    # el pago llegó cuando la cita ya había expirado y su horario se volvió a
+    # ocupar: la cita no se confirma y hay que devolver o reagendar a mano
+    needs_review = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Pago {self.mp_payment_id} - {self.mp_status}"
+
+
+class DepositPreference(models.Model):
+    """
+    Preferencia de MercadoPago (liga de pago) del anticipo de una cita.
+    En modo asíncrono se crea en "pending" y un worker de Celery la completa;
+    el cliente consulta el init_point en /api/appointments/<id>/payment-status/.
+    """
+    STATUS_CHOICES = (
+        ("pending", "Pendiente"),
+        ("ready", "Lista"),
+        ("failed", "Falló"),
+    )
+
+    appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.CASCADE,
+        related_name="deposit_preference"
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    description = models.CharField(max_length=200)
+    preference_id = models.CharField(max_length=100, blank=True)
+    init_point = models.URLField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Preferencia {self.appointment_id} - {self.status}"
+
+
+class WebhookEvent(models.Model):
+    """
+    Bandeja de entrada de notificaciones de MercadoPago.
+    El webhook solo guarda la notificación tal como llegó y responde 200; la
+    tarea process_webhook_inbox la procesa después (payments/inbox.py).
+    """
+    STATUS_CHOICES = (
+        ("pending", "Pendiente"),
+        ("processing", "Procesando"),
+        ("processed", "Procesada"),
+        ("ignored", "Ignorada"),
+        ("failed", "Falló"),
+    )
+
+    topic = models.CharField(max_length=50, blank=True)
+    mp_payment_id = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # la tarea toma los pendientes cuyo reintento ya venció
+            models.Index(fields=["status", "next_attempt_at"], name="webhook_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.topic} {self.mp_payment_id} - {self.status}"
+
+
+class ReconciliationCheckpoint(models.Model):
+    """
+    Hasta dónde llegó la conciliación de pagos (payments/reconciliation.py):
+    la ventana de tiempo en curso y cuántos pagos de ella ya se procesaron.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    window_start = models.DateTimeField()
+    offset = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.window_start} (+{self.offset})"
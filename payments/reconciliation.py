@@ -0,0 +1,119 @@
+"""
+Conciliación de pagos contra la búsqueda de MercadoPago.
+
+Si un webhook se pierde la cita se queda en "pending_payment" aunque el
+anticipo esté pagado. La conciliación recorre los pagos aprobados por
+ventanas de tiempo (date_last_updated) y páginas dentro de cada ventana, y
+los aplica con deposits.apply_deposit_payments: cada página se cruza en
+bloque contra Appointment (external_reference = id de la cita) y
+DepositPayment, y se guarda en una sola transacción junto con el checkpoint.
+Si el proceso se corta, la siguiente corrida sigue desde la última página
+guardada.
+
+Las ventanas terminan LAG antes de ahora para no leer una ventana que
+todavía está recibiendo pagos (el offset de la página no sería estable).
+"""
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import gateway as default_gateway
+from .deposits import apply_deposit_payments
+from .models import ReconciliationCheckpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "mercadopago-payments"
+WINDOW = timedelta(hours=6)
+PAGE_SIZE = 100
+LAG = timedelta(minutes=5)
+# primera corrida sin checkpoint
+INITIAL_LOOKBACK = timedelta(days=3)
+
+
+def _mp_date(value):
+    return value.isoformat(timespec="milliseconds")
+
+
+def get_checkpoint(since=None):
+    checkpoint, _ = ReconciliationCheckpoint.objects.get_or_create(
+        name=CHECKPOINT,
+        defaults={"window_start": since or timezone.now() - INITIAL_LOOKBACK},
+    )
+    if since is not None:
+        checkpoint.window_start = since
+        checkpoint.offset = 0
+        checkpoint.save(update_fields=["window_start", "offset", "updated_at"])
+    return checkpoint
+
+
+def _save_page(checkpoint, payments, window_start, window_end, offset, done):
+    """Aplica una página y mueve el checkpoint en la misma transacción."""
+    with transaction.atomic():
+        current = ReconciliationCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        if (current.window_start, current.offset) != (window_start, offset):
+            # otra corrida (beat o el comando a mano) ya avanzó
+            return None
+
+        outcomes = apply_deposit_payments(payments)
+
+        if done:
+            current.window_start, current.offset = window_end, 0
+        else:
+            current.offset = offset + len(payments)
+        current.save(update_fields=["window_start", "offset", "updated_at"])
+
+    checkpoint.window_start, checkpoint.offset = current.window_start, current.offset
+    return outcomes
+
+
+def reconcile(gateway=None, since=None, until=None, window=WINDOW, page_size=PAGE_SIZE, max_pages=None):
+    """
+    Concilia desde el checkpoint (o `since`) hasta `until` (por defecto
+    ahora - LAG). Regresa los conteos por resultado, páginas y duración.
+    """
+    gateway = gateway or default_gateway
+    until = until or timezone.now() - LAG
+    checkpoint = get_checkpoint(since)
+
+    started = time.monotonic()
+    counts = Counter()
+    pages = 0
+
+    while checkpoint.window_start < until:
+        if max_pages is not None and pages >= max_pages:
+            break
+
+        window_start, offset = checkpoint.window_start, checkpoint.offset
+        window_end = min(window_start + window, until)
+
+        result = gateway.search_payments({
+            "status": "approved",
+            "range": "date_last_updated",
+            "begin_date": _mp_date(window_start),
+            # el rango incluye ambos extremos: se deja fuera el inicio de la siguiente ventana
+            "end_date": _mp_date(window_end - timedelta(milliseconds=1)),
+            "sort": "date_last_updated",
+            "criteria": "asc",
+            "offset": offset,
+            "limit": page_size,
+        })
+        payments = result.get("results") or []
+        total = (result.get("paging") or {}).get("total", 0)
+        done = len(payments) < page_size or offset + len(payments) >= total
+
+        outcomes = _save_page(checkpoint, payments, window_start, window_end, offset, done)
+        if outcomes is None:
+            logger.warning("Conciliación: el checkpoint cambió en otra corrida, se detiene")
+            break
+
+        pages += 1
+        counts.update(outcomes)
+
+    counts["pages"] = pages
+    counts["seconds"] = round(time.monotonic() - started, 2)
+    return dict(counts)
@@ -0,0 +1,55 @@
+import logging
+
+from celery import shared_task
+
+from . import inbox
+from .gateway import PaymentGatewayError
+from .mercadopago_utils import build_deposit_preference, mark_failed
+from .models import DepositPreference
+from .reconciliation import reconcile
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(PaymentGatewayError,),
+    retry_backoff=2,
+    retry_backoff_max=60,
+    retry_jitter=True,
+    max_retries=5,
+)
+def create_deposit_preference(self, deposit_id):
+    """Crea en MercadoPago la preferencia de anticipo (modo asíncrono)."""
+    deposit = DepositPreference.objects.filter(id=deposit_id, status="pending").first()
+    if deposit is None:
+        # ya se creó (tarea repetida) o la cita se borró
+        return
+
+    try:
+        build_deposit_preference(deposit)
+    except PaymentGatewayError as e:
+        if self.request.retries >= self.max_retries:
+            logger.error("No se pudo crear la preferencia %s: %s", deposit_id, e)
+            mark_failed(deposit, e)
+        raise
+
+
+@shared_task
+def process_webhook_inbox(batch_size=inbox.BATCH_SIZE):
+    """Procesa la bandeja de webhooks; si el lote salió lleno se vuelve a encolar."""
+    counts = inbox.process_batch(batch_size)
+    if counts["claimed"]:
+        logger.info("Bandeja de webhooks: %s", counts)
+    if counts["claimed"] >= batch_size:
+        process_webhook_inbox.delay(batch_size)
+    return counts
+
+
+@shared_task
+def reconcile_payments():
+    """Concilia los pagos aprobados desde el último checkpoint (beat)."""
+    counts = reconcile()
+    if counts.get("applied"):
+        logger.warning("Conciliación aplicó %s pagos sin webhook: %s", counts["applied"], counts)
+    return counts
@@ -1,3 +1,542 @@
-from django.test import TestCase
+import json
+import sys
+import threading
+import time as clock
+from datetime import date, time, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from appointments.models import Appointment, Service
+from employees.models import EmployeeProfile
+from users.models import CustomUser
+from . import gateway, inbox
+from .deposits import (
+    ALREADY_APPLIED, APPLIED, SLOT_CONFLICT, apply_deposit_payment, apply_deposit_payments,
+)
+from .fake_gateway import FakeGateway
+from .mercadopago_utils import request_deposit_link
+from .models import DepositPayment, DepositPreference, ReconciliationCheckpoint, WebhookEvent
+from .reconciliation import CHECKPOINT, reconcile
+from .tasks import create_deposit_preference
+
+
+class StubMercadoPago(BaseHTTPRequestHandler):
+    """
+    MercadoPago falso en un puerto local. `script` es una lista de
+    (status, segundos de espera[, cuerpo]) que se consume en orden; cuando
+    se acaba responde 200/201. Cada petición queda en `requests` con su puerto de
+    origen, para contar conexiones.
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive
+    script = []
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, method, body):
+        StubMercadoPago.requests.append((method, self.path, self.client_address[1]))
+        status, delay, *scripted = StubMercadoPago.script.pop(0) if StubMercadoPago.script else (None, 0)
+        clock.sleep(delay)
+
+        if status is None:
+            status = 201 if method == "POST" else 200
+        if scripted:
+            payload = scripted[0]
+        elif status >= 400:
+            payload = {"message": "error del stub"}
+        elif method == "POST":
+            reference = body.get("external_reference", "")
+            payload = {"id": f"pref-{reference}", "init_point": f"https://mp.test/checkout/{reference}"}
+        else:
+            payload = {"id": self.path.rsplit("/", 1)[-1], "status": "approved"}
+
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        self._respond("GET", {})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._respond("POST", json.loads(self.rfile.read(length) or b"{}"))
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # el cliente cortó por timeout antes de la respuesta (BrokenPipe): es lo esperado
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubServerMixin:
+    """Levanta el stub y apunta el cliente de MercadoPago hacia él."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubServer(("127.0.0.1", 0), StubMercadoPago)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings_override = override_settings(
+            MP_API_BASE_URL=f"http://127.0.0.1:{cls.server.server_address[1]}",
+            MERCADOPAGO_ACCESS_TOKEN="TEST-token",
+            MP_CONNECT_TIMEOUT=1,
+            MP_READ_TIMEOUT=0.5,
+            MP_MAX_RETRIES=2,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        gateway.reset_sdk()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        gateway.reset_sdk()
+        StubMercadoPago.script = []
+        StubMercadoPago.requests = []
+
+
+def make_appointment(username="cliente", day_offset=1):
+    client = CustomUser.objects.create_user(username=username, password="x")
+    employee = EmployeeProfile.objects.create(
+        user=CustomUser.objects.create_user(username=f"emp-{username}", password="x", role="employee"),
+        specialties="Gelish", working_days="Lunes a Domingo", start_time=time(10, 0), end_time=time(18, 0),
+    )
+    return Appointment.objects.create(
+        client=client, employee=employee, date=date.today() + timedelta(days=day_offset),
+        time=time(11, 0), status="pending_payment", deposit_amount=Decimal("100.00"),
+    )
+
+
+class GatewayClientTests(StubServerMixin, TestCase):
+
+    def test_calls_share_one_pooled_connection(self):
+        for payment_id in ("1", "2", "3"):
+            self.assertEqual(gateway.get_payment(payment_id)["id"], payment_id)
+
+        ports = {port for _, _, port in StubMercadoPago.requests}
+        self.assertEqual(len(StubMercadoPago.requests), 3)
+        self.assertEqual(len(ports), 1)
+
+    def test_read_timeout_raises_gateway_error(self):
+        StubMercadoPago.script = [(None, 2)]
+        started = clock.monotonic()
+        with self.assertRaises(gateway.PaymentGatewayError):
+            gateway.create_preference({"external_reference": "x"})
+        # no espera la respuesta completa del proveedor
+        self.assertLess(clock.monotonic() - started, 1.5)
+
+    def test_get_is_retried_on_5xx(self):
+        StubMercadoPago.script = [(503, 0), (502, 0)]
+        self.assertEqual(gateway.get_payment("7")["status"], "approved")
+        self.assertEqual(len(StubMercadoPago.requests), 3)
+
+    def test_get_gives_up_after_max_retries(self):
+        StubMercadoPago.script = [(503, 0)] * 3
+        with self.assertRaises(gateway.PaymentGatewayError) as ctx:
+            gateway.get_payment("7")
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertEqual(len(StubMercadoPago.requests), 3)
+
+    def test_post_is_not_retried(self):
+        StubMercadoPago.script = [(500, 0)]
+        with self.assertRaises(gateway.PaymentGatewayError) as ctx:
+            gateway.create_preference({"external_reference": "x"})
+        self.assertEqual(ctx.exception.status, 500)
+        self.assertEqual(len(StubMercadoPago.requests), 1)
+
+
+class DepositLinkTests(StubServerMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.appointment = make_appointment()
+
+    def test_sync_mode_stores_init_point(self):
+        deposit = request_deposit_link(self.appointment, amount=Decimal("100.00"), description="Anticipo",
+                                       async_mode=False)
+        self.assertEqual(deposit.status, "ready")
+        self.assertEqual(deposit.init_point, f"https://mp.test/checkout/{self.appointment.id}")
+
+        # la preferencia lista se reutiliza sin volver a llamar a MercadoPago
+        request_deposit_link(self.appointment, amount=Decimal("100.00"), description="Anticipo", async_mode=False)
+        self.assertEqual(len(StubMercadoPago.requests), 1)
+
+    def test_async_mode_only_enqueues(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            deposit = request_deposit_link(self.appointment, amount=Decimal("100.00"), description="Anticipo",
+                                           async_mode=True)
+        self.assertEqual(deposit.status, "pending")
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(StubMercadoPago.requests, [])
+
+    def test_task_retries_then_marks_failed(self):
+        deposit = DepositPreference.objects.create(
+            appointment=self.appointment, amount=Decimal("100.00"), description="Anticipo"
+        )
+        StubMercadoPago.script = [(500, 0)] * (create_deposit_preference.max_retries + 1)
+
+        # apply() corre la tarea y sus reintentos en este mismo proceso
+        with self.assertLogs("payments.tasks", "ERROR"), self.assertLogs("celery.app.trace", "ERROR"):
+            result = create_deposit_preference.apply(args=[str(deposit.id)])
+
+        self.assertTrue(result.failed())
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.status, "failed")
+        self.assertEqual(len(StubMercadoPago.requests), create_deposit_preference.max_retries + 1)
+
+    def test_task_recovers_after_transient_error(self):
+        deposit = DepositPreference.objects.create(
+            appointment=self.appointment, amount=Decimal("100.00"), description="Anticipo"
+        )
+        StubMercadoPago.script = [(503, 0)]
+
+        create_deposit_preference.apply(args=[str(deposit.id)])
+
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.status, "ready")
+        self.assertEqual(len(StubMercadoPago.requests), 2)
+
+
+class AppointmentPaymentViewTests(StubServerMixin, TestCase):
+
+    def test_only_client_or_staff_can_read_status(self):
+        appointment = make_appointment()
+        other = CustomUser.objects.create_user(username="otro", password="x")
+        staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+        url = f"/api/appointments/{appointment.id}/payment-status/"
+
+        api = APIClient()
+        api.force_authenticate(other)
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(api.get(url).status_code, 403)
+        for user in (appointment.client, staff):
+            api.force_authenticate(user)
+            self.assertEqual(api.get(url).status_code, 200, user.username)
+
+    def test_create_returns_502_when_gateway_fails(self):
+        appointment = make_appointment()
+        service = Service.objects.create(name="Gelish", price=300, category="manos")
+        StubMercadoPago.script = [(500, 0)]
+
+        api = APIClient()
+        api.force_authenticate(appointment.client)
+        with self.assertLogs("appointments.views", "ERROR"), self.assertLogs("django.request", "ERROR"):
+            response = api.post("/api/appointments/create/", {
+                "employee": str(appointment.employee_id),
+                "service_manos": service.id,
+                "date": (appointment.date + timedelta(days=1)).isoformat(),
+                "time": "11:00",
+                "deposit_paid": True,
+            }, format="json")
+
+        self.assertEqual(response.status_code, 502)
+        self.assertTrue(Appointment.objects.filter(id=response.data["appointment_id"]).exists())
+
+    def test_create_returns_502_without_init_point(self):
+        appointment = make_appointment()
+        service = Service.objects.create(name="Gelish", price=300, category="manos")
+        StubMercadoPago.script = [(201, 0, {"id": "pref-1"})]
+
+        api = APIClient()
+        api.force_authenticate(appointment.client)
+        with self.assertLogs("appointments.views", "ERROR"), self.assertLogs("django.request", "ERROR"):
+            response = api.post("/api/appointments/create/", {
+                "employee": str(appointment.employee_id),
+                "service_manos": service.id,
+                "date": (appointment.date + timedelta(days=1)).isoformat(),
+                "time": "11:00",
+                "deposit_paid": True,
+            }, format="json")
+
+        self.assertEqual(response.status_code, 502)
+        deposit = DepositPreference.objects.get(appointment_id=response.data["appointment_id"])
+        self.assertEqual(deposit.status, "failed")
+
+
+class ApplyDepositPaymentTests(TestCase):
+
+    def payment(self, appointment, payment_id):
+        return {
+            "id": payment_id,
+            "status": "approved",
+            "external_reference": str(appointment.id),
+            "transaction_amount": float(appointment.deposit_amount),
+        }
+
+    def test_pending_appointment_is_confirmed(self):
+        appointment = make_appointment()
+        self.assertEqual(apply_deposit_payment(self.payment(appointment, 1)), APPLIED)
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, "scheduled")
+        self.assertTrue(appointment.deposit_paid)
+        # repetido: no hace nada
+        self.assertEqual(apply_deposit_payment(self.payment(appointment, 1)), ALREADY_APPLIED)
+
+    def test_expired_appointment_with_free_slot_is_confirmed(self):
+        appointment = make_appointment()
+        Appointment.objects.filter(id=appointment.id).update(status="expired")
+
+        self.assertEqual(apply_deposit_payment(self.payment(appointment, 1)), APPLIED)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, "scheduled")
+
+    def test_late_payment_for_rebooked_slot_needs_review(self):
+        appointment = make_appointment()
+        Appointment.objects.filter(id=appointment.id).update(status="expired")
+        # otra clienta tomó el horario liberado
+        Appointment.objects.create(
+            client=CustomUser.objects.create_user(username="otra", password="x"),
+            employee=appointment.employee, date=appointment.date, time=appointment.time, status="scheduled",
+        )
+
+        self.assertEqual(apply_deposit_payment(self.payment(appointment, 1)), SLOT_CONFLICT)
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, "expired")
+        self.assertTrue(appointment.deposit_paid)
+        self.assertTrue(DepositPayment.objects.get(mp_payment_id="1").needs_review)
+        self.assertEqual(
+            Appointment.objects.filter(employee=appointment.employee, date=appointment.date, status="scheduled").count(),
+            1,
+        )
+        # la notificación repetida ya no cambia nada
+        self.assertEqual(apply_deposit_payment(self.payment(appointment, 1)), ALREADY_APPLIED)
+
+    def test_two_expired_appointments_for_the_same_slot_in_one_batch(self):
+        first = make_appointment("uno")
+        second = Appointment.objects.create(
+            client=CustomUser.objects.create_user(username="dos", password="x"),
+            employee=first.employee, date=first.date, time=time(12, 0), status="pending_payment",
+            deposit_amount=Decimal("100.00"),
+        )
+        Appointment.objects.filter(id=first.id).update(status="expired")
+        # la segunda se movió encima del horario de la primera y también expiró
+        Appointment.objects.filter(id=second.id).update(status="expired", time=first.time)
+        second.refresh_from_db()
+
+        outcomes = apply_deposit_payments([self.payment(first, 1), self.payment(second, 2)])
+        self.assertEqual(outcomes, [APPLIED, SLOT_CONFLICT])
+
+
+class ReconciliationTests(TestCase):
+    """Conciliación contra FakeGateway (misma forma que /v1/payments/search)."""
+
+    PAGE_SIZE = 3
+
+    def setUp(self):
+        self.until = timezone.now().replace(microsecond=0)
+        self.since = self.until - timedelta(hours=12)
+        self.appointments = [make_appointment(f"cliente{i}", day_offset=i + 1) for i in range(7)]
+        self.gateway = FakeGateway([
+            self.fake_payment(i, appointment, self.since + timedelta(minutes=30 * (i + 1)))
+            for i, appointment in enumerate(self.appointments)
+        ])
+
+    def fake_payment(self, i, appointment, updated):
+        return {
+            "id": 1000 + i,
+            "status": "approved",
+            "external_reference": str(appointment.id),
+            "transaction_amount": float(appointment.deposit_amount),
+            "date_last_updated": updated.isoformat(),
+        }
+
+    def reconcile(self, **kwargs):
+        return reconcile(gateway=self.gateway, until=self.until, page_size=self.PAGE_SIZE, **kwargs)
+
+    def test_pages_through_every_payment(self):
+        counts = self.reconcile(since=self.since)
+
+        self.assertEqual(counts[APPLIED], 7)
+        self.assertEqual(Appointment.objects.filter(status="scheduled", deposit_paid=True).count(), 7)
+        # 7 pagos de a 3 por página en dos ventanas de 6 h: 3 páginas + 1 vacía
+        self.assertEqual([s["offset"] for s in self.gateway.searches], [0, 3, 6, 0])
+
+        checkpoint = ReconciliationCheckpoint.objects.get(name=CHECKPOINT)
+        self.assertEqual((checkpoint.window_start, checkpoint.offset), (self.until, 0))
+
+    def test_resumes_from_checkpoint(self):
+        first = self.reconcile(since=self.since, max_pages=1)
+        self.assertEqual(first[APPLIED], 3)
+        checkpoint = ReconciliationCheckpoint.objects.get(name=CHECKPOINT)
+        self.assertEqual((checkpoint.window_start, checkpoint.offset), (self.since, 3))
+
+        # la siguiente corrida sigue en la página guardada, no desde el inicio
+        self.gateway.searches.clear()
+        second = self.reconcile()
+        self.assertEqual(second[APPLIED], 4)
+        self.assertEqual(self.gateway.searches[0]["offset"], 3)
+        self.assertEqual(DepositPayment.objects.count(), 7)
+
+    def test_rerun_is_idempotent(self):
+        self.reconcile(since=self.since)
+        again = self.reconcile(since=self.since)
+
+        self.assertEqual(again.get(APPLIED, 0), 0)
+        self.assertEqual(again[ALREADY_APPLIED], 7)
+        self.assertEqual(DepositPayment.objects.count(), 7)
+
+    def test_rebooked_slot_is_not_double_booked(self):
+        late = self.appointments[0]
+        Appointment.objects.filter(id=late.id).update(status="expired")
+        Appointment.objects.create(
+            client=CustomUser.objects.create_user(username="otra", password="x"),
+            employee=late.employee, date=late.date, time=late.time, status="scheduled",
+        )
+
+        counts = self.reconcile(since=self.since)
+
+        self.assertEqual(counts[SLOT_CONFLICT], 1)
+        self.assertEqual(counts[APPLIED], 6)
+        late.refresh_from_db()
+        self.assertEqual(late.status, "expired")
+        self.assertTrue(DepositPayment.objects.get(appointment=late).needs_review)
+
+
+class WebhookInboxTests(TestCase):
+
+    def setUp(self):
+        self.appointment = make_appointment()
+        patcher = mock.patch("payments.inbox.get_payment", side_effect=self.payment)
+        self.get_payment = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def payment(self, payment_id):
+        return {
+            "id": payment_id,
+            "status": "approved",
+            "external_reference": str(self.appointment.id),
+            "transaction_amount": float(self.appointment.deposit_amount),
+        }
+
+    def notify(self, payment_id, topic="payment"):
+        return inbox.record_notification({"type": topic, "data": {"id": payment_id}}, {})
+
+    def test_record_notification_reads_body_or_query(self):
+        body = self.notify("11")
+        query = inbox.record_notification({}, {"topic": "payment", "id": "12"})
+        self.assertEqual((body.topic, body.mp_payment_id), ("payment", "11"))
+        self.assertEqual((query.topic, query.mp_payment_id), ("payment", "12"))
+        self.assertEqual(body.status, "pending")
+
+    def test_repeated_notifications_query_the_payment_once(self):
+        first, second = self.notify("21"), self.notify("21")
+        other = self.notify("x", topic="merchant_order")
+
+        counts = inbox.process_batch()
+
+        self.get_payment.assert_called_once_with("21")
+        self.assertEqual(counts["claimed"], 3)
+        self.assertEqual(counts["applied"], 1)
+        self.assertEqual(counts["ignored"], 1)
+        for event, status in ((first, "processed"), (second, "processed"), (other, "ignored")):
+            event.refresh_from_db()
+            self.assertEqual(event.status, status)
+
+        # el pago ya está registrado: la notificación repetida ni se consulta
+        self.notify("21")
+        counts = inbox.process_batch()
+        self.assertEqual(counts["duplicates"], 1)
+        self.assertEqual(self.get_payment.call_count, 1)
+        self.assertEqual(DepositPayment.objects.count(), 1)
+
+    def test_claimed_events_are_leased_until_they_expire(self):
+        event = self.notify("31")
+        self.assertEqual([e.id for e in inbox.claim_batch()], [event.id])
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, "processing")
+        self.assertGreater(event.next_attempt_at, timezone.now() + inbox.LEASE - timedelta(seconds=5))
+        # rentada: otro worker no la toma
+        self.assertEqual(inbox.claim_batch(), [])
+
+        # el worker murió: al vencer la renta se vuelve a tomar
+        WebhookEvent.objects.filter(id=event.id).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([e.id for e in inbox.claim_batch()], [event.id])
+
+    @skipUnless(connection.features.has_select_for_update_skip_locked, "el motor no soporta SKIP LOCKED")
+    def test_claim_skips_locked_rows(self):
+        self.notify("41")
+        with CaptureQueriesContext(connection) as queries:
+            inbox.claim_batch()
+        self.assertTrue(any("SKIP LOCKED" in q["sql"] for q in queries))
+
+    def test_failures_back_off_exponentially_then_fail(self):
+        self.assertEqual(
+            [inbox.backoff(n) for n in (1, 2, 3, 4)],
+            [timedelta(seconds=30), timedelta(seconds=60), timedelta(seconds=120), timedelta(seconds=240)],
+        )
+        self.assertEqual(inbox.backoff(20), inbox.MAX_DELAY)
+
+        event = self.notify("51")
+        self.get_payment.side_effect = gateway.PaymentGatewayError("caído")
+        for attempt in range(1, inbox.MAX_ATTEMPTS + 1):
+            with self.assertLogs("payments.inbox", "WARNING"):
+                counts = inbox.process_batch()
+            self.assertEqual(counts["retried"], 1)
+
+            event.refresh_from_db()
+            self.assertEqual(event.attempts, attempt)
+            if attempt < inbox.MAX_ATTEMPTS:
+                self.assertEqual(event.status, "pending")
+                wait = event.next_attempt_at - timezone.now()
+                self.assertAlmostEqual(wait.total_seconds(), inbox.backoff(attempt).total_seconds(), delta=5)
+                # todavía no toca: el lote no la toma
+                self.assertEqual(inbox.process_batch()["claimed"], 0)
+                WebhookEvent.objects.filter(id=event.id).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(event.status, "failed")
+        self.assertEqual(event.last_error, "caído")
+
+
+class WebhookViewTests(TestCase):
+
+    def test_only_records_the_notification(self):
+        with mock.patch("payments.views.process_webhook_inbox.delay") as delay, \
+                mock.patch("payments.inbox.get_payment") as get_payment:
+            response = self.client.post(
+                "/api/payments/webhook/?type=payment&data.id=61", data="{}", content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.topic, event.mp_payment_id, event.status), ("payment", "61", "pending"))
+        delay.assert_called_once_with()
+        get_payment.assert_not_called()
+
+    def test_answers_200_when_the_queue_is_down(self):
+        with mock.patch("payments.views.process_webhook_inbox.delay", side_effect=OSError("broker caído")):
+            with self.assertLogs("payments.views", "WARNING"):
+                response = self.client.post(
+                    "/api/payments/webhook/", data={"type": "payment", "data": {"id": "62"}},
+                    content_type="application/json",
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebhookEvent.objects.get().mp_payment_id, "62")
+
+    def test_rejects_bodies_that_are_not_objects(self):
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.client.post("/api/payments/webhook/", data="[]", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
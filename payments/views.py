@@ -1,72 +1,52 @@
 import json
+import logging
+from decimal import Decimal
 from django.conf import settings
 from django.http import HttpResponse
 from django.shortcuts import redirect, render
-import mercadopago
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from payments.models import DepositPayment
-from .mercadopago_utils import create_mp_preference
 from rest_framework.decorators import api_view
 from rest_framework.permissions import IsAuthenticated
-from .mercadopago_utils import create_mp_preference
+from .gateway import PaymentGatewayError
+from .inbox import record_notification
+from .mercadopago_utils import request_deposit_link
+from .tasks import process_webhook_inbox
 
 from appointments.models import Appointment
 from payments.models import Payment
 
-sdk = mercadopago.SDK(settings.MERCADOPAGO_ACCESS_TOKEN)
+logger = logging.getLogger(__name__)
 
 @csrf_exempt
 def mercadopago_webhook(request):
+    """
+    Solo guarda la notificación en la bandeja y responde; el pago se consulta
+    y se aplica en Celery (payments/inbox.py), así los reintentos de
+    MercadoPago no repiten el trabajo.
+    """
     try:
-        data = json.loads(request.body)
-    except Exception:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return HttpResponse(status=400)
+    if not isinstance(data, dict):
         return HttpResponse(status=400)
 
-    if data.get("type") != "payment":
-        return HttpResponse(status=200)
-
-    payment_id = data.get("data", {}).get("id")
-    if not payment_id:
-        return HttpResponse(status=200)
-
-    payment = sdk.payment().get(payment_id)["response"]
-
-    if payment.get("status") != "approved":
-        return HttpResponse(status=200)
-
-    appointment_id = payment.get("external_reference")
-    amount = payment["transaction_amount"]
-
-    appointment = Appointment.objects.filter(id=appointment_id).first()
-    if not appointment:
-        return HttpResponse(status=200)
-
-    if appointment.deposit_paid:
-        return HttpResponse(status=200)
-
-    # Validar monto
-    if float(amount) != 100.00:
-        return HttpResponse(status=200)
-
-    # Guardar pago
-    DepositPayment.objects.create(
-        appointment=appointment,
-        mp_payment_id=payment_id,
-        mp_status=payment["status"],
-        amount=amount
-    )
+    event = record_notification(data, request.GET)
 
-    appointment.deposit_paid = True
-    appointment.status = "scheduled"
-    appointment.payment_reference = payment_id
-    appointment.save()
+    if event.topic == "payment":
+        try:
+            process_webhook_inbox.delay()
+        except Exception:
+            # la notificación ya está guardada: la tarea periódica la procesa
+            logger.warning("No se pudo encolar el procesamiento de webhooks", exc_info=True)
 
     return HttpResponse(status=200)
 
-    
+
 class CreateDepositPreferenceView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -80,17 +60,24 @@ class CreateDepositPreferenceView(APIView):
         if not appointment:
             return Response({"error": "Cita no encontrada"}, status=404)
 
-        depositAmount = 100.00
+        depositAmount = Decimal("100.00")
 
-        preference = create_mp_preference(
-            deposit_amount=depositAmount,
-            description="Anticipo fijp $100",
-            appointment_id=appointment_id
-        )
+        try:
+            deposit = request_deposit_link(
+                appointment,
+                amount=depositAmount,
+                description="Anticipo fijo $100",
+            )
+        except PaymentGatewayError:
+            logger.exception("No se pudo crear la preferencia de la cita %s", appointment_id)
+            return Response({"error": "No se pudo generar la liga de pago"}, status=502)
 
+        # en modo asíncrono la liga aún no existe: 202 y el cliente consulta
+        # /api/appointments/<id>/payment-status/ hasta que llegue el init_point
         return Response({
-            "init_point": preference["init_point"]
-        })
+            "init_point": deposit.init_point or None,
+            "payment_link_status": deposit.status,
+        }, status=200 if deposit.init_point else 202)
         
 class PaymentSuccessView(APIView):
     def get(self, request):
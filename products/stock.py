@@ -0,0 +1,59 @@
+"""
+Descuento de inventario al vender.
+
+Todo el descuento de una venta es un solo UPDATE condicional:
+
+    UPDATE product SET stock = stock - CASE id WHEN .. THEN qty .. END
+    WHERE id IN (..) AND stock >= CASE id WHEN .. THEN qty .. END
+
+La condición se evalúa con la fila bloqueada, así dos ventas simultáneas
+del último producto no pueden dejar el stock negativo: si alguna fila no
+alcanza se levanta InsufficientStock y la transacción de la venta se
+deshace completa.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, products):
+        # [(id, nombre, stock disponible, cantidad pedida), ...]
+        self.products = products
+        names = ", ".join(f"{name} (hay {stock}, se piden {wanted})" for _, name, stock, wanted in products)
+        super().__init__(f"Stock insuficiente: {names}")
+
+
+ATTEMPTS = 2
+
+
+def decrement_stock(quantities):
+    """
+    Descuenta {product_id: cantidad} de una vez. Debe llamarse dentro de la
+    transacción de la venta.
+    """
+    quantities = {pk: qty for pk, qty in quantities.items() if qty}
+    if not quantities:
+        return
+
+    wanted = Case(
+        *[When(id=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+    for _ in range(ATTEMPTS):
+        with transaction.atomic():
+            updated = Product.objects.filter(id__in=quantities, stock__gte=wanted).update(stock=F("stock") - wanted)
+            if updated == len(quantities):
+                return
+            # se deshace el descuento parcial (savepoint) para reportar el stock real
+            transaction.set_rollback(True)
+
+        short = list(Product.objects.filter(id__in=quantities, stock__lt=wanted).values_list("id", "name", "stock"))
+        if short:
+            raise InsufficientStock([(pk, name, stock, quantities[pk]) for pk, name, stock in short])
+        # nadie está corto: alguien surtió entre el UPDATE y la consulta, se intenta otra vez
+
+    # el stock siguió cambiando en cada intento: se reporta lo que se pidió
+    requested = Product.objects.filter(id__in=quantities).values_list("id", "name", "stock")
+    raise InsufficientStock([(pk, name, stock, quantities[pk]) for pk, name, stock in requested])
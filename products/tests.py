@@ -1,3 +1,102 @@
+from unittest import mock
+
+from django.db import transaction
+from django.db.models.query import QuerySet
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from sales.models import Sale, SaleItem
+from users.models import CustomUser
+from .models import Product
+from .stock import ATTEMPTS, InsufficientStock, decrement_stock
+
+
+def lost_race(times):
+    """Las primeras `times` veces el UPDATE condicional no toca filas, como si otra venta ganara."""
+    original = QuerySet.update
+    calls = []
+
+    def update(queryset, **kwargs):
+        if queryset.model is Product:
+            calls.append(kwargs)
+            if len(calls) <= times:
+                return 0
+        return original(queryset, **kwargs)
+
+    return mock.patch.object(QuerySet, "update", update), calls
+
+
+class DecrementStockTests(TestCase):
+
+    def setUp(self):
+        self.gel = Product.objects.create(name="Gel", price=100, stock=5)
+        self.lima = Product.objects.create(name="Lima", price=20, stock=2)
+
+    def stock(self):
+        return {p.name: p.stock for p in Product.objects.all()}
+
+    def test_exact_stock_reaches_zero(self):
+        with transaction.atomic():
+            decrement_stock({self.gel.id: 5, self.lima.id: 1})
+        self.assertEqual(self.stock(), {"Gel": 0, "Lima": 1})
+
+    def test_insufficient_stock_changes_nothing(self):
+        with self.assertRaises(InsufficientStock) as ctx, transaction.atomic():
+            decrement_stock({self.gel.id: 1, self.lima.id: 3})
+
+        self.assertEqual(ctx.exception.products, [(self.lima.id, "Lima", 2, 3)])
+        self.assertEqual(self.stock(), {"Gel": 5, "Lima": 2})
+
+    def test_retries_when_the_shortage_vanishes(self):
+        patch, calls = lost_race(times=1)
+        with patch, transaction.atomic():
+            decrement_stock({self.gel.id: 2})
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.stock(), {"Gel": 3, "Lima": 2})
+
+    def test_gives_up_after_attempts(self):
+        patch, calls = lost_race(times=ATTEMPTS)
+        with patch, self.assertRaises(InsufficientStock) as ctx, transaction.atomic():
+            decrement_stock({self.gel.id: 2, self.lima.id: 1})
+
+        self.assertEqual(len(calls), ATTEMPTS)
+        # nadie quedó corto en la consulta: se reporta todo lo pedido
+        self.assertEqual(
+            sorted(ctx.exception.products), sorted([(self.gel.id, "Gel", 5, 2), (self.lima.id, "Lima", 2, 1)])
+        )
+        self.assertEqual(self.stock(), {"Gel": 5, "Lima": 2})
+
+
+class SaleStockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+        self.gel = Product.objects.create(name="Gel", price=100, stock=3)
+        self.lima = Product.objects.create(name="Lima", price=20, stock=1)
+
+    def sell(self, *items):
+        return self.api.post("/api/sales/", {
+            "payment_method": "cash",
+            "items": [{"product_id": p.id, "quantity": qty, "subtotal": str(p.price * qty)} for p, qty in items],
+        }, format="json")
+
+    def test_sale_with_exact_stock(self):
+        response = self.sell((self.gel, 3), (self.lima, 1))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(list(Product.objects.order_by("id").values_list("stock", flat=True)), [0, 0])
+
+    def test_insufficient_stock_rolls_back_the_sale(self):
+        with self.assertLogs("django.request", "WARNING"):
+            response = self.sell((self.gel, 1), (self.lima, 2))
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Lima", str(response.data["items"]))
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItem.objects.exists())
+        self.assertEqual(list(Product.objects.order_by("id").values_list("stock", flat=True)), [3, 1])
@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Sale, SaleItem
+from .models import ReportJob, Sale, SaleItem
 
 admin.site.register(Sale)
 admin.site.register(SaleItem)
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "report_type", "format", "start", "end", "status", "created_at", "finished_at")
+    list_filter = ("status", "report_type", "format")
+    readonly_fields = ("dedupe_key", "error", "created_at", "updated_at", "finished_at")
@@ -0,0 +1,106 @@
+"""
+Datos del tablero de ventas.
+
+Todo el payload sale de tres consultas: una agregación condicional (total,
+conteo, hoy, mes y el desglose por método de pago en un solo SELECT), la
+serie por día de los últimos `days` días y el top de productos.
+from_rollups lee los acumulados diarios (lo que usa la vista); from_sales
+calcula lo mismo directo de Sale con límites de fecha en hora local y
+TruncDate, sirve para comparar con los acumulados y en el benchmark
+(comando benchmark_sales_dashboard).
+"""
+from datetime import timedelta
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductRollup, DailySalesRollup, Sale, SaleItem
+from .rollups import day_bounds, top_products
+
+DAYS = 15
+MAX_DAYS = 366
+TOP_ITEMS = 5
+
+METHODS = [method for method, _ in Sale.PAYMENT_METHODS]
+
+
+def _window(today, days):
+    return today - timedelta(days=days - 1), today.replace(day=1)
+
+
+def _payload(totals, by_day, top_items):
+    by_payment = [
+        {"payment_method": m, "total": totals[f"{m}_total"] or 0, "count": totals[f"{m}_count"] or 0}
+        for m in METHODS
+        if totals[f"{m}_count"]
+    ]
+    return {
+        "summary": {
+            "total_sales": float(totals["total_sales"] or 0),
+            "count_sales": totals["count_sales"] or 0
+        },
+        "today_sales": float(totals["today_sales"] or 0),
+        "month_sales": float(totals["month_sales"] or 0),
+        "by_payment": by_payment,
+        "by_day": list(by_day),
+        "top_items": top_items,
+    }
+
+
+def from_rollups(today=None, days=DAYS):
+    """Tablero desde DailySalesRollup/DailyProductRollup; by_day = últimos `days` días."""
+    today = today or timezone.localdate()
+    first_day, month_start = _window(today, days)
+    rollups = DailySalesRollup.objects.all()
+
+    by_method = {}
+    for m in METHODS:
+        by_method[f"{m}_total"] = Sum("total", filter=Q(payment_method=m))
+        by_method[f"{m}_count"] = Sum("count", filter=Q(payment_method=m))
+
+    totals = rollups.aggregate(
+        total_sales=Sum("total"),
+        count_sales=Sum("count"),
+        today_sales=Sum("total", filter=Q(business_date=today)),
+        month_sales=Sum("total", filter=Q(business_date__gte=month_start, business_date__lte=today)),
+        **by_method,
+    )
+
+    by_day = rollups.filter(business_date__gte=first_day, business_date__lte=today).values(
+        day=F("business_date")
+    ).annotate(total=Sum("total"), count=Sum("count")).order_by("day")
+
+    return _payload(totals, by_day, top_products(DailyProductRollup.objects.all(), TOP_ITEMS))
+
+
+def from_sales(today=None, days=DAYS):
+    """El mismo tablero calculado directo de Sale/SaleItem."""
+    today = today or timezone.localdate()
+    first_day, month_start = _window(today, days)
+    today_start, tomorrow = day_bounds(today, today)
+    window_start, _ = day_bounds(first_day, first_day)
+    month_bound, _ = day_bounds(month_start, month_start)
+
+    by_method = {}
+    for m in METHODS:
+        by_method[f"{m}_total"] = Sum("total", filter=Q(payment_method=m))
+        by_method[f"{m}_count"] = Count("id", filter=Q(payment_method=m))
+
+    totals = Sale.objects.aggregate(
+        total_sales=Sum("total"),
+        count_sales=Count("id"),
+        today_sales=Sum("total", filter=Q(date__gte=today_start, date__lt=tomorrow)),
+        month_sales=Sum("total", filter=Q(date__gte=month_bound, date__lt=tomorrow)),
+        **by_method,
+    )
+
+    by_day = Sale.objects.filter(date__gte=window_start, date__lt=tomorrow).annotate(
+        day=TruncDate("date")
+    ).values("day").annotate(total=Sum("total"), count=Count("id")).order_by("day")
+
+    top_items = SaleItem.objects.values("product__name").annotate(
+        total=Sum("subtotal"), count=Count("id")
+    ).order_by("-total")[:TOP_ITEMS]
+
+    return _payload(totals, by_day, list(top_items))
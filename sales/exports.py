@@ -0,0 +1,151 @@
+"""
+Exportación de ventas a Excel.
+
+El libro se arma con openpyxl en modo write-only: cada fila se escribe
+directo al archivo temporal en disco en vez de quedarse en memoria. Las
+ventas se recorren con .iterator(chunk_size=...) trayendo cliente y cita en
+el mismo SELECT y los items/productos de cada bloque con un prefetch, así la
+memoria se mantiene plana aunque el rango sea de varios años y no hay una
+consulta por venta.
+"""
+import tempfile
+from datetime import date
+
+import openpyxl
+from django.db.models import Count, Prefetch, Sum
+
+from .models import Sale, SaleItem
+from .rollups import day_bounds
+
+CHUNK_SIZE = 2000
+
+DETAIL_HEADERS = [
+    "Fecha Venta", "Cliente", "Cita Fecha/Hora", "Método pago",
+    "Producto/Servicio", "Cantidad", "Subtotal Item", "Total Venta"
+]
+
+
+def sales_queryset(start=None, end=None):
+    """
+    Ventas de start..end (fechas locales, date o "YYYY-MM-DD"; lanza
+    ValueError si no son válidas). Se filtra Sale.date por límites del día
+    en vez de date__date, así el rango usa el índice de fecha.
+    """
+    sales = Sale.objects.all().order_by("-date")
+    if start and end:
+        lower, upper = day_bounds(date.fromisoformat(str(start)), date.fromisoformat(str(end)))
+        sales = sales.filter(date__gte=lower, date__lt=upper)
+    return sales
+
+
+def sales_summary(sales):
+    """Totales, métodos de pago y top 5 de `sales` (lo comparten Excel y PDF)."""
+    totals = sales.order_by().aggregate(total=Sum("total"), count=Count("id"))
+
+    # Métodos de pago
+    by_payment = sales.order_by().values("payment_method").annotate(
+        total=Sum("total"), count=Count("id")
+    )
+
+    # Top 5 items vendidos
+    top_items = SaleItem.objects.filter(sale__in=sales.order_by()).values(
+        "product__name"
+    ).annotate(total=Sum("subtotal"), count=Count("id")).order_by("-total")[:5]
+
+    return {
+        "total": totals["total"] or 0,
+        "count": totals["count"],
+        "by_payment": list(by_payment),
+        "top_items": list(top_items),
+    }
+
+
+def _write_summary(ws, sales, start, end):
+    summary = sales_summary(sales)
+
+    ws.append(["📊 REPORTE DE VENTAS"])
+    ws.append([
+        f"Rango de fechas: {start if start else 'Inicio'} a {end if end else 'Hoy'}"
+    ])
+    ws.append([])
+
+    ws.append(["Total vendido", float(summary["total"])])
+    ws.append(["Cantidad de ventas", summary["count"]])
+    ws.append([])
+
+    ws.append(["Métodos de pago"])
+    ws.append(["Método", "Cantidad", "Total"])
+    for m in summary["by_payment"]:
+        ws.append([m["payment_method"], m["count"], float(m["total"])])
+    ws.append([])
+
+    ws.append(["Top servicios/productos"])
+    ws.append(["Producto/Servicio", "Veces vendido", "Total vendido"])
+    for t in summary["top_items"]:
+        ws.append([t["product__name"] or "Servicio", t["count"], float(t["total"])])
+
+    return summary["total"], summary["count"]
+
+
+def detail_rows(sales, chunk_size=CHUNK_SIZE):
+    """Una fila por item (o por venta sin items), leyendo las ventas por bloques."""
+    sales = sales.select_related("client", "appointment").prefetch_related(
+        Prefetch("items", queryset=SaleItem.objects.select_related("product"))
+    )
+
+    for sale in sales.iterator(chunk_size=chunk_size):
+        appt = sale.appointment
+        cita = f"{appt.date:%Y-%m-%d} {appt.time:%H:%M}" if appt else "-"
+        head = [
+            sale.date.strftime("%Y-%m-%d %H:%M"),
+            sale.client.username if sale.client else "N/A",
+            cita,
+            sale.payment_method,
+        ]
+
+        items = sale.items.all()
+        if not items:
+            yield head + ["-", "-", "-", float(sale.total)], 0
+            continue
+
+        for item in items:
+            yield head + [
+                item.product.name if item.product else "Servicio",
+                item.quantity,
+                float(item.subtotal),
+                float(sale.total),
+            ], 1
+
+
+def write_sales_workbook(target, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Escribe el reporte (Resumen + Detalle de ventas) en `target` (ruta o archivo)."""
+    sales = sales_queryset(start, end)
+    wb = openpyxl.Workbook(write_only=True)
+
+    # 🧠 HOJA 1 — DASHBOARD RESUMEN
+    total_ventas, count_ventas = _write_summary(wb.create_sheet("Resumen"), sales, start, end)
+
+    # 🧾 HOJA 2 — DETALLE
+    ws = wb.create_sheet("Detalle de ventas")
+    ws.append(DETAIL_HEADERS)
+
+    total_items = 0
+    for row, items in detail_rows(sales, chunk_size):
+        total_items += items
+        ws.append(row)
+
+    ws.append([])
+    ws.append(["Resumen"])
+    ws.append(["Total ventas:", count_ventas])
+    ws.append(["Total items vendidos:", total_items])
+    ws.append(["Ingreso total:", float(total_ventas)])
+
+    wb.save(target)
+
+
+def sales_workbook_file(start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Archivo temporal (se borra al cerrarse) con el reporte, listo para leer."""
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    write_sales_workbook(tmp, start, end, chunk_size)
+    tmp.seek(0)
+    return tmp
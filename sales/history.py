@@ -0,0 +1,116 @@
+"""
+Historial de ventas paginado por cursor.
+
+Las ventas se ordenan de la más reciente a la más vieja por (date, id) y el
+cursor es la última (date, id) entregada: la siguiente página es un
+WHERE (date, id) < cursor sobre el índice sale_date_id_idx, así pedir la
+página 500 cuesta lo mismo que la primera y no se repiten ni se saltan
+ventas aunque entren ventas nuevas mientras se navega.
+
+Modo completo: cada venta con sus items (prefetch de items y productos).
+Modo ligero (?slim=1): solo las columnas de la tabla, sin items.
+"""
+import base64
+from datetime import date, datetime
+
+from django.db.models import Prefetch, Q
+
+from .models import Sale, SaleItem
+from .rollups import day_bounds
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SLIM_FIELDS = ["id", "date", "client", "client__username", "payment_method", "total", "cash_register", "appointment"]
+
+
+def with_items(sales):
+    """Lo que SaleSerializer lee de cada venta, en 2 consultas en total (no una por venta)."""
+    return sales.select_related(
+        "client", "appointment__client", "appointment__employee__user"
+    ).prefetch_related(
+        Prefetch("items", queryset=SaleItem.objects.select_related("product"))
+    )
+
+
+def encode_cursor(sale):
+    raw = f"{sale.date.isoformat()}|{sale.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        raw = base64.urlsafe_b64decode(value.encode()).decode()
+        moment, pk = raw.split("|")
+        return datetime.fromisoformat(moment), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor inválido")
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} debe tener formato YYYY-MM-DD")
+
+
+def filter_sales(params, queryset=None):
+    """
+    Aplica los filtros de `params` (client, payment_method, start, end,
+    cash_register). Lanza ValueError si alguno no es válido.
+    """
+    sales = Sale.objects.all() if queryset is None else queryset
+
+    for param, field in (("client", "client_id"), ("cash_register", "cash_register_id")):
+        value = params.get(param)
+        if value:
+            if not value.isdigit():
+                raise ValueError(f"{param} debe ser un id")
+            sales = sales.filter(**{field: int(value)})
+
+    method = params.get("payment_method")
+    if method:
+        if method not in dict(Sale.PAYMENT_METHODS):
+            raise ValueError("payment_method no válido")
+        sales = sales.filter(payment_method=method)
+
+    # rango de fechas locales (cualquiera de los dos extremos es opcional)
+    start, end = _date_param(params, "start"), _date_param(params, "end")
+    if start:
+        sales = sales.filter(date__gte=day_bounds(start, start)[0])
+    if end:
+        sales = sales.filter(date__lt=day_bounds(end, end)[1])
+
+    return sales
+
+
+def page_size(params):
+    try:
+        size = int(params.get("limit") or PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit debe ser un número")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def history_page(params, slim=False):
+    """Regresa (ventas de la página, cursor de la siguiente o None)."""
+    sales = filter_sales(params).order_by("-date", "-id")
+
+    cursor = params.get("cursor")
+    if cursor:
+        moment, pk = decode_cursor(cursor)
+        sales = sales.filter(Q(date__lt=moment) | Q(date=moment, id__lt=pk))
+
+    if slim:
+        sales = sales.select_related("client").only(*SLIM_FIELDS)
+    else:
+        sales = with_items(sales)
+
+    size = page_size(params)
+    page = list(sales[:size + 1])
+    if len(page) > size:
+        return page[:size], encode_cursor(page[size - 1])
+    return page, None
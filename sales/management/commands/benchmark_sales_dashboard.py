@@ -0,0 +1,133 @@
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from products.models import Product
+from sales import dashboard
+from sales.models import Sale, SaleItem
+from sales.rollups import rebuild
+from users.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_dashboard():
+    """La vista anterior: una consulta por dato, date__date y .extra() (solo para comparar)."""
+    qs = Sale.objects.all()
+    today = date.today()
+    month_start = today.replace(day=1)
+
+    total_sales = qs.aggregate(total=Sum('total'))['total'] or 0
+    count_sales = qs.count()
+    today_sales = qs.filter(date__date=today).aggregate(t=Sum('total'))['t'] or 0
+    month_sales = qs.filter(date__date__gte=month_start).aggregate(t=Sum('total'))['t'] or 0
+    by_payment = list(qs.values('payment_method').annotate(total=Sum('total'), count=Count('id')))
+    by_day = list(qs.extra({"day": "date(date)"}).values("day").annotate(
+        total=Sum("total"), count=Count("id")
+    ).order_by("day")[:15])
+    top = list(SaleItem.objects.values('product__name').annotate(
+        total=Sum('subtotal'), count=Count('id')
+    ).order_by('-total')[:5])
+    return total_sales, count_sales, today_sales, month_sales, by_payment, by_day, top
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara consultas y tiempo del tablero de ventas: vista anterior, "
+        "agregación condicional sobre Sale y acumulados diarios"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Crea N ventas de prueba (se deshacen al terminar)")
+        parser.add_argument("--years", type=int, default=3, help="Años de historial de las ventas de prueba")
+        parser.add_argument("--days", type=int, default=dashboard.DAYS)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self.seed(options["seed"], options["years"])
+                self.measure(options["days"], options["repeat"])
+                if options["seed"]:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write("Ventas de prueba eliminadas")
+
+    def seed(self, count, years, batch_size=5000):
+        started = time.perf_counter()
+        client = CustomUser.objects.create(username=f"benchmark-{int(time.time())}")
+        Product.objects.bulk_create(Product(name=f"benchmark {i}", price=150, stock=0) for i in range(20))
+        products = list(Product.objects.filter(name__startswith="benchmark "))
+        methods = [m for m, _ in Sale.PAYMENT_METHODS]
+        now = timezone.now()
+        span = years * 365 * 24 * 3600
+
+        # auto_now_add pondría la hora actual a todas: se apaga mientras se siembra
+        date_field = Sale._meta.get_field("date")
+        date_field.auto_now_add = False
+        try:
+            for offset in range(0, count, batch_size):
+                Sale.objects.bulk_create(
+                    Sale(
+                        client=client, payment_method=random.choice(methods), total=Decimal(150),
+                        date=now - timedelta(seconds=random.randrange(span)), notes="benchmark",
+                    )
+                    for _ in range(min(batch_size, count - offset))
+                )
+        finally:
+            date_field.auto_now_add = True
+
+        items = (
+            SaleItem(sale_id=sale_id, product=random.choice(products), quantity=1, subtotal=Decimal(150))
+            for sale_id in Sale.objects.filter(client=client).values_list("id", flat=True).iterator(chunk_size=batch_size)
+        )
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                break
+            SaleItem.objects.bulk_create(batch)
+
+        seeded = time.perf_counter()
+        rebuilt = rebuild()
+        self.stdout.write(
+            f"{count} ventas creadas en {seeded - started:.1f} s; acumulados "
+            f"({rebuilt['sales']} + {rebuilt['products']} filas) en {time.perf_counter() - seeded:.1f} s"
+        )
+
+    def measure(self, days, repeat):
+        variants = [
+            ("anterior", legacy_dashboard),
+            ("sale", lambda: dashboard.from_sales(days=days)),
+            ("acumulados", lambda: dashboard.from_rollups(days=days)),
+        ]
+        # el motor importa: los números de SQLite no sirven para MySQL en producción
+        version = ".".join(str(part) for part in connection.get_database_version())
+        self.stdout.write(
+            f"{Sale.objects.count()} ventas, by_day de {days} días, {connection.display_name} {version}"
+        )
+        self.stdout.write(f"{'variante':>12} {'consultas':>10} {'ms (mejor)':>12} {'ms (prom)':>12}")
+
+        for name, run in variants:
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    run()
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(
+                f"{name:>12} {len(ctx.captured_queries):>10} "
+                f"{min(timings):>12.2f} {sum(timings) / len(timings):>12.2f}"
+            )
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:36
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    """Llena los acumulados con el historial existente."""
+    Sale = apps.get_model('sales', 'Sale')
+    SaleItem = apps.get_model('sales', 'SaleItem')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+    DailyProductRollup = apps.get_model('sales', 'DailyProductRollup')
+
+    by_method = Sale.objects.annotate(day=TruncDate('date')).values('day', 'payment_method').annotate(
+        total=Sum('total'), count=Count('id')
+    ).order_by()
+    DailySalesRollup.objects.bulk_create([
+        DailySalesRollup(business_date=r['day'], payment_method=r['payment_method'], total=r['total'], count=r['count'])
+        for r in by_method
+    ], batch_size=1000)
+
+    by_product = SaleItem.objects.annotate(day=TruncDate('sale__date')).values('day', 'product_id').annotate(
+        name=Max('product__name'), quantity=Sum('quantity'), total=Sum('subtotal'), count=Count('id')
+    ).order_by()
+    DailyProductRollup.objects.bulk_create([
+        DailyProductRollup(
+            business_date=r['day'], product_key=r['product_id'] or 0, product_name=r['name'],
+            quantity=r['quantity'], total=r['total'], count=r['count'],
+        )
+        for r in by_product
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField()),
+                ('product_key', models.PositiveIntegerField(default=0)),
+                ('product_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business_date', 'product_key'), name='unique_product_rollup_day_product')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Efectivo'), ('card', 'Tarjeta'), ('transfer', 'Transferencia')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business_date', 'payment_method'), name='unique_sales_rollup_day_method')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_emailoutbox_dedupe_key'),
+        ('billing', '0007_alter_cashregister_unique_together_and_more'),
+        ('sales', '0005_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date', 'id'], name='sale_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['client', 'date'], name='sale_client_date_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_emailoutbox_dedupe_key'),
+        ('billing', '0008_cashregister_close_summary'),
+        ('sales', '0006_sale_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['cash_register', 'date'], name='sale_register_date_idx'),
+        ),
+    ]
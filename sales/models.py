@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from products.models import Product
@@ -28,6 +30,16 @@ class Sale(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # historial paginado por cursor (date, id) y rangos de fechas
+            models.Index(fields=["date", "id"], name="sale_date_id_idx"),
+            # historial de un cliente
+            models.Index(fields=["client", "date"], name="sale_client_date_idx"),
+            # ventas de una caja (corte, tickets del corte, historial por caja)
+            models.Index(fields=["cash_register", "date"], name="sale_register_date_idx"),
+        ]
+
     def __str__(self):
         return f"Venta #{self.id} - {self.client} - ${self.total}"
 
@@ -44,3 +56,89 @@ class SaleItem(models.Model):
     
 
 
+
+class DailySalesRollup(models.Model):
+    """
+    Total y número de ventas por día (fecha local de Sale.date) y método de
+    pago. Se mantiene al guardar/borrar ventas (ver sales/rollups.py).
+    """
+    business_date = models.DateField()
+    payment_method = models.CharField(max_length=20, choices=Sale.PAYMENT_METHODS)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["business_date", "payment_method"], name="unique_sales_rollup_day_method")
+        ]
+
+    def __str__(self):
+        return f"{self.business_date} {self.payment_method}: ${self.total} ({self.count})"
+
+
+class DailyProductRollup(models.Model):
+    """Items vendidos por día y producto (product_key = id del producto, 0 = servicio)."""
+    business_date = models.DateField()
+    product_key = models.PositiveIntegerField(default=0)
+    # nombre al momento de la venta; None para servicios
+    product_name = models.CharField(max_length=100, null=True, blank=True)
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["business_date", "product_key"], name="unique_product_rollup_day_product")
+        ]
+
+    def __str__(self):
+        return f"{self.business_date} {self.product_name or 'Servicio'}: ${self.total} ({self.count})"
+
+
+class ReportJob(models.Model):
+    """
+    Reporte generado en segundo plano (ver sales/reports.py). `dedupe_key`
+    solo está puesta mientras el reporte se puede reutilizar: pedir el mismo
+    tipo, formato y rango regresa este trabajo en vez de crear otro.
+    """
+
+    REPORT_TYPES = (
+        ('sales', 'Ventas'),
+    )
+
+    FORMATS = (
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+        ('pdf', 'PDF'),
+    )
+
+    STATUS_CHOICES = (
+        ('pending', 'Pendiente'),
+        ('running', 'Generando'),
+        ('done', 'Listo'),
+        ('failed', 'Falló'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPES, default='sales')
+    format = models.CharField(max_length=10, choices=FORMATS, default='xlsx')
+    start = models.DateField(null=True, blank=True)
+    end = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='reports/%Y/%m/', blank=True)
+    error = models.TextField(blank=True)
+    dedupe_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'finished_at'], name='report_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.report_type} ({self.format}) {self.start or 'inicio'} - {self.end or 'hoy'} [{self.status}]"
@@ -0,0 +1,222 @@
+"""
+Reportes en segundo plano.
+
+Los reportes grandes no se generan en la petición: POST /api/sales/reports/
+crea un ReportJob, la tarea generate_report escribe el archivo (Excel, CSV o
+PDF) en MEDIA_ROOT/reports/ y el navegador consulta el estado hasta que
+puede descargarlo.
+
+Pedir el mismo reporte (tipo, formato y rango) mientras uno está en cola,
+generándose o terminado hace menos de REUSE_FOR regresa ese mismo trabajo:
+la llave única dedupe_key evita que varios clics creen varios archivos. La
+llave se libera cuando el trabajo falla o cuando el archivo ya es viejo; un
+trabajo que lleva más de RUNNING_LEASE sin terminar (worker caído) se marca
+como fallido.
+"""
+import csv
+import io
+import logging
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .exports import (
+    CHUNK_SIZE, DETAIL_HEADERS, detail_rows, sales_queryset, sales_summary,
+    write_sales_workbook,
+)
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+REUSE_FOR = timedelta(minutes=10)
+RUNNING_LEASE = timedelta(minutes=30)
+# los archivos generados se borran pasado este tiempo (tarea purge_reports)
+KEEP_FOR = timedelta(days=7)
+
+CONTENT_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "pdf": "application/pdf",
+}
+
+
+def write_sales_csv(target, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Detalle de ventas en CSV (con BOM para que Excel respete los acentos)."""
+    text = io.TextIOWrapper(target, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(DETAIL_HEADERS)
+    for row, _ in detail_rows(sales_queryset(start, end), chunk_size):
+        writer.writerow(row)
+    text.flush()
+    text.detach()  # el archivo lo cierra quien lo abrió
+
+
+def write_sales_pdf(target, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Resumen y detalle de ventas en PDF, una página nueva cuando se llena."""
+    sales = sales_queryset(start, end)
+    summary = sales_summary(sales)
+
+    p = canvas.Canvas(target, pagesize=letter)
+    width, height = letter
+    y = height - 50
+
+    def line(text, x=40, font="Helvetica", size=10, step=16):
+        nonlocal y
+        if y < 50:
+            p.showPage()
+            y = height - 50
+        p.setFont(font, size)
+        p.drawString(x, y, text)
+        y -= step
+
+    line("REPORTE DE VENTAS", x=200, font="Helvetica-Bold", size=16, step=24)
+    line(f"Rango de fechas: {start if start else 'Inicio'} a {end if end else 'Hoy'}", step=24)
+
+    line(f"Total vendido: ${summary['total']}", font="Helvetica-Bold", size=12)
+    line(f"Cantidad de ventas: {summary['count']}", font="Helvetica-Bold", size=12, step=24)
+
+    line("Métodos de pago", font="Helvetica-Bold", size=12)
+    for m in summary["by_payment"]:
+        line(f"- {m['payment_method']}: {m['count']} ventas  ${m['total']}", x=60)
+    y -= 8
+
+    line("Top servicios/productos", font="Helvetica-Bold", size=12)
+    for t in summary["top_items"]:
+        line(f"- {t['product__name'] or 'Servicio'}: {t['count']}  ${t['total']}", x=60)
+    y -= 8
+
+    line("Detalle de ventas", font="Helvetica-Bold", size=12)
+    for row, _ in detail_rows(sales, chunk_size):
+        fecha, cliente, _, metodo, item, cantidad, subtotal, total = row
+        line(f"{fecha}  {cliente}  {metodo}  {item} x{cantidad}  ${subtotal}  (venta ${total})", size=8, step=12)
+
+    p.showPage()
+    p.save()
+
+
+WRITERS = {
+    "xlsx": write_sales_workbook,
+    "csv": write_sales_csv,
+    "pdf": write_sales_pdf,
+}
+
+
+def report_key(report_type, fmt, start, end):
+    return f"{report_type}:{fmt}:{start or '-'}:{end or '-'}"
+
+
+def report_filename(job):
+    return f"reporte_ventas_{job.start or 'inicio'}_{job.end or 'hoy'}.{job.format}"
+
+
+def fail_stuck_jobs(now):
+    """
+    Marca como fallidos los trabajos que llevan más de RUNNING_LEASE en cola o
+    generándose (worker caído o tarea que nunca corrió): así el navegador deja
+    de consultar y purge_reports los puede borrar.
+    """
+    return ReportJob.objects.filter(
+        status__in=("pending", "running"), updated_at__lt=now - RUNNING_LEASE
+    ).update(
+        status="failed", error="El reporte no terminó a tiempo", dedupe_key=None,
+        finished_at=now, updated_at=now,
+    )
+
+
+def _release_stale(key, now):
+    """Quita la llave a la corrida anterior si ya no se debe reutilizar."""
+    fail_stuck_jobs(now)
+    ReportJob.objects.filter(dedupe_key=key).filter(
+        Q(status="failed") | Q(status="done", finished_at__lt=now - REUSE_FOR)
+    ).update(dedupe_key=None)
+
+
+def request_report(report_type, fmt, start=None, end=None, user=None):
+    """
+    Regresa (job, created). Si ya hay un trabajo reutilizable para el mismo
+    reporte se regresa ese; si no, se crea uno y se encola al confirmar.
+    """
+    key = report_key(report_type, fmt, start, end)
+    _release_stale(key, timezone.now())
+
+    try:
+        with transaction.atomic():
+            job = ReportJob.objects.create(
+                report_type=report_type, format=fmt, start=start, end=end,
+                requested_by=user, dedupe_key=key,
+            )
+    except IntegrityError:
+        # otro clic (u otra persona) ya lo pidió
+        existing = ReportJob.objects.filter(dedupe_key=key).first()
+        if existing is not None:
+            return existing, False
+        # la llave se liberó entre el insert y la consulta: se intenta una vez más
+        return request_report(report_type, fmt, start, end, user)
+
+    def enqueue():
+        from .tasks import generate_report
+        try:
+            generate_report.delay(str(job.id))
+        except Exception as e:
+            logger.warning("No se pudo encolar el reporte %s", job.id, exc_info=True)
+            job.status = "failed"
+            job.error = f"No se pudo encolar: {e}"
+            job.dedupe_key = None
+            job.save(update_fields=["status", "error", "dedupe_key", "updated_at"])
+
+    transaction.on_commit(enqueue)
+    return job, True
+
+
+def generate(job_id):
+    """Genera el archivo de un trabajo pendiente; regresa el trabajo o None si ya lo tomó otro."""
+    claimed = ReportJob.objects.filter(id=job_id, status="pending").update(
+        status="running", updated_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    job = ReportJob.objects.get(id=job_id)
+    started = time.monotonic()
+    try:
+        with tempfile.TemporaryFile(suffix=f".{job.format}") as tmp:
+            WRITERS[job.format](tmp, job.start, job.end)
+            tmp.seek(0)
+            job.file.save(report_filename(job), File(tmp), save=False)
+    except Exception as e:
+        logger.exception("Falló el reporte %s", job.id)
+        job.status = "failed"
+        job.error = str(e)
+        job.dedupe_key = None
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "dedupe_key", "finished_at", "updated_at"])
+        return job
+
+    job.status = "done"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["file", "status", "finished_at", "updated_at"])
+    logger.info("Reporte %s (%s) listo en %.2f s", job.id, job.format, time.monotonic() - started)
+    return job
+
+
+def purge_reports(now=None):
+    """Borra los archivos y trabajos terminados hace más de KEEP_FOR."""
+    now = now or timezone.now()
+    fail_stuck_jobs(now)
+    cutoff = now - KEEP_FOR
+    old = ReportJob.objects.filter(status__in=("done", "failed"), finished_at__lt=cutoff)
+
+    deleted = 0
+    for job in old.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+    return deleted
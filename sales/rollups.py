@@ -0,0 +1,194 @@
+"""
+Acumulados diarios de ventas.
+
+DailySalesRollup guarda total y número de ventas por (día, método de pago)
+y DailyProductRollup total, cantidad e items por (día, producto). Los
+tableros y el corte leen de aquí en vez de sumar la tabla Sale completa con
+filtros date__date (que no usan índice), así responden igual con un mes o
+con años de historial.
+
+Se mantienen al escribir: las señales de Sale/SaleItem (sales/signals.py)
+llaman apply_sales/apply_items en la misma transacción que la venta, y los
+caminos por lote que no disparan señales (bulk_create) los llaman directo.
+rebuild() los recalcula desde Sale/SaleItem (comando rebuild_sales_rollups).
+
+El día de una venta es la fecha local (TIME_ZONE) de Sale.date.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductRollup, DailySalesRollup, Sale, SaleItem
+
+# product_key de los items sin producto (servicios)
+SERVICE = 0
+
+
+def business_date(value):
+    return timezone.localdate(value)
+
+
+def day_bounds(start, end):
+    """Límites [start 00:00, end + 1 día 00:00) en hora local, para filtrar Sale.date por índice."""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(start, time.min, tzinfo=tz),
+        datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def sale_row(sale):
+    return business_date(sale.date), sale.payment_method, Decimal(str(sale.total))
+
+
+def item_row(item, day):
+    product = item.product
+    return (
+        day,
+        product.id if product else SERVICE,
+        product.name if product else None,
+        item.quantity,
+        Decimal(str(item.subtotal)),
+    )
+
+
+def _bump_day(model, day, key_field, deltas, names=None):
+    """
+    Suma `deltas` ({llave: {campo: valor}}) a las filas de `day` en dos
+    consultas: las filas que faltan se crean en cero (INSERT que ignora las
+    que ya existen) y luego un solo UPDATE con CASE por llave. `names`
+    ({llave: nombre}) actualiza product_name.
+    """
+    keys = sorted(deltas)
+    model.objects.bulk_create(
+        [model(business_date=day, **{key_field: key}) for key in keys],
+        ignore_conflicts=True,
+    )
+
+    changes = {}
+    for field in ("total", "count", "quantity"):
+        if field not in deltas[keys[0]]:
+            continue
+        changes[field] = F(field) + Case(
+            *[When(**{key_field: key}, then=Value(deltas[key][field])) for key in keys],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+    if names:
+        changes["product_name"] = Case(
+            *[When(**{key_field: key}, then=Value(name)) for key, name in names.items()],
+            default=F("product_name"),
+        )
+    model.objects.filter(business_date=day, **{f"{key_field}__in": keys}).update(**changes)
+
+
+def apply_sales(rows, sign=1):
+    """Agrega (o quita, sign=-1) ventas dadas como (día, método, total)."""
+    by_day = defaultdict(lambda: defaultdict(lambda: {"total": 0, "count": 0}))
+    for day, method, total in rows:
+        delta = by_day[day][method]
+        delta["total"] += sign * total
+        delta["count"] += sign
+
+    # siempre en el mismo orden para no cruzar bloqueos entre transacciones
+    for day in sorted(by_day):
+        _bump_day(DailySalesRollup, day, "payment_method", by_day[day])
+
+
+def apply_items(rows, sign=1):
+    """Agrega (o quita) items dados como (día, product_key, nombre, cantidad, subtotal)."""
+    by_day = defaultdict(lambda: defaultdict(lambda: {"quantity": 0, "total": 0, "count": 0}))
+    names = defaultdict(dict)
+    for day, key, name, quantity, subtotal in rows:
+        delta = by_day[day][key]
+        delta["quantity"] += sign * quantity
+        delta["total"] += sign * subtotal
+        delta["count"] += sign
+        if sign > 0 and name:
+            # el nombre solo se muestra: se queda el de la venta más reciente
+            names[day][key] = name
+
+    for day in sorted(by_day):
+        _bump_day(DailyProductRollup, day, "product_key", by_day[day], names.get(day))
+
+
+def top_products(rollups, limit=None):
+    """
+    Items más vendidos de `rollups` (DailyProductRollup ya filtrado), con
+    las mismas llaves que la consulta sobre SaleItem: product__name, total,
+    count.
+    """
+    rows = rollups.values("product_key").annotate(
+        name=Max("product_name"), total=Sum("total"), count=Sum("count")
+    ).order_by("-total")
+    if limit:
+        rows = rows[:limit]
+    return [{"product__name": r["name"], "total": r["total"], "count": r["count"]} for r in rows]
+
+
+def rebuild(start=None, end=None):
+    """
+    Recalcula los acumulados de start..end (fechas locales, ambas
+    opcionales) desde Sale/SaleItem. Regresa cuántas filas se escribieron.
+    """
+    sales = Sale.objects.all()
+    items = SaleItem.objects.all()
+    sale_rollups = DailySalesRollup.objects.all()
+    product_rollups = DailyProductRollup.objects.all()
+
+    if start:
+        lower, _ = day_bounds(start, start)
+        sales, items = sales.filter(date__gte=lower), items.filter(sale__date__gte=lower)
+        sale_rollups = sale_rollups.filter(business_date__gte=start)
+        product_rollups = product_rollups.filter(business_date__gte=start)
+    if end:
+        _, upper = day_bounds(end, end)
+        sales, items = sales.filter(date__lt=upper), items.filter(sale__date__lt=upper)
+        sale_rollups = sale_rollups.filter(business_date__lte=end)
+        product_rollups = product_rollups.filter(business_date__lte=end)
+
+    by_method = (
+        sales.annotate(day=TruncDate("date"))
+        .values("day", "payment_method")
+        .annotate(total=Sum("total"), count=Count("id"))
+        .order_by()
+    )
+    by_product = (
+        items.annotate(day=TruncDate("sale__date"))
+        .values("day", "product_id")
+        .annotate(name=Max("product__name"), quantity=Sum("quantity"), total=Sum("subtotal"), count=Count("id"))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        sale_rollups.delete()
+        product_rollups.delete()
+
+        written = DailySalesRollup.objects.bulk_create(
+            [
+                DailySalesRollup(
+                    business_date=r["day"], payment_method=r["payment_method"],
+                    total=r["total"], count=r["count"],
+                )
+                for r in by_method
+            ],
+            batch_size=1000,
+        )
+        written_products = DailyProductRollup.objects.bulk_create(
+            [
+                DailyProductRollup(
+                    business_date=r["day"], product_key=r["product_id"] or SERVICE,
+                    product_name=r["name"], quantity=r["quantity"],
+                    total=r["total"], count=r["count"],
+                )
+                for r in by_product
+            ],
+            batch_size=1000,
+        )
+
+    return {"sales": len(written), "products": len(written_products)}
@@ -1,20 +1,24 @@
+import uuid
+from collections import Counter
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Sale, SaleItem
+from .models import ReportJob, Sale, SaleItem
+from .rollups import apply_items, business_date, item_row
 from products.models import Product
+from products.stock import InsufficientStock, decrement_stock
 from appointments.models import Appointment
+from billing.registers import lock_open_register
 
 
 class SaleItemSerializer(serializers.ModelSerializer):
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(),
-        source="product",
-        allow_null=True,
-        required=False
-    )
+    # ids simples: los productos y citas de todos los items se buscan juntos en SaleSerializer.create
+    product_id = serializers.IntegerField(required=False, allow_null=True)
+    appointment = serializers.UUIDField(source="appointment_id", required=False, allow_null=True)
 
     class Meta:
         model = SaleItem
-        fields = ['id', 'product_id', 'quantity', 'subtotal']
+        fields = ['id', 'product_id', 'appointment', 'quantity', 'subtotal']
 
 
 class SaleSerializer(serializers.ModelSerializer):
@@ -25,39 +29,123 @@ class SaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sale
         fields = ['id', 'client', 'appointment', 'date', 'payment_method', 'total', 'notes', 'items']
-        read_only_fields = ['client', 'date']
+        # el total se calcula con los subtotales de los items
+        read_only_fields = ['client', 'date', 'total']
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("La venta no tiene items.")
+        return items
+
+    def validate_appointment(self, value):
+        if not value:
+            return None
+        try:
+            return uuid.UUID(str(value))
+        except ValueError:
+            raise serializers.ValidationError("La cita no existe.")
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        appointment_uuid = validated_data.pop('appointment', None)
+        appointment_id = validated_data.pop('appointment', None)
+
+        # ✅ citas y productos de toda la venta: una consulta para cada uno
+        appointment_ids = {i['appointment_id'] for i in items_data if i.get('appointment_id')}
+        if appointment_id:
+            appointment_ids.add(appointment_id)
+        appointments = Appointment.objects.in_bulk(appointment_ids) if appointment_ids else {}
 
-        # ✅ Convertir UUID → Appointment instance
         appointment_instance = None
-        if appointment_uuid:
-            try:
-                appointment_instance = Appointment.objects.get(id=appointment_uuid)
-            except Appointment.DoesNotExist:
+        if appointment_id:
+            appointment_instance = appointments.get(appointment_id)
+            if appointment_instance is None:
                 raise serializers.ValidationError({"appointment": "La cita no existe."})
 
-        # ✅ crear venta con la instancia correcta
-        sale = Sale.objects.create(
-            appointment=appointment_instance,
-            **validated_data
-        )
+        product_ids = {i['product_id'] for i in items_data if i.get('product_id')}
+        products = Product.objects.in_bulk(product_ids) if product_ids else {}
+        missing = product_ids - products.keys()
+        if missing:
+            raise serializers.ValidationError({"items": f"No existen los productos: {sorted(missing)}"})
 
-        # ✅ crear los items
+        quantities = Counter()
         for item in items_data:
-            appt_for_item = item.get('appointment', None)
-            if appt_for_item and isinstance(appt_for_item, str):
-                try:
-                    item['appointment'] = Appointment.objects.get(id=appt_for_item)
-                except Appointment.DoesNotExist:
-                    item['appointment'] = None
-            SaleItem.objects.create(sale=sale, **item)
-
-        # ✅ marcar cita como completada
-        if appointment_instance:
-            appointment_instance.status = "completed"
-            appointment_instance.save()
+            if item.get('product_id'):
+                quantities[item['product_id']] += item.get('quantity', 1)
+
+        with transaction.atomic():
+            # ✅ la caja del caché puede haberse cerrado: se confirma con un bloqueo compartido hasta el commit
+            if 'cash_register_id' in validated_data:
+                validated_data['cash_register_id'] = lock_open_register(validated_data['cash_register_id'])
+
+            # ✅ inventario: un solo UPDATE condicional, falla si no alcanza
+            try:
+                decrement_stock(quantities)
+            except InsufficientStock as e:
+                raise serializers.ValidationError({"items": str(e)})
+
+            # ✅ crear venta con el total calculado en el servidor
+            sale = Sale.objects.create(
+                appointment=appointment_instance,
+                total=sum(item['subtotal'] for item in items_data),
+                **validated_data
+            )
+
+            # ✅ crear los items en un solo INSERT
+            items = [
+                SaleItem(
+                    sale=sale,
+                    product=products.get(item.get('product_id')),
+                    # como antes: una cita de item que no existe se ignora
+                    appointment=appointments.get(item.get('appointment_id')),
+                    quantity=item.get('quantity', 1),
+                    subtotal=item['subtotal'],
+                )
+                for item in items_data
+            ]
+            SaleItem.objects.bulk_create(items)
+            # bulk_create no dispara señales: acumulados por producto a mano
+            day = business_date(sale.date)
+            apply_items([item_row(item, day) for item in items])
+
+            # ✅ marcar cita como completada
+            if appointment_instance:
+                appointment_instance.status = "completed"
+                appointment_instance.save()
 
         return sale
+
+
+class SaleListSerializer(serializers.ModelSerializer):
+    """Venta sin items para tablas/listados (historial en modo ligero)."""
+    client_name = serializers.CharField(source='client.username', read_only=True)
+
+    class Meta:
+        model = Sale
+        fields = ['id', 'client', 'client_name', 'date', 'payment_method', 'total', 'cash_register', 'appointment']
+        read_only_fields = fields
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report_type', 'format', 'start', 'end', 'status', 'error',
+            'created_at', 'finished_at', 'download_url'
+        ]
+        read_only_fields = ['status', 'error', 'created_at', 'finished_at']
+
+    def get_download_url(self, obj):
+        if obj.status != "done":
+            return None
+        return f"/api/sales/reports/{obj.id}/download/"
+
+    def validate(self, data):
+        start, end = data.get('start'), data.get('end')
+        # igual que la exportación: el rango se aplica solo con ambas fechas
+        if bool(start) != bool(end):
+            raise serializers.ValidationError("Indica fecha de inicio y fin, o ninguna.")
+        if start and start > end:
+            raise serializers.ValidationError("La fecha de inicio es posterior a la de fin.")
+        return data
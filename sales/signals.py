@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Sale, SaleItem
+from .rollups import apply_items, apply_sales, business_date, item_row, sale_row
+
+
+# -------------------------------
+# Acumulados diarios (sales/rollups.py)
+# -------------------------------
+
+@receiver(pre_save, sender=Sale)
+def remember_previous_sale(sender, instance, **kwargs):
+    """Al editar una venta se resta lo que sumaba antes de sumar lo nuevo."""
+    instance._rollup_previous = None
+    if instance.pk:
+        previous = Sale.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._rollup_previous = sale_row(previous)
+
+
+@receiver(post_save, sender=Sale)
+def update_sales_rollup(sender, instance, **kwargs):
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous:
+        apply_sales([previous], sign=-1)
+    apply_sales([sale_row(instance)])
+
+
+@receiver(post_delete, sender=Sale)
+def remove_sale_from_rollup(sender, instance, **kwargs):
+    apply_sales([sale_row(instance)], sign=-1)
+
+
+@receiver(pre_save, sender=SaleItem)
+def remember_previous_item(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk:
+        previous = SaleItem.objects.select_related("sale", "product").filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._rollup_previous = item_row(previous, business_date(previous.sale.date))
+
+
+@receiver(post_save, sender=SaleItem)
+def update_product_rollup(sender, instance, **kwargs):
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous:
+        apply_items([previous], sign=-1)
+    apply_items([item_row(instance, business_date(instance.sale.date))])
+
+
+@receiver(post_delete, sender=SaleItem)
+def remove_item_from_rollup(sender, instance, **kwargs):
+    sale = Sale.objects.filter(pk=instance.sale_id).only("date").first()
+    if sale is not None:
+        apply_items([item_row(instance, business_date(sale.date))], sign=-1)
@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from .reports import generate, purge_reports
+
+
+@shared_task
+def generate_report(job_id):
+    """Genera el archivo de un ReportJob (ver sales/reports.py)."""
+    job = generate(job_id)
+    return job.status if job else None
+
+
+@shared_task
+def purge_old_reports():
+    """Borra los reportes generados hace más de una semana (beat, diario)."""
+    return purge_reports()
@@ -1,3 +1,303 @@
+import io
+import re
+from datetime import date, timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from billing.closing import close_register
+from billing.models import CashRegister
+from users.models import CustomUser
+from products.models import Product
+from .models import DailyProductRollup, DailySalesRollup, ReportJob, Sale, SaleItem
+from .exports import sales_queryset
+from .history import decode_cursor, history_page
+from .rollups import SERVICE, rebuild
+from .tickets import TicketWriter, render_tickets, ticket_queryset
+from .reports import RUNNING_LEASE, purge_reports, report_key, request_report
+
+
+class ReportJobPermissionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+        cls.client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        cls.job = ReportJob.objects.create(format="csv", requested_by=cls.staff)
+
+    def api(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_clients_cannot_create_reports(self):
+        response = self.api(self.client_user).post("/api/sales/reports/", {"format": "csv"}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_staff_can_create_reports(self):
+        with self.captureOnCommitCallbacks():
+            response = self.api(self.staff).post("/api/sales/reports/", {"format": "csv"}, format="json")
+        self.assertEqual(response.status_code, 202)
+
+    def test_only_staff_or_requester_can_read_a_job(self):
+        for suffix in ("", "download/"):
+            url = f"/api/sales/reports/{self.job.id}/{suffix}"
+            self.assertEqual(self.api(self.client_user).get(url).status_code, 403, url)
+            # el trabajo sigue pendiente: el staff llega hasta el 409 de la descarga
+            self.assertIn(self.api(self.staff).get(url).status_code, (200, 409), url)
+
+
+class SaleRegisterTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+
+    def create_sale(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.post(
+            "/api/sales/",
+            {"payment_method": "cash", "items": [{"subtotal": "100.00"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return Sale.objects.get(id=response.data["id"])
+
+    def test_sale_uses_the_open_register(self):
+        register = CashRegister.objects.create(business_date=date.today())
+        self.assertEqual(self.create_sale().cash_register_id, register.id)
+
+    def test_stale_cached_register_falls_back_to_the_open_one(self):
+        closed = CashRegister.objects.create(business_date=date.today())
+        close_register(closed.business_date, 0, self.staff)
+        reopened = CashRegister.objects.create(business_date=date.today())
+
+        # otro proceso todavía tiene en caché la caja ya cerrada
+        with mock.patch("sales.views.open_register_id", return_value=closed.id):
+            sale = self.create_sale()
+        self.assertEqual(sale.cash_register_id, reopened.id)
+
+    def test_stale_cached_register_without_open_register(self):
+        closed = CashRegister.objects.create(business_date=date.today())
+        close_register(closed.business_date, 0, self.staff)
+
+        with mock.patch("sales.views.open_register_id", return_value=closed.id):
+            sale = self.create_sale()
+        self.assertIsNone(sale.cash_register_id)
+
+
+class StuckReportJobTests(TestCase):
+
+    def stuck_job(self, status):
+        key = report_key("sales", "csv", None, None)
+        job = ReportJob.objects.create(format="csv", status=status, dedupe_key=key)
+        # update() no toca auto_now: el trabajo quedó sin avanzar desde hace rato
+        ReportJob.objects.filter(id=job.id).update(
+            updated_at=timezone.now() - RUNNING_LEASE - timedelta(minutes=1)
+        )
+        return job
+
+    def test_stuck_jobs_fail_when_the_report_is_requested_again(self):
+        for status in ("pending", "running"):
+            with self.subTest(status=status):
+                stuck = self.stuck_job(status)
+                with self.captureOnCommitCallbacks():
+                    job, created = request_report("sales", "csv")
+
+                self.assertTrue(created)
+                self.assertNotEqual(job.id, stuck.id)
+                stuck.refresh_from_db()
+                self.assertEqual(stuck.status, "failed")
+                self.assertIsNone(stuck.dedupe_key)
+                self.assertIsNotNone(stuck.finished_at)
+                self.assertTrue(stuck.error)
+                job.delete()
+
+    def test_recent_running_job_is_reused(self):
+        running = ReportJob.objects.create(
+            format="csv", status="running", dedupe_key=report_key("sales", "csv", None, None)
+        )
+        job, created = request_report("sales", "csv")
+        self.assertFalse(created)
+        self.assertEqual(job.id, running.id)
+
+    def test_purge_fails_stuck_jobs_and_deletes_them_later(self):
+        stuck = self.stuck_job("pending")
+        self.assertEqual(purge_reports(), 0)
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, "failed")
+
+        self.assertEqual(purge_reports(now=timezone.now() + timedelta(days=8)), 1)
+        self.assertFalse(ReportJob.objects.filter(id=stuck.id).exists())
+
+
+class SalesQuerysetTests(TestCase):
+
+    def test_range_uses_local_day_bounds(self):
+        client = CustomUser.objects.create_user(username="cliente", password="x")
+        tz = timezone.get_current_timezone()
+        day = date(2024, 3, 10)
+        inside = Sale.objects.create(client=client, total=10)
+        outside = Sale.objects.create(client=client, total=20)
+        Sale.objects.filter(id=inside.id).update(date=timezone.datetime(2024, 3, 10, 23, 30, tzinfo=tz))
+        Sale.objects.filter(id=outside.id).update(date=timezone.datetime(2024, 3, 11, 0, 10, tzinfo=tz))
+
+        sales = sales_queryset(day, day)
+        self.assertEqual(list(sales), [inside])
+        # sin funciones sobre la columna: el rango puede usar el índice de fecha
+        self.assertNotIn("django_datetime_cast_date", str(sales.query))
+        self.assertEqual(list(sales_queryset("2024-03-10", "2024-03-11")), [outside, inside])
+
+    def test_invalid_dates(self):
+        with self.assertRaises(ValueError):
+            sales_queryset("ayer", "hoy")
+
+
+class RollupSignalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user(username="cliente", password="x")
+        cls.gel = Product.objects.create(name="Gel", price=100, stock=10)
+
+    def day_totals(self):
+        return {
+            (r.payment_method, r.total, r.count)
+            for r in DailySalesRollup.objects.filter(business_date=timezone.localdate())
+        }
+
+    def product_totals(self):
+        return {
+            (r.product_key, r.quantity, r.total, r.count)
+            for r in DailyProductRollup.objects.filter(business_date=timezone.localdate())
+        }
+
+    def test_sale_save_and_delete(self):
+        first = Sale.objects.create(client=self.client_user, total=100, payment_method="cash")
+        Sale.objects.create(client=self.client_user, total=50, payment_method="cash")
+        self.assertEqual(self.day_totals(), {("cash", 150, 2)})
+
+        # editar resta lo que sumaba antes
+        first.total = 80
+        first.payment_method = "card"
+        first.save()
+        self.assertEqual(self.day_totals(), {("cash", 50, 1), ("card", 80, 1)})
+
+        first.delete()
+        self.assertEqual(self.day_totals(), {("cash", 50, 1), ("card", 0, 0)})
+
+    def test_item_save_and_delete(self):
+        sale = Sale.objects.create(client=self.client_user, total=250)
+        item = SaleItem.objects.create(sale=sale, product=self.gel, quantity=2, subtotal=200)
+        SaleItem.objects.create(sale=sale, quantity=1, subtotal=50)
+        self.assertEqual(self.product_totals(), {(self.gel.id, 2, 200, 1), (SERVICE, 1, 50, 1)})
+
+        item.delete()
+        self.assertEqual(self.product_totals(), {(self.gel.id, 0, 0, 0), (SERVICE, 1, 50, 1)})
+
+    def test_rebuild_matches_the_signals(self):
+        sale = Sale.objects.create(client=self.client_user, total=120, payment_method="transfer")
+        SaleItem.objects.create(sale=sale, product=self.gel, quantity=1, subtotal=120)
+        kept = self.day_totals(), self.product_totals()
+
+        DailySalesRollup.objects.all().delete()
+        DailyProductRollup.objects.all().delete()
+        rebuild()
+        self.assertEqual((self.day_totals(), self.product_totals()), kept)
+
+
+class HistoryCursorTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+        # varias ventas con exactamente la misma fecha: el id desempata
+        moment = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            sale = Sale.objects.create(client=cls.staff, total=10 + i)
+            Sale.objects.filter(id=sale.id).update(date=moment if i < 5 else moment - timedelta(minutes=i))
+        cls.expected = list(Sale.objects.order_by("-date", "-id").values_list("id", flat=True))
+
+    def walk(self, slim=False):
+        ids, cursor = [], None
+        while True:
+            params = {"limit": "2", "cursor": cursor} if cursor else {"limit": "2"}
+            page, cursor = history_page(params, slim=slim)
+            ids += [sale.id for sale in page]
+            if cursor is None:
+                return ids
+
+    def test_round_trip_over_equal_dates(self):
+        for slim in (False, True):
+            with self.subTest(slim=slim):
+                ids = self.walk(slim)
+                self.assertEqual(ids, self.expected)
+                self.assertEqual(len(set(ids)), len(ids))
+
+    def test_new_sales_do_not_shift_pages(self):
+        first, cursor = history_page({"limit": "3"})
+        Sale.objects.create(client=self.staff, total=99)
+        second, _ = history_page({"limit": "3", "cursor": cursor})
+        self.assertEqual([s.id for s in first + second], self.expected[:6])
+
+    def test_view_links_the_next_page(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        ids, url = [], "/api/sales/history/?slim=1&limit=3"
+        while url:
+            data = client.get(url).data
+            ids += [row["id"] for row in data["results"]]
+            url = data["next"]
+        self.assertEqual(ids, self.expected)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            decode_cursor("no-es-un-cursor")
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(client.get("/api/sales/history/", {"cursor": "xx"}).status_code, 400)
+
+
+class TicketRenderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        client = CustomUser.objects.create_user(username="cliente", password="x")
+        gel = Product.objects.create(name="Gel " + "muy largo " * 20, price=10, stock=100)
+        cls.long_sale = Sale.objects.create(client=client, total=600)
+        SaleItem.objects.bulk_create(
+            SaleItem(sale=cls.long_sale, product=gel if i % 2 else None, quantity=1, subtotal=10) for i in range(60)
+        )
+        cls.short_sale = Sale.objects.create(client=client, total=10)
+        SaleItem.objects.create(sale=cls.short_sale, quantity=1, subtotal=10)
+
+    def pages(self, pdf):
+        return len(re.findall(rb"/Type /Page\b", pdf))
+
+    def test_long_sale_continues_on_new_pages(self):
+        writer = TicketWriter(io.BytesIO())
+        writer.write(ticket_queryset(Sale.objects.filter(id=self.long_sale.id)).get())
+        self.assertGreater(writer.pages, 1)
+
+    def test_batch_renders_every_sale_in_one_pdf(self):
+        target = io.BytesIO()
+        sales = Sale.objects.order_by("id")
+        # ventas + items del bloque, sin una consulta por venta
+        with self.assertNumQueries(2):
+            count = render_tickets(sales, target)
+
+        self.assertEqual(count, 2)
+        pdf = target.getvalue()
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        # la venta larga ocupa varias páginas y la corta empieza en una nueva
+        self.assertGreaterEqual(self.pages(pdf), 3)
 
-# Create your tests here.
+    def test_empty_batch_still_writes_a_page(self):
+        target = io.BytesIO()
+        self.assertEqual(render_tickets(Sale.objects.none(), target), 0)
+        self.assertEqual(self.pages(target.getvalue()), 1)
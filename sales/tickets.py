@@ -0,0 +1,136 @@
+"""
+Tickets de venta en PDF.
+
+Las fuentes se registran una sola vez por proceso y el encabezado fijo de
+la página se dibuja una vez por documento como un "form" de ReportLab que
+cada página reutiliza. Cada venta empieza en una página nueva y el texto
+continúa en otra página cuando ya no cabe (ventas con muchos items), con
+los nombres largos partidos al ancho del ticket.
+
+La venta se lee con el cliente y sus items/productos ya cargados (una
+consulta para las ventas y otra para todos sus items). render_tickets
+escribe varias ventas en un solo PDF para imprimir el corte del día o de
+una caja.
+"""
+import logging
+import tempfile
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .models import SaleItem
+
+logger = logging.getLogger(__name__)
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 40
+TOP = PAGE_HEIGHT - 80  # debajo del encabezado
+BOTTOM = 50
+CHUNK_SIZE = 200
+
+
+@lru_cache(maxsize=None)
+def fonts():
+    """(normal, negrita) registradas una vez; Vera viene con ReportLab y tiene acentos y ñ."""
+    try:
+        pdfmetrics.registerFont(TTFont("Ticket", "Vera.ttf"))
+        pdfmetrics.registerFont(TTFont("Ticket-Bold", "VeraBd.ttf"))
+        return "Ticket", "Ticket-Bold"
+    except Exception:
+        logger.warning("No se pudo registrar la fuente del ticket, se usa Helvetica", exc_info=True)
+        return "Helvetica", "Helvetica-Bold"
+
+
+def ticket_queryset(sales):
+    return sales.select_related("client").prefetch_related(
+        Prefetch("items", queryset=SaleItem.objects.select_related("product"))
+    )
+
+
+class TicketWriter:
+    def __init__(self, target):
+        self.regular, self.bold = fonts()
+        self.canvas = canvas.Canvas(target, pagesize=letter)
+        self.pages = 0
+        self.y = TOP
+
+        # encabezado fijo: se dibuja una vez y cada página lo reutiliza
+        c = self.canvas
+        c.beginForm("ticket_header")
+        c.setFont(self.bold, 16)
+        c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 42, "TICKET DE COMPRA")
+        c.setFont(self.regular, 9)
+        c.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 58, "Crème Studio")
+        c.line(MARGIN, PAGE_HEIGHT - 66, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - 66)
+        c.endForm()
+
+    def new_page(self):
+        if self.pages:
+            self.canvas.showPage()
+        self.canvas.doForm("ticket_header")
+        self.pages += 1
+        self.y = TOP
+
+    def line(self, text, bold=False, size=12, step=20, x=MARGIN, continued=None):
+        if self.y < BOTTOM:
+            self.new_page()
+            if continued:
+                self.line(continued, size=9, step=18)
+        font = self.bold if bold else self.regular
+        self.canvas.setFont(font, size)
+        self.canvas.drawString(x, self.y, text)
+        self.y -= step
+
+    def write(self, sale):
+        self.new_page()
+        continued = f"Venta #{sale.id} (continuación)"
+
+        self.line(f"Venta #{sale.id}", bold=True)
+        self.line(f"Cliente: {sale.client.username}")
+        self.line(f"Fecha: {timezone.localtime(sale.date).strftime('%d/%m/%Y %H:%M')}")
+        self.line(f"Método de pago: {sale.get_payment_method_display()}", step=30)
+
+        width = PAGE_WIDTH - 2 * MARGIN - 100
+        for item in sale.items.all():
+            name = item.product.name if item.product else "Servicio"
+            lines = simpleSplit(f"- {name}", self.regular, 11, width)
+            for text in lines:
+                self.line(text, size=11, step=16, x=MARGIN + 20, continued=continued)
+            # cantidad e importe a la derecha del último renglón del item
+            self.canvas.setFont(self.regular, 11)
+            self.canvas.drawRightString(
+                PAGE_WIDTH - MARGIN, self.y + 16, f"{item.quantity} x  ${item.subtotal}"
+            )
+
+        self.y -= 10
+        self.line(f"Total: ${sale.total}", bold=True, size=14, continued=continued)
+
+    def save(self):
+        if not self.pages:
+            self.new_page()
+        self.canvas.save()
+
+
+def render_tickets(sales, target, chunk_size=CHUNK_SIZE):
+    """Escribe en `target` un ticket por venta de `sales` (queryset ya ordenado)."""
+    writer = TicketWriter(target)
+    count = 0
+    for sale in ticket_queryset(sales).iterator(chunk_size=chunk_size):
+        writer.write(sale)
+        count += 1
+    writer.save()
+    return count
+
+
+def tickets_file(sales, chunk_size=CHUNK_SIZE):
+    """Archivo temporal con los tickets, listo para leer."""
+    tmp = tempfile.TemporaryFile(suffix=".pdf")
+    render_tickets(sales, tmp, chunk_size)
+    tmp.seek(0)
+    return tmp
@@ -6,7 +6,9 @@ from .views import (
     sales_report, sale_ticket, 
     sales_history, sales_dashboard, sales_export_excel,
     daily_cut,
-    daily_cut_view
+    daily_cut_view,
+    report_job_create, report_job_detail, report_job_download,
+    sales_tickets
     )
 
 
@@ -16,8 +18,12 @@ urlpatterns = [
     path('client/<int:client_id>/', sales_by_client),
     path('report/', sales_report),
     path('<int:sale_id>/ticket/', sale_ticket),                
+    path('tickets/', sales_tickets, name="sales_tickets"),
     path('history/', sales_history, name="sales_history"),
     path('export-excel/', sales_export_excel),
+    path('reports/', report_job_create, name="report_job_create"),
+    path('reports/<uuid:job_id>/', report_job_detail, name="report_job_detail"),
+    path('reports/<uuid:job_id>/download/', report_job_download, name="report_job_download"),
     path('daily-cut/', daily_cut, name="daily_cut"),
     path('daily-cut/view/', daily_cut_view, name="daily_cut_view"),
 
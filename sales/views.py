@@ -4,33 +4,39 @@ from rest_framework.response import Response
 from django.db.models import Sum
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
-from .models import Sale, SaleItem
-from .serializers import SaleSerializer
-from reportlab.pdfgen import canvas
-from django.http import FileResponse, HttpResponse
+from .models import DailyProductRollup, DailySalesRollup, ReportJob, Sale
+from .serializers import ReportJobSerializer, SaleListSerializer, SaleSerializer
+from django.http import FileResponse
 from django.db.models import Count
 from datetime import date, timedelta
 from rest_framework.permissions import IsAuthenticated
-import openpyxl
-from django.shortcuts import redirect, render
+from .exports import sales_workbook_file
+from .reports import CONTENT_TYPES, report_filename, request_report
+from .rollups import day_bounds, top_products
+from .history import filter_sales, history_page, with_items
+from .tickets import tickets_file
+from billing.registers import open_register_id
+from . import dashboard
+from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 
 
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')
 class SaleViewSet(viewsets.ModelViewSet):
-    queryset = Sale.objects.all().order_by('-date')
+    queryset = with_items(Sale.objects.all()).order_by('-date', '-id')
     serializer_class = SaleSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(client=self.request.user)
+        # la venta queda en la caja abierta (id en caché por proceso, ver billing/registers.py)
+        serializer.save(client=self.request.user, cash_register_id=open_register_id())
 
 # 📌 Historial por cliente
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def sales_by_client(request, client_id):
-    sales = Sale.objects.filter(client_id=client_id)
+    sales = with_items(Sale.objects.filter(client_id=client_id))
     return Response(SaleSerializer(sales, many=True).data)
 
 # 📌 Reporte global por fechas
@@ -46,87 +52,86 @@ def sales_report(request):
     return Response({
         "total_sales": total,
         "count": qs.count(),
-        "sales": SaleSerializer(qs, many=True).data
+        "sales": SaleSerializer(with_items(qs), many=True).data
     })
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def sale_ticket(request, sale_id):
-    sale = Sale.objects.get(id=sale_id)
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="ticket_{sale_id}.pdf"'
-
-    p = canvas.Canvas(response)
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(200, 800, "TICKET DE COMPRA")
-
-    p.setFont("Helvetica", 12)
-    p.drawString(40, 760, f"Cliente: {sale.client.username}")
-    p.drawString(40, 740, f"Fecha: {sale.date.strftime('%d/%m/%Y %H:%M')}")
-    p.drawString(40, 720, f"Método de pago: {sale.payment_method}")
-    p.drawString(40, 700, f"Total: ${sale.total}")
+    sales = Sale.objects.filter(id=sale_id)
+    if not sales.exists():
+        return Response({"error": "La venta no existe"}, status=404)
+
+    # render con fuentes/encabezado reutilizados y paginación (sales/tickets.py)
+    return FileResponse(
+        tickets_file(sales),
+        as_attachment=True,
+        filename=f"ticket_{sale_id}.pdf",
+        content_type="application/pdf",
+    )
 
-    y = 660
-    for item in sale.items.all():
-        p.drawString(60, y, f"- {item.product.name if item.product else 'Servicio'}  ${item.subtotal}")
-        y -= 20
 
-    p.showPage()
-    p.save()
-    return response
+# 📌 Tickets de un día o de una caja en un solo PDF (impresión del corte)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sales_tickets(request):
+    day = request.GET.get("date")
+    cash_register = request.GET.get("cash_register")
+    if not day and not cash_register:
+        return Response({"error": "Indica date (YYYY-MM-DD) o cash_register"}, status=400)
+
+    params = {"start": day, "end": day, "cash_register": cash_register}
+    try:
+        sales = filter_sales(params).order_by("date", "id")
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if not sales.exists():
+        return Response({"error": "No hay ventas para imprimir"}, status=404)
+
+    name = f"caja_{cash_register}" if cash_register else day
+    return FileResponse(
+        tickets_file(sales),
+        as_attachment=True,
+        filename=f"tickets_{name}.pdf",
+        content_type="application/pdf",
+    )
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def sales_history(request):
-    start = request.GET.get("start")
-    end = request.GET.get("end")
-
-    sales = Sale.objects.all().order_by("-date")
-
-    if start and end:
-        sales = sales.filter(date__date__range=[start, end])
-
-    return Response(SaleSerializer(sales, many=True).data)
+    # Paginado por cursor sobre (date, id); filtros y modo ligero en sales/history.py
+    slim = request.GET.get("slim") in ("1", "true")
+    try:
+        sales, next_cursor = history_page(request.GET, slim=slim)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    serializer = SaleListSerializer if slim else SaleSerializer
+    return Response({
+        "next": next_url,
+        "next_cursor": next_cursor,
+        "results": serializer(sales, many=True).data
+    })
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def sales_dashboard(request):
-    from datetime import date
-
-    qs = Sale.objects.all()
-    today = date.today()
-    month_start = today.replace(day=1)
+    # ?days=N: cuántos días recientes trae la serie by_day (ver sales/dashboard.py)
+    try:
+        days = int(request.GET.get("days", dashboard.DAYS))
+    except ValueError:
+        return Response({"error": "days debe ser un número"}, status=400)
+    days = max(1, min(days, dashboard.MAX_DAYS))
 
-    total_sales = qs.aggregate(total=Sum('total'))['total'] or 0
-    count_sales = qs.count()
-    today_sales = qs.filter(date__date=today).aggregate(t=Sum('total'))['t'] or 0
-    month_sales = qs.filter(date__date__gte=month_start).aggregate(t=Sum('total'))['t'] or 0
-
-    by_payment = qs.values('payment_method').annotate(
-        total=Sum('total'), count=Count('id')
-    )
-
-    by_day = qs.extra({"day": "date(date)"}).values("day").annotate(
-        total=Sum("total"), count=Count("id")
-    ).order_by("day")[:15]
-
-    top = SaleItem.objects.values('product__name').annotate(
-        total=Sum('subtotal'), count=Count('id')
-    ).order_by('-total')[:5]
-
-    return Response({
-        "summary": {
-            "total_sales": float(total_sales),
-            "count_sales": count_sales
-        },
-        "today_sales": float(today_sales),
-        "month_sales": float(month_sales),
-        "by_payment": list(by_payment),
-        "by_day": list(by_day),
-        "top_items": list(top)
-    })
+    return Response(dashboard.from_rollups(days=days))
 
 
 @api_view(['GET'])
@@ -136,110 +141,80 @@ def sales_export_excel(request):
     start = request.GET.get("start")
     end = request.GET.get("end")
 
-    sales = Sale.objects.all().order_by("-date")
+    # El libro se escribe por bloques a un archivo temporal y se manda en
+    # partes (ver sales/exports.py): la memoria no crece con el rango
+    try:
+        workbook = sales_workbook_file(start, end)
+    except ValueError:
+        return Response({"error": "start y end deben tener formato YYYY-MM-DD"}, status=400)
+    return FileResponse(
+        workbook,
+        as_attachment=True,
+        filename="reporte_ventas.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
 
-    if start and end:
-        sales = sales.filter(date__date__range=[start, end])
+# 📌 Reportes en segundo plano: se crea el trabajo y se consulta hasta que esté listo
+# El reporte trae todas las ventas: solo staff/admin (o quien lo pidió) lo ve
+def _is_staff(user):
+    return user.is_staff or user.is_superuser or getattr(user, 'role', None) == 'admin'
 
-    wb = openpyxl.Workbook()
 
-    # 🧠 HOJA 1 — DASHBOARD RESUMEN
-    ws1 = wb.active
-    ws1.title = "Resumen"
+def _can_read_report(user, job):
+    return _is_staff(user) or job.requested_by_id == user.id
 
-    total_ventas = sales.aggregate(t=Sum("total"))["t"] or 0
-    count_ventas = sales.count()
 
-    # Métodos de pago
-    by_payment = sales.values("payment_method").annotate(
-        total=Sum("total"), count=Count("id")
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def report_job_create(request):
+    if not _is_staff(request.user):
+        return Response({"error": "Solo el staff puede generar reportes"}, status=403)
+
+    serializer = ReportJobSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    job, created = request_report(
+        data.get('report_type', 'sales'),
+        data.get('format', 'xlsx'),
+        data.get('start'),
+        data.get('end'),
+        user=request.user,
     )
+    # 202 mientras hay que esperar; 200 si ya estaba listo (se reutiliza el archivo)
+    pending = job.status in ("pending", "running")
+    return Response(ReportJobSerializer(job).data, status=202 if pending else 200)
 
-    # Top 5 items vendidos
-    top_items = SaleItem.objects.filter(sale__in=sales).values(
-        "product__name"
-    ).annotate(total=Sum("subtotal"), count=Count("id")).order_by("-total")[:5]
-
-    ws1.append(["📊 REPORTE DE VENTAS"])
-    ws1.append([
-        f"Rango de fechas: {start if start else 'Inicio'} a {end if end else 'Hoy'}"
-    ])
-    ws1.append([])
-
-    ws1.append(["Total vendido", float(total_ventas)])
-    ws1.append(["Cantidad de ventas", count_ventas])
-    ws1.append([])
-
-    # Métodos de pago
-    ws1.append(["Métodos de pago"])
-    ws1.append(["Método", "Cantidad", "Total"])
-    for m in by_payment:
-        ws1.append([m["payment_method"], m["count"], float(m["total"])])
-    ws1.append([])
-
-    # Top items
-    ws1.append(["Top servicios/productos"])
-    ws1.append(["Producto/Servicio", "Veces vendido", "Total vendido"])
-    for t in top_items:
-        ws1.append([t["product__name"] or "Servicio", t["count"], float(t["total"])])
-
-    # 🧾 HOJA 2 — DETALLE
-    ws2 = wb.create_sheet("Detalle de ventas")
-
-    headers = [
-        "Fecha Venta", "Cliente", "Cita Fecha/Hora", "Método pago",
-        "Producto/Servicio", "Cantidad", "Subtotal Item", "Total Venta"
-    ]
-    ws2.append(headers)
-
-    total_items = 0
-
-    for sale in sales:
-        items = sale.items.all()
-        appt = getattr(sale, "appointment", None)
-        cita = appt.date.strftime("%Y-%m-%d %H:%M") if appt and hasattr(appt, "date") else "-"
-
-        if not items:
-            ws2.append([
-                sale.date.strftime("%Y-%m-%d %H:%M"),
-                sale.client.username if sale.client else "N/A",
-                cita,
-                sale.payment_method,
-                "-", "-", "-",
-                float(sale.total)
-            ])
-        else:
-            for item in items:
-                total_items += 1
-                ws2.append([
-                    sale.date.strftime("%Y-%m-%d %H:%M"),
-                    sale.client.username if sale.client else "N/A",
-                    cita,
-                    sale.payment_method,
-                    item.product.name if item.product else "Servicio",
-                    item.quantity if hasattr(item, "quantity") else 1,
-                    float(item.subtotal),
-                    float(sale.total)
-                ])
-
-    ws2.append([])
-    ws2.append(["Resumen"])
-    ws2.append(["Total ventas:", count_ventas])
-    ws2.append(["Total items vendidos:", total_items])
-    ws2.append(["Ingreso total:", float(total_ventas)])
-
-    # Descargar
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_detail(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id)
+    if not _can_read_report(request.user, job):
+        return Response({"error": "No tienes acceso a este reporte"}, status=403)
+    return Response(ReportJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_download(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id)
+    if not _can_read_report(request.user, job):
+        return Response({"error": "No tienes acceso a este reporte"}, status=403)
+    if job.status != "done" or not job.file:
+        return Response({"error": "El reporte todavía no está listo", "status": job.status}, status=409)
+
+    return FileResponse(
+        job.file.open("rb"),
+        as_attachment=True,
+        filename=report_filename(job),
+        content_type=CONTENT_TYPES[job.format],
     )
-    response["Content-Disposition"] = 'attachment; filename="reporte_ventas.xlsx"'
-    wb.save(response)
-    return response
 
 @login_required
 def quick_sale_view(request):
     # solo admin o staff? lo dejamos accesible a quienes usen la interfaz: staff/admin
-    if not (request.user.is_staff or request.user.is_superuser or getattr(request.user, 'role', None) == 'admin'):
+    if not _is_staff(request.user):
         return redirect('/api/appointments/available-view/')
     return render(request, 'sales/ventas_rapidas.html')
 
@@ -249,30 +224,29 @@ def daily_cut(request):
     from django.utils import timezone
 
     today = timezone.localdate()
-    sales = Sale.objects.filter(date__date=today)
+    rollups = DailySalesRollup.objects.filter(business_date=today)
 
-    total_sales = sales.aggregate(total=Sum('total'))['total'] or 0
-    count_sales = sales.count()
+    totals = rollups.aggregate(total=Sum('total'), count=Sum('count'))
+    total_sales = totals['total'] or 0
+    count_sales = totals['count'] or 0
 
     # Desglose por método de pago
-    payments = sales.values('payment_method').annotate(
-        total=Sum('total'), count=Count('id')
-    )
+    payments = rollups.values('payment_method').annotate(
+        total=Sum('total'), count=Sum('count')
+    ).order_by()
 
     # Items vendidos
-    items = SaleItem.objects.filter(sale__in=sales).values(
-        'product__name'
-    ).annotate(
-        total=Sum('subtotal'),
-        count=Count('id')
-    ).order_by('-total')
+    items = top_products(DailyProductRollup.objects.filter(business_date=today))
+
+    start, end = day_bounds(today, today)
+    sales = Sale.objects.filter(date__gte=start, date__lt=end)
 
     return Response({
         "date": today,
         "total_sales": float(total_sales),
         "count_sales": count_sales,
         "by_payment": list(payments),
-        "items": list(items),
+        "items": items,
         "sales": SaleSerializer(sales, many=True).data
     })
 